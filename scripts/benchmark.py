@@ -0,0 +1,1494 @@
+import sys
+import os.path
+import csv
+import json
+import time
+import shutil
+import signal
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+import matplotlib.pyplot as plt
+
+from linearFilters import LF
+from nonLinearFilters import NLF
+from edgeDetector import ED
+from borders import PADDING_MODES
+from convolution import getPadWidth
+from memoryPlanner import OVERHEAD
+from pipeline import Pipeline
+from temporalFilters import TF
+from jobQueue import JobQueue, CLAIMED
+
+
+# The images every benchmark is run on
+IMAGE_PATHS = ['./img/NZjers1.png', './img/foetus.png']
+
+# The filters every benchmark is run on, grouped by the class that applies
+# them
+FILTERS = [
+    (LF, 'linear', [
+        'gaussian',
+        'recursive_gaussian',
+        'box',
+        'butterworth_low_pass',
+        'low_pass',
+        'geometric_mean',
+        'harmonic_mean',
+        'contra_harmonic_mean']),
+    (NLF, 'nonlinear', [
+        'median',
+        'adaptive_weighted_median',
+        'truncated_median',
+        'max',
+        'min',
+        'midpoint',
+        'alpha_trimmed_mean']),
+    (ED, 'edge', [
+        'magnitude',
+        'direction']),
+]
+
+
+def main():
+    """
+    Main function
+    """
+
+    # The benchmarks that can be run
+    benchmarks = {
+        'dtype': benchmarkDtype,
+        'fold': benchmarkFold,
+        'transfer': benchmarkTransferFunctions,
+        'recursive': benchmarkRecursiveGaussian,
+        'stream': benchmarkStream,
+        'temporal': benchmarkTemporalFilters,
+        'regions': benchmarkRegions,
+        'pyramid': benchmarkPyramid,
+        'canny': benchmarkCanny,
+        'histogram': benchmarkHistogram,
+        'borders': benchmarkBorders,
+        'memory': benchmarkMemory,
+        'worker': benchmarkWorker,
+        'startup': benchmarkStartup,
+        'queue': benchmarkQueue,
+    }
+
+    # Get the arguments passed to the script and check if they are valid.
+    arguments = sys.argv[1:]
+    if len(arguments) != 1 or arguments[0] not in benchmarks:
+        print(f'Usage: python benchmark.py <{"|".join(benchmarks)}>')
+        sys.exit(1)
+
+    # Run the requested benchmark
+    benchmarks[arguments[0]]()
+
+
+def timeFilter(F, image, filter_name, kernel_size, **kwargs):
+    """
+    Applies a filter to an image and times it
+
+    :param F: The class that applies the given filter
+    :param image: The image to be filtered
+    :param filter_name: The name of the filter
+    :param kernel_size: The size of the kernel
+    :param kwargs: The arguments for the filter
+
+    :return: The runtime in nanoseconds and the filtered image
+    """
+    start_time = time.perf_counter_ns()
+    filtered_image = F.applyFilter(image, filter_name, kernel_size, **kwargs)
+    end_time = time.perf_counter_ns()
+    return end_time - start_time, filtered_image
+
+
+def writeBenchmarkResults(file_name, headers, rows):
+    """
+    Writes the results of a benchmark to a CSV file in the results directory,
+    replacing the results of any previous run
+
+    :param file_name: The name of the CSV file
+    :param headers: The column headers
+    :param rows: The rows of results
+    """
+    directory = './results/'
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    with open(directory + file_name, 'w', newline='') as resultsFile:
+        csvWriter = csv.writer(resultsFile)
+        csvWriter.writerow(headers)
+        csvWriter.writerows(rows)
+
+
+def benchmarkDtype(kernel_sizes=(3, 7, 15)):
+    """
+    Compares the runtime of every filter computed in float32 against float64
+    and reports the accuracy lost by computing in float32
+
+    :param kernel_sizes: The kernel sizes to benchmark
+    """
+    rows = []
+    for image_path in IMAGE_PATHS:
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        image = plt.imread(image_path)
+
+        for F, filter_type, filter_names in FILTERS:
+            for filter_name in filter_names:
+                for kernel_size in kernel_sizes:
+                    # Apply the filter in both precisions
+                    runtime_64, image_64 = timeFilter(
+                        F, image, filter_name, kernel_size, dtype=np.float64)
+                    runtime_32, image_32 = timeFilter(
+                        F, image, filter_name, kernel_size, dtype=np.float32)
+
+                    # Calculate how far the float32 result is from the float64
+                    # result
+                    difference = np.abs(image_32.astype(np.float64) - image_64)
+                    if filter_name == 'direction':
+                        # Directions of pi and -pi are the same direction
+                        difference = np.minimum(
+                            difference, 2 * np.pi - difference)
+                    max_error = np.nanmax(difference)
+                    rms_error = np.sqrt(np.nanmean(np.square(difference)))
+
+                    print(f'Image: {image_name}\tFilter: {filter_name}\t'
+                          f'Kernel Size: {kernel_size}\t'
+                          f'Speedup: {runtime_64 / runtime_32:.2f}\t'
+                          f'Max Error: {max_error:.3e}')
+
+                    rows.append([
+                        image_name,
+                        filter_type,
+                        filter_name,
+                        kernel_size,
+                        runtime_64,
+                        runtime_32,
+                        image_64.nbytes,
+                        image_32.nbytes,
+                        max_error,
+                        rms_error])
+
+    writeBenchmarkResults('benchmark-dtype.csv', [
+        'image_name',
+        'filter_type',
+        'filter_name',
+        'kernel_size',
+        'runtime_float64',
+        'runtime_float32',
+        'bytes_float64',
+        'bytes_float32',
+        'max_error',
+        'rms_error'], rows)
+
+
+def benchmarkFold(kernel_sizes=(3, 7, 15)):
+    """
+    Compares the runtime of pipelines of convolution stages with and without
+    folding their kernels together, and checks that folding does not change
+    the result
+
+    :param kernel_sizes: The kernel sizes to benchmark
+    """
+    # The pipelines to benchmark, built for a given kernel size
+    pipelines = {
+        'gaussian|magnitude': lambda kernel_size:
+            LF.stage('gaussian', kernel_size) | ED.stage('magnitude'),
+        'gaussian|direction': lambda kernel_size:
+            LF.stage('gaussian', kernel_size) | ED.stage('direction'),
+        'box|gaussian': lambda kernel_size:
+            LF.stage('box', kernel_size) | LF.stage('gaussian', kernel_size),
+        'gaussian|box|horizontal': lambda kernel_size:
+            LF.stage('gaussian', kernel_size) | LF.stage('box', kernel_size)
+            | ED.stage('horizontal'),
+    }
+
+    rows = []
+    for image_path in IMAGE_PATHS:
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        image = plt.imread(image_path)
+
+        for pipeline_name, getPipeline in pipelines.items():
+            for kernel_size in kernel_sizes:
+                pipeline = getPipeline(kernel_size)
+
+                # Apply the pipeline with and without folding
+                start_time = time.perf_counter_ns()
+                unfolded_image = pipeline.apply(image, fold=False)
+                unfolded_runtime = time.perf_counter_ns() - start_time
+                start_time = time.perf_counter_ns()
+                folded_image = pipeline.apply(image, fold=True)
+                folded_runtime = time.perf_counter_ns() - start_time
+
+                # Folding must not change the shape or, beyond rounding
+                # errors, the values of the result
+                if folded_image.shape != unfolded_image.shape:
+                    raise AssertionError(
+                        f'{pipeline_name} changed shape when folded.')
+                difference = np.abs(folded_image - unfolded_image)
+                if pipeline_name.endswith('direction'):
+                    # Directions of pi and -pi are the same direction
+                    difference = np.minimum(difference, 2 * np.pi - difference)
+
+                    # The direction of a flat region is decided by rounding
+                    # errors, so only compare where there is an edge
+                    magnitude = (
+                        LF.stage('gaussian', kernel_size)
+                        | ED.stage('magnitude')).apply(image)
+                    difference = difference[magnitude > 1e-6]
+                max_error = np.max(difference)
+                if max_error > 1e-6:
+                    raise AssertionError(
+                        f'{pipeline_name} differs by {max_error:.3e} when '
+                        f'folded.')
+
+                print(f'Image: {image_name}\tPipeline: {pipeline_name}\t'
+                      f'Kernel Size: {kernel_size}\t'
+                      f'Speedup: {unfolded_runtime / folded_runtime:.2f}\t'
+                      f'Max Error: {max_error:.3e}')
+
+                rows.append([
+                    image_name,
+                    pipeline_name,
+                    kernel_size,
+                    len(pipeline.getStages()),
+                    len(pipeline.fold()),
+                    unfolded_runtime,
+                    folded_runtime,
+                    max_error])
+
+    writeBenchmarkResults('benchmark-fold.csv', [
+        'image_name',
+        'pipeline_name',
+        'kernel_size',
+        'stages',
+        'folded_stages',
+        'runtime_unfolded',
+        'runtime_folded',
+        'max_error'], rows)
+
+
+def getImpulseResponse(filter_name, shape, **kwargs):
+    """
+    Filters an impulse in the centre of an image in the frequency domain
+
+    :param filter_name: The name of the filter
+    :param shape: The shape of the image
+    :param kwargs: The arguments for the filter
+
+    :return: The filtered image and the centre of the image
+    """
+    centre = (shape[0] // 2, shape[1] // 2)
+    impulse = np.zeros(shape)
+    impulse[centre] = 1
+    return LF.applyFilter(
+        impulse, filter_name, None, domain='frequency', **kwargs), centre
+
+
+def benchmarkTransferFunctions(
+        kernel_sizes=(3, 15, 31, 63), check_kernel_size=127, tolerance=0.01):
+    """
+    Compares the runtime of the Butterworth and ideal low pass filters built
+    as spatial kernels against their transfer functions built in the
+    frequency domain, whose runtime does not depend on the kernel size, and
+    checks that the transfer functions are isotropic on a non-square image,
+    do not depend on how the image is padded, and agree with convolving
+    the image with their impulse responses cut to a large kernel as the
+    spatial domain does. The spatial kernels are defined by a distance in
+    pixels rather than by the transfer functions, so they are not compared.
+
+    :param kernel_sizes: The kernel sizes to benchmark
+    :param check_kernel_size: The size the impulse responses are cut to
+    :param tolerance: The root mean square error allowed between the
+        transfer function and its cut impulse response
+
+    :raises AssertionError: If a transfer function is not isotropic,
+        depends on the padding or disagrees with its impulse response
+    """
+    transfer_functions = {
+        'butterworth_low_pass': lambda shape: LF.getTransferFunction(
+            'butterworth_low_pass', shape, np.float64, 50.0, 2),
+        'low_pass': lambda shape: LF.getTransferFunction(
+            'low_pass', shape, np.float64, 50.0),
+    }
+
+    for filter_name in transfer_functions:
+        # The response must fall off equally along both axes of an image
+        # four times as wide as it is high. The ideal mask is sampled on
+        # grids of different spacings along the two axes, so it is allowed
+        # to differ slightly.
+        response, (row, column) = getImpulseResponse(
+            filter_name, (100, 400), cutoff=20.0)
+        vertical = response[row + 5, column] / response[row, column]
+        horizontal = response[row, column + 5] / response[row, column]
+        if not np.isclose(vertical, horizontal, atol=0.02):
+            raise AssertionError(
+                f'{filter_name} is not isotropic: {vertical:.3f} vertically '
+                f'and {horizontal:.3f} horizontally.')
+
+        # 250 and 257 are padded to 500 and 540, which must not change the
+        # filter
+        peaks = [
+            response[centre] for response, centre in [
+                getImpulseResponse(filter_name, (size, size), cutoff=20.0)
+                for size in (250, 257)]]
+        if not np.isclose(peaks[0], peaks[1], rtol=1e-3):
+            raise AssertionError(
+                f'{filter_name} depends on the padding: the peak is '
+                f'{peaks[0]:.4f} and {peaks[1]:.4f}.')
+
+    rows = []
+    for image_path in IMAGE_PATHS:
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        image = plt.imread(image_path)
+
+        for filter_name, getTransferFunction in transfer_functions.items():
+            # The transfer function is built on the first call and cached,
+            # so time the call after it
+            timeFilter(LF, image, filter_name, None, domain='frequency')
+            frequency_runtime, frequency_image = timeFilter(
+                LF, image, filter_name, None, domain='frequency')
+
+            # The impulse response of the transfer function, cut to a large
+            # kernel and convolved with the image, must give the same image
+            kernel = np.fft.fftshift(np.fft.irfft2(
+                getTransferFunction((check_kernel_size,) * 2),
+                s=(check_kernel_size,) * 2))
+            spatial_image = LF.calculateFrequencyDomainConvolution(
+                image, kernel)
+            error = np.sqrt(np.mean((spatial_image - frequency_image) ** 2))
+            if error > tolerance:
+                raise AssertionError(
+                    f'{filter_name} on {image_name} differs from its impulse '
+                    f'response by {error:.4f}.')
+
+            for kernel_size in kernel_sizes:
+                spatial_runtime, _ = timeFilter(
+                    LF, image, filter_name, kernel_size, domain='spatial')
+
+                print(f'Image: {image_name}\tFilter: {filter_name}\t'
+                      f'Kernel Size: {kernel_size}\t'
+                      f'Speedup: {spatial_runtime / frequency_runtime:.2f}\t'
+                      f'Error: {error:.2e}')
+
+                rows.append([
+                    image_name,
+                    filter_name,
+                    kernel_size,
+                    spatial_runtime,
+                    frequency_runtime,
+                    error])
+
+    writeBenchmarkResults('benchmark-transfer.csv', [
+        'image_name',
+        'filter_name',
+        'kernel_size',
+        'runtime_spatial',
+        'runtime_frequency',
+        'rms_error'], rows)
+
+
+def benchmarkRecursiveGaussian(kernel_sizes=(3, 7, 15, 31, 63)):
+    """
+    Compares the runtime of the recursive Gaussian filter against the
+    Gaussian kernel of the same size and reports how far apart their results
+    are
+
+    :param kernel_sizes: The kernel sizes to benchmark
+    """
+    rows = []
+    for image_path in IMAGE_PATHS:
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        image = plt.imread(image_path)
+
+        for kernel_size in kernel_sizes:
+            fir_runtime, fir_image = timeFilter(
+                LF, image, 'gaussian', kernel_size)
+            iir_runtime, iir_image = timeFilter(
+                LF, image, 'recursive_gaussian', kernel_size)
+
+            # Calculate how far the recursive result is from the kernel result
+            difference = np.abs(iir_image - fir_image)
+            max_error = np.max(difference)
+            rms_error = np.sqrt(np.mean(np.square(difference)))
+
+            print(f'Image: {image_name}\tKernel Size: {kernel_size}\t'
+                  f'Speedup: {fir_runtime / iir_runtime:.2f}\t'
+                  f'Max Error: {max_error:.3e}\t'
+                  f'RMS Error: {rms_error:.3e}')
+
+            rows.append([
+                image_name,
+                kernel_size,
+                fir_runtime,
+                iir_runtime,
+                max_error,
+                rms_error])
+
+    writeBenchmarkResults('benchmark-recursive.csv', [
+        'image_name',
+        'kernel_size',
+        'runtime_fir',
+        'runtime_iir',
+        'max_error',
+        'rms_error'], rows)
+
+
+def generateFrames(image, frame_count, noise=0.01):
+    """
+    Generates a sequence of frames from an image, shifting it by one column
+    and adding fresh noise on every frame, as a stand-in for a video
+
+    :param image: The image the frames are made from
+    :param frame_count: The number of frames
+    :param noise: The standard deviation of the noise
+
+    :return: A generator of the frames
+    """
+    generator = np.random.default_rng(0)
+    for index in range(frame_count):
+        frame = np.roll(image, index, axis=1)
+        yield frame + generator.normal(0, noise, frame.shape)
+
+
+def applyStage(stage, frame):
+    """
+    Applies a pipeline stage or a pipeline to a frame with its own call
+
+    :param stage: The stage or the pipeline
+    :param frame: The frame to be filtered
+
+    :return: The filtered frame
+    """
+    if isinstance(stage, Pipeline):
+        return stage.apply(frame)
+    return stage.F.applyFilter(
+        frame, stage.filter_name, stage.kernel_size, **stage.kwargs)
+
+
+def benchmarkStream(frame_count=30):
+    """
+    Compares the sustained frames per second of filtering every frame with
+    its own call against streaming the frames, with and without reading the
+    next frames ahead, and checks that the streamed frames are unchanged
+
+    :param frame_count: The number of frames to filter
+
+    :raises AssertionError: If a streamed frame differs from the frame
+        filtered on its own
+    """
+    stages = [
+        ('gaussian', LF.stage('gaussian', 7)),
+        ('box', LF.stage('box', 7)),
+        ('median', NLF.stage('median', 3)),
+        ('magnitude', ED.stage('magnitude')),
+        ('gaussian|magnitude',
+            LF.stage('gaussian', 5) | ED.stage('magnitude')),
+    ]
+
+    rows = []
+    for image_path in IMAGE_PATHS:
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        image = plt.imread(image_path)
+
+        for label, stage in stages:
+            # Filter every frame with its own call
+            start_time = time.perf_counter_ns()
+            expected_frames = [
+                applyStage(stage, frame)
+                for frame in generateFrames(image, frame_count)]
+            call_runtime = time.perf_counter_ns() - start_time
+
+            runtimes = []
+            for prefetch in [0, 2]:
+                start_time = time.perf_counter_ns()
+                streamed_frames = list(stage.stream(
+                    generateFrames(image, frame_count), prefetch=prefetch))
+                runtimes.append(time.perf_counter_ns() - start_time)
+
+                # Check that streaming leaves every frame unchanged
+                for expected, streamed in zip(
+                        expected_frames, streamed_frames):
+                    max_error = np.max(np.abs(streamed - expected))
+                    if max_error > 1e-6:
+                        raise AssertionError(
+                            f'Streamed {label} differs by {max_error}.')
+
+            call_fps, stream_fps, prefetch_fps = [
+                frame_count / (runtime / 1e9)
+                for runtime in [call_runtime] + runtimes]
+
+            print(f'Image: {image_name}\tFilter: {label}\t'
+                  f'Call FPS: {call_fps:.1f}\t'
+                  f'Stream FPS: {stream_fps:.1f}\t'
+                  f'Prefetch FPS: {prefetch_fps:.1f}')
+
+            rows.append([
+                image_name,
+                label,
+                frame_count,
+                call_fps,
+                stream_fps,
+                prefetch_fps])
+
+    writeBenchmarkResults('benchmark-stream.csv', [
+        'image_name',
+        'filter_name',
+        'frame_count',
+        'fps_call',
+        'fps_stream',
+        'fps_prefetch'], rows)
+
+
+def benchmarkTemporalFilters(
+        windows=((3, 5), (3, 9), (5, 15)), frame_count=20):
+    """
+    Compares the runtime of the temporal mean and median filters updated
+    incrementally as the window slides against recomputing every window from
+    scratch, and checks that their results are the same. The frames are
+    quantized to uint8, the only type the running median keeps histograms
+    of. The median of a window of fewer than TF.MIN_RUNNING_MEDIAN_FRAMES
+    frames is recomputed either way.
+
+    :param windows: The (kernel_size, temporal_size) windows to benchmark
+    :param frame_count: The number of frames to filter
+
+    :raises AssertionError: If the incremental result differs from the
+        recomputed result
+    """
+    rows = []
+    for image_path in IMAGE_PATHS:
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        image = plt.imread(image_path)
+
+        # Quantize the frames to 8 bits, whose median is kept in histograms
+        frames = [
+            np.round(np.clip(frame, 0, 1) * 255).astype(np.uint8)
+            for frame in generateFrames(image, frame_count)]
+
+        for filter_name in ['mean', 'median']:
+            for kernel_size, temporal_size in windows:
+                start_time = time.perf_counter_ns()
+                incremental_frames = TF.applyFilter(
+                    frames, filter_name, kernel_size, temporal_size)
+                incremental_runtime = time.perf_counter_ns() - start_time
+
+                start_time = time.perf_counter_ns()
+                recomputed_frames = TF.applyFilter(
+                    frames, filter_name, kernel_size, temporal_size,
+                    incremental=False)
+                recomputed_runtime = time.perf_counter_ns() - start_time
+
+                max_error = np.max(
+                    np.abs(incremental_frames - recomputed_frames))
+                if max_error > 1e-6:
+                    raise AssertionError(
+                        f'Temporal {filter_name} differs by {max_error}.')
+
+                print(f'Image: {image_name}\tFilter: {filter_name}\t'
+                      f'Window: {kernel_size}x{kernel_size}x{temporal_size}\t'
+                      f'Speedup: '
+                      f'{recomputed_runtime / incremental_runtime:.2f}')
+
+                rows.append([
+                    image_name,
+                    filter_name,
+                    kernel_size,
+                    temporal_size,
+                    frame_count,
+                    incremental_runtime,
+                    recomputed_runtime,
+                    max_error])
+
+    writeBenchmarkResults('benchmark-temporal.csv', [
+        'image_name',
+        'filter_name',
+        'kernel_size',
+        'temporal_size',
+        'frame_count',
+        'runtime_incremental',
+        'runtime_recomputed',
+        'max_error'], rows)
+
+
+def benchmarkRegions(fractions=(0.01, 0.1, 0.5, 1.0)):
+    """
+    Compares the runtime of filtering a circular mask covering a fraction of
+    the image against filtering the whole image, and checks that the masked
+    pixels are the same. The frequency domain low pass filter cannot be
+    tiled, so it filters the whole image for any mask.
+
+    :param fractions: The fractions of the image the masks cover
+
+    :raises AssertionError: If a masked pixel differs from the whole image
+        being filtered
+    """
+    filters = [
+        (LF, 'gaussian', 7, {}),
+        (LF, 'box', 7, {}),
+        (LF, 'low_pass', 15, {'domain': 'frequency'}),
+        (NLF, 'median', 5, {}),
+        (ED, 'magnitude', 3, {}),
+    ]
+
+    rows = []
+    for image_path in IMAGE_PATHS:
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        image = plt.imread(image_path)
+
+        # Circles centred on the image, covering each fraction of it
+        height, width = image.shape[:2]
+        rows_grid, columns_grid = np.mgrid[:height, :width]
+        distances = np.hypot(
+            rows_grid - height / 2, columns_grid - width / 2)
+        radii = np.quantile(distances, fractions)
+
+        for F, filter_name, kernel_size, kwargs in filters:
+            image_runtime, filtered_image = timeFilter(
+                F, image, filter_name, kernel_size, **kwargs)
+
+            for fraction, radius in zip(fractions, radii):
+                mask = distances <= radius
+                mask_runtime, masked_image = timeFilter(
+                    F, image, filter_name, kernel_size, mask=mask, **kwargs)
+
+                max_error = np.max(
+                    np.abs(masked_image[mask] - filtered_image[mask]))
+                if max_error > 1e-6:
+                    raise AssertionError(
+                        f'Masked {filter_name} differs by {max_error}.')
+
+                print(f'Image: {image_name}\tFilter: {filter_name}\t'
+                      f'Masked: {fraction:.0%}\t'
+                      f'Speedup: {image_runtime / mask_runtime:.2f}')
+
+                rows.append([
+                    image_name,
+                    filter_name,
+                    kernel_size,
+                    fraction,
+                    image_runtime,
+                    mask_runtime])
+
+    writeBenchmarkResults('benchmark-regions.csv', [
+        'image_name',
+        'filter_name',
+        'kernel_size',
+        'masked_fraction',
+        'runtime_image',
+        'runtime_mask'], rows)
+
+
+def benchmarkPyramid(tolerance=0.01):
+    """
+    Compares the runtime of large kernel filters approximated on a pyramid
+    against the exact filters, and checks the error of the approximation
+    over the whole image. box and the frequency domain low pass filters are
+    never approximated, as their cost does not grow with the kernel size.
+    The spatial cutoff and the number of values the alpha-trimmed mean trims
+    are scaled to each level.
+
+    :param tolerance: The root mean square error allowed
+
+    :raises AssertionError: If the error over the whole image is more than
+        the tolerance
+    """
+    filters = [
+        (LF, 'gaussian', 31, {}),
+        (LF, 'gaussian', 63, {}),
+        (LF, 'box', 63, {}),
+        (LF, 'butterworth_low_pass', 63, {'cutoff': 10.0}),
+        (LF, 'butterworth_low_pass', 63, {'domain': 'frequency'}),
+        (NLF, 'median', 31, {}),
+        (NLF, 'alpha_trimmed_mean', 31, {}),
+        (NLF, 'alpha_trimmed_mean', 31, {'d': 400}),
+    ]
+
+    rows = []
+    for image_path in IMAGE_PATHS:
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        image = plt.imread(image_path)
+
+        for F, filter_name, kernel_size, kwargs in filters:
+            exact_runtime, exact_image = timeFilter(
+                F, image, filter_name, kernel_size, **kwargs)
+            approximate_runtime, approximate_image = timeFilter(
+                F, image, filter_name, kernel_size, tolerance=tolerance,
+                **kwargs)
+
+            difference = np.abs(approximate_image - exact_image)
+            max_error = np.max(difference)
+            rms_error = np.sqrt(np.mean(np.square(difference)))
+
+            print(f'Image: {image_name}\tFilter: {filter_name}\t'
+                  f'Kernel Size: {kernel_size}\t'
+                  f'Speedup: {exact_runtime / approximate_runtime:.2f}\t'
+                  f'RMS Error: {rms_error:.3e}')
+
+            if rms_error > tolerance:
+                raise AssertionError(
+                    f'{filter_name} {kernel_size} on {image_name} is '
+                    f'approximated with an error of {rms_error:.3e}, more '
+                    f'than the tolerance of {tolerance}.')
+
+            rows.append([
+                image_name,
+                filter_name,
+                kernel_size,
+                tolerance,
+                exact_runtime,
+                approximate_runtime,
+                max_error,
+                rms_error])
+
+    writeBenchmarkResults('benchmark-pyramid.csv', [
+        'image_name',
+        'filter_name',
+        'kernel_size',
+        'tolerance',
+        'runtime_exact',
+        'runtime_approximate',
+        'max_error',
+        'rms_error'], rows)
+
+
+def checkCannyEdges(size=64, radius=20):
+    """
+    Checks the edges the Canny edge detector finds in synthetic images: a
+    step gives a single straight line, a smoothed disc gives a closed ring at
+    its radius, and a flat image gives no edges. The edges of a mask or boxes
+    must be those of the whole image, and a memory budget that would tile
+    the image must be refused.
+
+    :param size: The size of the synthetic images
+    :param radius: The radius of the disc
+
+    :raises AssertionError: If the edges of an image are not as expected
+    """
+    # The step is between columns size // 2 - 1 and size // 2, and every row
+    # must mark the same single column in either precision
+    step = np.zeros((size, size))
+    step[:, size // 2:] = 1
+    for dtype in [np.float64, np.float32]:
+        edges = ED.applyFilter(step, 'canny', 3, dtype=dtype)
+        columns = {tuple(np.flatnonzero(row)) for row in edges}
+        if len(columns) != 1 or len(next(iter(columns))) != 1:
+            raise AssertionError(
+                f'The edge of a step in {np.dtype(dtype)} is not a single '
+                f'straight line: {columns}.')
+
+    # Every edge of the disc must lie on its radius, the edges must be one
+    # 8-connected component, and every 5 degrees around the disc must have
+    # an edge
+    rows, columns = np.indices((size, size)) - (size - 1) / 2
+    distances = np.hypot(rows, columns)
+    disc = LF.applyFilter(
+        (distances <= radius).astype(np.float64), 'gaussian', 5)
+    edges = ED.applyFilter(disc, 'canny', 3) > 0
+    edge_distances = distances[edges]
+    angles = np.degrees(np.arctan2(rows[edges], columns[edges])) % 360
+    labels = ED.labelComponents(edges)
+    if edge_distances.size == 0 or \
+            np.max(np.abs(edge_distances - radius)) > 1.5:
+        raise AssertionError(
+            f'The edges of a disc of radius {radius} are not on its radius.')
+    if len(np.unique(labels[edges])) != 1 or \
+            len(np.unique(angles // 5)) != 72:
+        raise AssertionError(
+            f'The edges of a disc of radius {radius} are not a closed ring.')
+
+    # The thresholds and the traced edges of a mask or boxes, split into
+    # small tiles, are those of the whole disc
+    whole_edges = ED.applyFilter(disc, 'canny', 3)
+    mask = columns < 0
+    masked_edges = ED.applyFilter(disc, 'canny', 3, mask=mask, tile_size=16)
+    boxed_edges = ED.applyFilter(
+        disc, 'canny', 3, boxes=[(0, 0, size // 2, size)], fill=0)
+    if not np.array_equal(masked_edges[mask], whole_edges[mask]) or \
+            not np.array_equal(boxed_edges[:size // 2],
+                               whole_edges[:size // 2]):
+        raise AssertionError(
+            'The edges of a mask or boxes differ from the whole image.')
+    budget = ED.estimatePeakMemory(disc.shape, disc.dtype, 'canny', 3) // 2
+    try:
+        ED.applyFilter(disc, 'canny', 3, memory_budget=budget)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Canny accepts a budget it needs tiles for.')
+
+    # Neither the inside nor the border of a flat image is an edge
+    for value in [0.0, 0.5]:
+        edges = ED.applyFilter(np.full((size, size), value), 'canny', 3)
+        if np.any(edges):
+            raise AssertionError(
+                f'A flat image of {value} has {np.count_nonzero(edges)} '
+                f'edges.')
+
+
+def benchmarkCanny(repeats=(1, 2, 4, 8)):
+    """
+    Checks the edges of the Canny edge detector on synthetic images with
+    checkCannyEdges, then times it on each image tiled into larger scenes,
+    reporting the runtime per megapixel, which stays flat if the detector
+    scales linearly with the size of the scene
+
+    :param repeats: The number of times each image is tiled along each axis
+
+    :raises AssertionError: If the edges of a synthetic image are not as
+        expected
+    """
+    checkCannyEdges()
+
+    rows = []
+    for image_path in IMAGE_PATHS:
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        image = LF.applyFilter(plt.imread(image_path), 'gaussian', 5)
+
+        for repeat in repeats:
+            scene = np.tile(image, (repeat, repeat))
+            runtime, _ = timeFilter(ED, scene, 'canny', 3)
+            megapixels = scene.shape[0] * scene.shape[1] / 1e6
+
+            print(f'Image: {image_name}\tTiles: {repeat}x{repeat}\t'
+                  f'Megapixels: {megapixels:.2f}\t'
+                  f'Runtime per Megapixel: {runtime / 1e9 / megapixels:.3f}s')
+
+            rows.append([image_name, repeat, megapixels, runtime])
+
+    writeBenchmarkResults('benchmark-canny.csv', [
+        'image_name',
+        'repeat',
+        'megapixels',
+        'runtime'], rows)
+
+
+def benchmarkHistogram(
+        kernel_sizes=(5, 15, 31),
+        integer_types=(np.uint8, np.uint16)):
+    """
+    Compares the runtime of the non-linear filters computed from sliding
+    histograms against sorting every window, on the images quantized to
+    integers, and checks that both give the same image. Both are computed in
+    float64 so that averaging two integers cannot overflow. The histograms
+    are forced at every kernel size, and the method histogram=True picks is
+    reported beside the speedup.
+
+    :param kernel_sizes: The sizes of the kernels to test
+    :param integer_types: The integer types to quantize the images to
+
+    :raises AssertionError: If the filters differ
+    """
+    _, _, filter_names = FILTERS[1]
+
+    rows = []
+    for image_path in IMAGE_PATHS:
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        image = plt.imread(image_path)
+
+        for integer_type in integer_types:
+            integer_image = np.round(
+                image * np.iinfo(integer_type).max).astype(integer_type)
+
+            for filter_name in filter_names:
+                for kernel_size in kernel_sizes:
+                    sort_runtime, sorted_image = timeFilter(
+                        NLF, integer_image, filter_name, kernel_size,
+                        dtype=np.float64)
+                    histogram_runtime, histogram_image = timeFilter(
+                        NLF, integer_image, filter_name, kernel_size,
+                        dtype=np.float64, histogram='always')
+                    method = NLF.registry.getMethod(
+                        NLF.registry.getFilter(filter_name), integer_type,
+                        kernel_size, True)
+
+                    if not np.array_equal(
+                            sorted_image, histogram_image, equal_nan=True):
+                        raise AssertionError(
+                            f'Histogram {filter_name} differs on '
+                            f'{np.dtype(integer_type).name} {image_name}.')
+
+                    print(f'Image: {image_name}\t'
+                          f'Type: {np.dtype(integer_type).name}\t'
+                          f'Filter: {filter_name}\t'
+                          f'Kernel Size: {kernel_size}\t'
+                          f'Speedup: {sort_runtime / histogram_runtime:.2f}\t'
+                          f'Method: {method}')
+
+                    rows.append([
+                        image_name,
+                        np.dtype(integer_type).name,
+                        filter_name,
+                        kernel_size,
+                        sort_runtime,
+                        histogram_runtime,
+                        method])
+
+    writeBenchmarkResults('benchmark-histogram.csv', [
+        'image_name',
+        'integer_type',
+        'filter_name',
+        'kernel_size',
+        'runtime_sort',
+        'runtime_histogram',
+        'method'], rows)
+
+
+def measurePeakMemory(function):
+    """
+    Calls a function and measures the most memory it held at once
+
+    :param function: The function to call
+
+    :return: The runtime in nanoseconds, the peak memory in bytes and the
+        result of the function
+    """
+    tracemalloc.start()
+    try:
+        start_time = time.perf_counter_ns()
+        result = function()
+        end_time = time.perf_counter_ns()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return end_time - start_time, peak_memory, result
+
+
+def benchmarkBorders(repeat=2):
+    """
+    Compares the runtime and peak memory of the spatial filters handling
+    their borders without padding the image against padding a copy of the
+    image first, for every type of padding, and checks that both give the
+    same image
+
+    :param repeat: The number of times each image is tiled along each axis,
+        so that the scene is large enough for the padded copy to matter
+
+    :raises AssertionError: If the filters differ
+    """
+    filters = [
+        (NLF, 'median', 5),
+        (LF, 'geometric_mean', 5),
+    ]
+
+    rows = []
+    for image_path in IMAGE_PATHS:
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        image = np.tile(plt.imread(image_path), (repeat, repeat))
+
+        for F, filter_name, kernel_size in filters:
+            pad_width = getPadWidth(
+                F.getHalo(filter_name, kernel_size), image.ndim)
+
+            for padding in PADDING_MODES:
+                padded_runtime, padded_memory, padded_image = \
+                    measurePeakMemory(lambda: F.applyFilter(
+                        np.pad(image, pad_width, mode=padding), filter_name,
+                        kernel_size, padding=None))
+                border_runtime, border_memory, border_image = \
+                    measurePeakMemory(lambda: F.applyFilter(
+                        image, filter_name, kernel_size, padding=padding))
+
+                if not np.allclose(
+                        padded_image, border_image, atol=1e-6,
+                        equal_nan=True):
+                    raise AssertionError(
+                        f'{filter_name} with {padding} borders differs.')
+
+                print(f'Image: {image_name}\tFilter: {filter_name}\t'
+                      f'Padding: {padding}\t'
+                      f'Speedup: {padded_runtime / border_runtime:.2f}\t'
+                      f'Peak Memory: {padded_memory / 2 ** 20:.1f}MiB -> '
+                      f'{border_memory / 2 ** 20:.1f}MiB')
+
+                rows.append([
+                    image_name,
+                    filter_name,
+                    kernel_size,
+                    padding,
+                    padded_runtime,
+                    border_runtime,
+                    padded_memory,
+                    border_memory])
+
+    writeBenchmarkResults('benchmark-borders.csv', [
+        'image_name',
+        'filter_name',
+        'kernel_size',
+        'padding',
+        'runtime_padded',
+        'runtime_borders',
+        'peak_memory_padded',
+        'peak_memory_borders'], rows)
+
+
+def benchmarkMemory(underestimate=0.75):
+    """
+    Compares the peak memory planned for each filter against the peak
+    measured by tracemalloc, and checks that filtering within a budget
+    halfway between the least any tile needs and the planned memory picks
+    tiles that fit and gives the same image. Filters that cannot be tiled
+    must refuse the budget instead. Rank filters of uint8 images are also
+    planned using their histograms.
+
+    :param underestimate: The smallest fraction of the measured peak the
+        planned peak may be
+
+    :raises AssertionError: If a plan underestimates the measured peak,
+        filtering in tiles exceeds the budget or changes the image, or a
+        filter that cannot be tiled accepts the budget
+    """
+    # The filters and their arguments. The recursive Gaussian, the frequency
+    # domain low pass, the contra-harmonic mean and Canny cannot be tiled.
+    filters = [
+        (LF, 'gaussian', 15, {}),
+        (LF, 'box', 9, {}),
+        (LF, 'recursive_gaussian', 9, {}),
+        (LF, 'low_pass', 15, {'domain': 'frequency'}),
+        (LF, 'geometric_mean', 5, {}),
+        (LF, 'contra_harmonic_mean', 3, {}),
+        (NLF, 'median', 5, {}),
+        (NLF, 'adaptive_weighted_median', 5, {}),
+        (NLF, 'median', 15, {'histogram': True}),
+        (NLF, 'alpha_trimmed_mean', 7, {'histogram': 'always'}),
+        (ED, 'magnitude', None, {}),
+        (ED, 'canny', None, {}),
+    ]
+
+    rows = []
+    for image_path in IMAGE_PATHS:
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        image = plt.imread(image_path)
+
+        for F, filter_name, kernel_size, kwargs in filters:
+            # The histograms are only used for integer images
+            filter_image = image
+            if kwargs.get('histogram'):
+                filter_image = np.round(image * 255).astype(np.uint8)
+
+            # Filter once before measuring, so that the kernels are built and
+            # cached
+            filtered_image = F.applyFilter(
+                filter_image, filter_name, kernel_size, **kwargs)
+            planned_memory = F.estimatePeakMemory(
+                filter_image.shape, filter_image.dtype, filter_name,
+                kernel_size, **kwargs)
+            runtime, measured_memory, _ = measurePeakMemory(
+                lambda: F.applyFilter(
+                    filter_image, filter_name, kernel_size, **kwargs))
+            if planned_memory < underestimate * measured_memory:
+                raise AssertionError(
+                    f'The plan for {filter_name} underestimates its peak.')
+
+            # Every tile needs at least the filtered image and the overhead
+            smallest_memory = filtered_image.nbytes + OVERHEAD
+            budget = smallest_memory + \
+                (planned_memory - smallest_memory) // 2
+            if F.registry.isTileable(F, filter_name, kernel_size, **kwargs):
+                tile_size = F.getTileSize(
+                    filter_image.shape, filter_image.dtype, filter_name,
+                    kernel_size, budget, **kwargs)
+                tiled_image = F.applyFilter(
+                    filter_image, filter_name, kernel_size,
+                    memory_budget=budget, **kwargs)
+                tiled_runtime, tiled_memory, _ = measurePeakMemory(
+                    lambda: F.applyFilter(
+                        filter_image, filter_name, kernel_size,
+                        memory_budget=budget, **kwargs))
+                if tiled_memory > budget:
+                    raise AssertionError(
+                        f'{filter_name} in tiles exceeds its budget.')
+                if not np.allclose(tiled_image, filtered_image, atol=1e-6,
+                                   equal_nan=True):
+                    raise AssertionError(f'{filter_name} in tiles differs.')
+            else:
+                # The filter would give a different image in tiles
+                try:
+                    F.applyFilter(
+                        filter_image, filter_name, kernel_size,
+                        memory_budget=budget, **kwargs)
+                except ValueError:
+                    pass
+                else:
+                    raise AssertionError(
+                        f'{filter_name} accepts a budget it needs tiles for.')
+                tile_size = tiled_memory = tiled_runtime = None
+
+            method = F.registry.getMethod(
+                F.registry.getFilter(filter_name), filter_image.dtype,
+                kernel_size, kwargs.get('histogram', False))
+            print(f'Image: {image_name}\tFilter: {filter_name}\t'
+                  f'Method: {method}\t'
+                  f'Planned: {planned_memory / 2 ** 20:.2f}MiB\t'
+                  f'Measured: {measured_memory / 2 ** 20:.2f}MiB\t'
+                  f'Budget: {budget / 2 ** 20:.2f}MiB\t'
+                  f'Tile Size: {tile_size}\t'
+                  f'Tiled: ' + ('refused' if tiled_memory is None
+                                else f'{tiled_memory / 2 ** 20:.2f}MiB'))
+
+            rows.append([
+                image_name,
+                filter_name,
+                kernel_size,
+                method,
+                planned_memory,
+                measured_memory,
+                runtime,
+                budget,
+                tile_size,
+                tiled_memory,
+                tiled_runtime])
+
+    writeBenchmarkResults('benchmark-memory.csv', [
+        'image_name',
+        'filter_name',
+        'kernel_size',
+        'method',
+        'planned_memory',
+        'measured_memory',
+        'runtime',
+        'budget',
+        'tile_size',
+        'tiled_memory',
+        'tiled_runtime'], rows)
+
+
+def startWorker():
+    """
+    Starts a filter worker that reads requests from its stdin
+
+    :return: The worker process
+    """
+    worker_path = os.path.join(os.path.dirname(__file__), 'worker.py')
+    return subprocess.Popen(
+        [sys.executable, worker_path], stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE, text=True)
+
+
+def sendRequest(worker, request):
+    """
+    Sends a request to a filter worker and waits for its reply
+
+    :param worker: The worker process
+    :param request: The request as a dictionary
+
+    :return: The reply as a dictionary
+
+    :raises AssertionError: If the request fails
+    """
+    worker.stdin.write(json.dumps(request) + '\n')
+    worker.stdin.flush()
+    reply = json.loads(worker.stdout.readline())
+    if reply['status'] != 'ok':
+        raise AssertionError(f'The worker failed: {reply["error"]}')
+    return reply
+
+
+def benchmarkWorker(job_count=50, cold_count=3):
+    """
+    Compares the latency of a filter job sent to a long-lived worker against
+    starting a fresh worker for every job, which pays to import the filters
+    and build their kernels each time as main.py does, and checks that the
+    worker writes the same image as filtering it directly
+
+    :param job_count: The number of jobs sent to the long-lived worker
+    :param cold_count: The number of jobs sent to fresh workers
+
+    :raises AssertionError: If a job fails or writes a different image
+    """
+    jobs = [
+        (LF, 'LF', 'gaussian', 7),
+        (LF, 'LF', 'box', 7),
+        (NLF, 'NLF', 'median', 3),
+        (ED, 'ED', 'magnitude', None),
+    ]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for image_path in IMAGE_PATHS:
+            image_name = os.path.splitext(os.path.basename(image_path))[0]
+            image = plt.imread(image_path)
+            input_path = os.path.join(directory, f'{image_name}.npy')
+            output_path = os.path.join(directory, 'filtered.npy')
+            np.save(input_path, image)
+
+            for F, class_name, filter_name, kernel_size in jobs:
+                request = {
+                    'class': class_name,
+                    'filter': filter_name,
+                    'kernel_size': kernel_size,
+                    'input': input_path,
+                    'output': output_path,
+                }
+
+                # Start a fresh worker for every job
+                cold_latencies = []
+                for _ in range(cold_count):
+                    start_time = time.perf_counter_ns()
+                    worker = startWorker()
+                    sendRequest(worker, request)
+                    worker.stdin.close()
+                    worker.wait()
+                    cold_latencies.append(time.perf_counter_ns() - start_time)
+
+                # Send every job to one worker, timing each round trip
+                worker = startWorker()
+                latencies = []
+                for _ in range(job_count):
+                    start_time = time.perf_counter_ns()
+                    sendRequest(worker, request)
+                    latencies.append(time.perf_counter_ns() - start_time)
+                stats = sendRequest(worker, {'command': 'stats'})
+                sendRequest(worker, {'command': 'shutdown'})
+                worker.wait()
+
+                # Check that the worker writes the image filtered directly
+                expected_image = F.applyFilter(image, filter_name, kernel_size)
+                if not np.allclose(
+                        np.load(output_path), expected_image, atol=1e-6):
+                    raise AssertionError(f'The worker changes {filter_name}.')
+
+                cold_latency = np.median(cold_latencies)
+                p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+                print(f'Image: {image_name}\tFilter: {filter_name}\t'
+                      f'Cold: {cold_latency / 1e6:.1f}ms\t'
+                      f'Warm p50: {p50 / 1e6:.2f}ms\t'
+                      f'p90: {p90 / 1e6:.2f}ms\t'
+                      f'p99: {p99 / 1e6:.2f}ms\t'
+                      f'Worker p50: {stats["p50"] / 1e6:.2f}ms')
+
+                rows.append([
+                    image_name,
+                    filter_name,
+                    job_count,
+                    cold_latency,
+                    p50,
+                    p90,
+                    p99,
+                    stats['p50'],
+                    stats['p90'],
+                    stats['p99']])
+
+    writeBenchmarkResults('benchmark-worker.csv', [
+        'image_name',
+        'filter_name',
+        'job_count',
+        'cold_latency',
+        'latency_p50',
+        'latency_p90',
+        'latency_p99',
+        'worker_latency_p50',
+        'worker_latency_p90',
+        'worker_latency_p99'], rows)
+
+
+# Times importing a module and its first filter in a fresh interpreter, and
+# lists the plotting and table packages loaded after each
+STARTUP_SCRIPT = """
+import sys
+import json
+import time
+start_time = time.perf_counter_ns()
+sys.path.insert(0, {scripts!r})
+{imports}
+imported = [name for name in ('matplotlib', 'pandas') if name in sys.modules]
+import_time = time.perf_counter_ns() - start_time
+{first_filter}
+filtered = [name for name in ('matplotlib', 'pandas') if name in sys.modules]
+first_filter_time = time.perf_counter_ns() - start_time
+print(json.dumps([import_time, first_filter_time, imported, filtered]))
+"""
+
+
+def benchmarkStartup(repeat=5):
+    """
+    Measures the time to import the filters and the time to the first
+    filtered image in a fresh interpreter, for the filters on their own, for
+    main.py, and for main.py with matplotlib.pyplot and pandas imported up
+    front as it used to, and checks which of them load matplotlib and pandas
+
+    :param repeat: The number of fresh interpreters each case is timed in
+
+    :raises AssertionError: If the filters load matplotlib or pandas, or
+        main.py loads them before they are needed
+    """
+    image_path = IMAGE_PATHS[0]
+    cases = [
+        ('core', 'from linearFilters import LF\nimport numpy as np',
+         'LF.applyFilter(np.load({path!r}), "gaussian", 7)', [], []),
+        ('cli', 'import main',
+         f'main.LF.applyFilter(main.readImage({image_path!r}), '
+         '"gaussian", 7)', [], ['matplotlib']),
+        ('cli_eager',
+         'import matplotlib.pyplot\nimport pandas\nimport main',
+         f'main.LF.applyFilter(main.readImage({image_path!r}), '
+         '"gaussian", 7)', None, None),
+    ]
+    scripts = os.path.dirname(os.path.abspath(__file__))
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        # The filters on their own are given arrays rather than image files
+        path = os.path.join(directory, 'image.npy')
+        np.save(path, plt.imread(image_path))
+
+        for label, imports, first_filter, expected_imported, \
+                expected_filtered in cases:
+            script = STARTUP_SCRIPT.format(
+                scripts=scripts, imports=imports,
+                first_filter=first_filter.format(path=path))
+
+            times = []
+            for _ in range(repeat):
+                start_time = time.perf_counter_ns()
+                output = subprocess.run(
+                    [sys.executable, '-c', script], capture_output=True,
+                    text=True, check=True).stdout
+                process_time = time.perf_counter_ns() - start_time
+                import_time, first_filter_time, imported, filtered = \
+                    json.loads(output)
+                times.append([import_time, first_filter_time, process_time])
+
+            # Only the image module of matplotlib is loaded to read images
+            if expected_imported is not None and (
+                    imported != expected_imported
+                    or filtered != expected_filtered):
+                raise AssertionError(
+                    f'{label} loads {imported} on import and {filtered} to '
+                    f'filter, not {expected_imported} and '
+                    f'{expected_filtered}.')
+
+            import_time, first_filter_time, process_time = \
+                np.median(times, axis=0)
+            print(f'Case: {label}\t'
+                  f'Import: {import_time / 1e6:.1f}ms\t'
+                  f'First Filter: {first_filter_time / 1e6:.1f}ms\t'
+                  f'Process: {process_time / 1e6:.1f}ms\t'
+                  f'Loaded: {",".join(filtered) or "-"}')
+
+            rows.append([
+                label,
+                import_time,
+                first_filter_time,
+                process_time,
+                ' '.join(filtered)])
+
+    writeBenchmarkResults('benchmark-startup.csv', [
+        'case',
+        'import_time',
+        'first_filter_time',
+        'process_time',
+        'loaded_modules'], rows)
+
+
+def benchmarkQueue(worker_count=3, lease_time=2):
+    """
+    Runs a small grid of the filter sweep from the job queue with several
+    worker processes on this host, as workers on several hosts would, kills
+    one of them while it holds a job, and checks that its job is claimed
+    again once its lease expires and that every job is collected exactly
+    once. The sweep runs in a temporary copy of the images, so the results
+    files are not touched.
+
+    :param worker_count: The number of worker processes
+    :param lease_time: The number of seconds of every lease
+
+    :raises AssertionError: If a job is not complete, was not claimed again
+        after its worker was killed, or is not collected exactly once
+    """
+    # main.py imports matplotlib on its first read only, so it is imported
+    # here for its jobs
+    import main
+
+    jobs = []
+    for image_path in IMAGE_PATHS:
+        jobs += main.getFilterJobs(
+            image_path, LF, ['gaussian', 'box'], max_kernel_size=7)
+        jobs += main.getFilterJobs(image_path, NLF, ['median'],
+                                   max_kernel_size=7)
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'main.py')
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, 'img'))
+        os.makedirs(os.path.join(directory, 'results'))
+        for image_path in IMAGE_PATHS:
+            shutil.copy(image_path, os.path.join(directory, 'img'))
+
+        queue = JobQueue(os.path.join(directory, main.QUEUE_FILE))
+        queue.addJobs([{'sweep': 'filter', 'job': job} for job in jobs])
+
+        start_time = time.perf_counter_ns()
+        workers = [
+            subprocess.Popen(
+                [sys.executable, main_path, 'work', '--lease',
+                 str(lease_time)], cwd=directory,
+                stdout=subprocess.DEVNULL)
+            for _ in range(worker_count)]
+
+        # Kill the first worker while it holds a job
+        killed = workers[0]
+        while queue.connection.execute(
+                'SELECT COUNT(*) FROM jobs WHERE status = ? AND worker LIKE ?',
+                (CLAIMED, f'%-{killed.pid}')).fetchone()[0] == 0:
+            time.sleep(0.05)
+        killed.send_signal(signal.SIGKILL)
+        killed.wait()
+
+        for worker in workers[1:]:
+            if worker.wait() != 0:
+                raise AssertionError(
+                    f'A worker exited with code {worker.returncode}.')
+        runtime = time.perf_counter_ns() - start_time
+
+        counts = queue.getCounts()
+        reclaimed = queue.connection.execute(
+            'SELECT COUNT(*) FROM jobs WHERE attempts > 1').fetchone()[0]
+        queue.close()
+        if counts['complete'] != len(jobs):
+            raise AssertionError(f'Not every job is complete: {counts}.')
+        if reclaimed == 0:
+            raise AssertionError(
+                'The job of the killed worker was not claimed again.')
+
+        # Collecting twice writes every result once
+        for _ in range(2):
+            subprocess.run(
+                [sys.executable, main_path, 'collect'], cwd=directory,
+                stdout=subprocess.DEVNULL, check=True)
+        with open(os.path.join(directory, main.RESULTS_FILES['filter']),
+                  newline='') as resultsFile:
+            rows = list(csv.DictReader(resultsFile))
+        keys = {tuple(row[key] for key in main.RESULT_KEYS['filter'])
+                for row in rows}
+        if len(rows) != len(jobs) or len(keys) != len(jobs):
+            raise AssertionError(
+                f'{len(rows)} rows of {len(keys)} jobs were collected, not '
+                f'{len(jobs)}.')
+        missing = [row['file_name'] for row in rows if not os.path.isfile(
+            os.path.join(directory, row['file_name']))]
+        if missing:
+            raise AssertionError(f'The images {missing} were not saved.')
+
+    print(f'Jobs: {len(jobs)}\tWorkers: {worker_count}\t'
+          f'Reclaimed: {reclaimed}\tCollected: {len(rows)}\t'
+          f'Runtime: {runtime / 1e9:.1f}s')
+
+    writeBenchmarkResults('benchmark-queue.csv', [
+        'job_count',
+        'worker_count',
+        'lease_time',
+        'reclaimed_count',
+        'collected_count',
+        'runtime'], [[
+            len(jobs),
+            worker_count,
+            lease_time,
+            reclaimed,
+            len(rows),
+            runtime]])
+
+
+if __name__ == '__main__':
+    main()
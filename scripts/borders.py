@@ -0,0 +1,179 @@
+import numpy as np
+
+
+# The types of padding every filter supports
+PADDING_MODES = ['constant', 'edge', 'linear_ramp', 'reflect', 'wrap']
+
+
+def getBorderIndices(start, stop, size, padding, pad_width):
+    """
+    Gets the pixels of the image that a range of rows or columns of the
+    padded image read, without padding the image. Rows and columns outside
+    the image are clamped to its edge, reflected about it or wrapped around
+    it, and the constant and linear ramp padding scale the clamped edge.
+
+    :param start: The first row or column, which is negative if it lies in
+        the padding before the image
+    :param stop: The row or column after the last
+    :param size: The number of rows or columns of the image
+    :param padding: The type of padding to use, as for np.pad
+    :param pad_width: The width of the padding of the whole image, which the
+        linear ramp falls to 0 over
+
+    :return: The index into the image of every row or column, and the weight
+        to scale each by, or None if none are scaled
+
+    :raises ValueError: If the type of padding is not supported
+    """
+    indices = np.arange(start, stop)
+    if padding == 'wrap':
+        return indices % size, None
+    if padding == 'reflect':
+        # Reflect about the edge pixels without repeating them, so the
+        # indices repeat every 2 * (size - 1)
+        period = max(2 * (size - 1), 1)
+        indices = np.abs(indices) % period
+        return np.where(indices >= size, period - indices, indices), None
+
+    clamped = np.clip(indices, 0, size - 1)
+    if padding == 'edge':
+        return clamped, None
+
+    # The distance of every row or column beyond the edge of the image
+    distance = np.maximum(np.maximum(-indices, indices - (size - 1)), 0)
+    if padding == 'constant':
+        return clamped, (distance == 0).astype(np.float64)
+    if padding == 'linear_ramp':
+        # Ramp linearly from the edge value down to 0 at the outermost
+        # value of the padding, as np.pad does
+        return clamped, np.clip(
+            (pad_width - distance) / max(pad_width, 1), 0, 1)
+    raise ValueError(f'Unsupported padding type: {padding}.')
+
+
+def getRegion(image, box, halo, padding):
+    """
+    Gets the pixels of an image that the output pixels in a box read. A
+    region inside the image is a view of it, and a region crossing its edges
+    is gathered from the pixels the padding reads, so the image is never
+    padded as a whole.
+
+    :param image: The image to be filtered
+    :param box: The (top, left, bottom, right) box of output pixels
+    :param halo: The number of pixels the filter reads beyond each edge of
+        an output pixel
+    :param padding: The type of padding to use. If None, the image already
+        includes the halo, so the region always lies inside it.
+
+    :return: The region, including the halo of every edge
+    """
+    top, left, bottom, right = box
+    if padding is None:
+        return image[top:bottom + 2 * halo, left:right + 2 * halo]
+
+    height, width = image.shape[:2]
+    if top >= halo and left >= halo and bottom + halo <= height and \
+            right + halo <= width:
+        return image[top - halo:bottom + halo, left - halo:right + halo]
+
+    rows, row_weights = getBorderIndices(
+        top - halo, bottom + halo, height, padding, halo)
+    columns, column_weights = getBorderIndices(
+        left - halo, right + halo, width, padding, halo)
+    # Gather the columns of only the rows the region reads, and then the
+    # rows, so that little more than the region is ever copied
+    first_row = rows.min()
+    region = np.take(
+        np.take(image[first_row:rows.max() + 1], columns, axis=1),
+        rows - first_row, axis=0)
+
+    # Scale the pixels of the constant and linear ramp padding. The corners
+    # are scaled along both axes, as np.pad pads the rows and then the
+    # columns. The region crosses an edge, so it is a copy and not a view.
+    if row_weights is not None:
+        for axis, weights in enumerate((row_weights, column_weights)):
+            scaled = np.flatnonzero(weights != 1)
+            view = np.swapaxes(region, 0, axis)
+            view[scaled] = view[scaled] * weights[scaled].reshape(
+                (-1,) + (1,) * (image.ndim - 1))
+    return region
+
+
+class PaddedImage:
+    """
+    A padded image that is never padded as a whole. Bands of consecutive
+    rows are gathered from the image as they are read, into a buffer that
+    every band reuses, so only the rows being read are ever held. The rows
+    inside the image are copied as they are, and only the pixels beyond its
+    edges are gathered and scaled.
+    """
+
+    def __init__(self, image, pad_width, padding):
+        """
+        Prepares the rows and columns that the padding reads
+
+        :param image: The image to be padded
+        :param pad_width: The number of pixels padded to every edge
+        :param padding: The type of padding to use, as for np.pad
+        """
+        height, width = image.shape[:2]
+        self.image = image
+        self.pad_width = pad_width
+        self.shape = (height + 2 * pad_width, width + 2 * pad_width) + \
+            image.shape[2:]
+
+        self.rows, self.row_weights = getBorderIndices(
+            -pad_width, height + pad_width, height, padding, pad_width)
+        columns, column_weights = getBorderIndices(
+            -pad_width, width + pad_width, width, padding, pad_width)
+
+        # The columns of the padding, and the columns of the image they read
+        self.border_columns = np.r_[
+            0:pad_width, pad_width + width:width + 2 * pad_width]
+        self.border_indices = columns[self.border_columns]
+        self.border_weights = None
+        if column_weights is not None:
+            self.border_weights = column_weights[self.border_columns].reshape(
+                (-1,) + (1,) * (image.ndim - 2))
+
+        self.buffer = None
+
+    def getRows(self, start, count):
+        """
+        Gets a band of consecutive rows of the padded image. The band is only
+        valid until the next band is read.
+
+        :param start: The first row of the padded image
+        :param count: The number of rows
+
+        :return: The (count, padded width) rows
+        """
+        if self.buffer is None or len(self.buffer) != count:
+            self.buffer = np.empty(
+                (count,) + self.shape[1:], dtype=self.image.dtype)
+        band = self.buffer
+
+        # Slice the rows if they lie inside the image, and gather them if not
+        height, width = self.image.shape[:2]
+        if start >= self.pad_width and \
+                start + count <= height + self.pad_width:
+            rows = self.image[start - self.pad_width:
+                              start - self.pad_width + count]
+        else:
+            rows = self.image[self.rows[start:start + count]]
+
+        band[:, self.pad_width:self.pad_width + width] = rows
+        border = rows[:, self.border_indices]
+        if self.border_weights is not None:
+            border = border * self.border_weights
+        band[:, self.border_columns] = border
+
+        # Scale the rows of the constant and linear ramp padding
+        if self.row_weights is not None:
+            weights = self.row_weights[start:start + count]
+            if np.any(weights != 1):
+                np.multiply(
+                    band, weights.reshape((-1,) + (1,) * (band.ndim - 1)),
+                    out=band, casting='unsafe')
+
+        return band
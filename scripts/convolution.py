@@ -0,0 +1,785 @@
+import numpy as np
+import math
+import time
+from numpy.lib.stride_tricks import sliding_window_view
+
+from instrumentation import PROFILER
+from borders import PaddedImage, getBorderIndices
+from slidingHistograms import SlidingHistograms
+
+
+# NumPy 2.0 added the out parameter to the FFT functions. Older versions
+# always allocate the transformed array.
+FFT_SUPPORTS_OUT = np.lib.NumpyVersion(np.__version__) >= '2.0.0'
+
+
+def getComplexDtype(dtype):
+    """
+    Gets the complex type with the same precision as a floating point type
+
+    :param dtype: The floating point type
+
+    :return: complex64 for float32 and complex128 otherwise
+    """
+    return np.result_type(dtype, np.complex64)
+
+
+def getConvolvedShape(shape, kernel_size, padding='constant'):
+    """
+    Gets the shape of an image after it has been convolved
+
+    :param shape: The shape of the image, either (height, width) or
+        (height, width, channels)
+    :param kernel_size: The size of the kernel
+    :param padding: The type of padding used. If None, the image is not
+        padded and only its valid region is convolved.
+
+    :return: The shape of the convolved image
+    """
+    if padding is not None:
+        return tuple(shape)
+    return (shape[0] - kernel_size + 1, shape[1] - kernel_size + 1) + \
+        tuple(shape[2:])
+
+
+def getPadWidth(pad_width, ndim):
+    """
+    Gets the pad width of every axis of an image for np.pad. Only the height
+    and width are padded; the channels of a multichannel image are not.
+
+    :param pad_width: The number of values padded to the edges of the height
+        and width, either a single integer or ((before, after),
+        (before, after))
+    :param ndim: The number of dimensions of the image
+
+    :return: The pad width of every axis
+    """
+    if isinstance(pad_width, (int, np.integer)):
+        pad_width = ((pad_width, pad_width), (pad_width, pad_width))
+    return tuple(pad_width) + ((0, 0),) * (ndim - 2)
+
+
+def composeKernels(first_kernel, second_kernel):
+    """
+    Composes two kernels into a single kernel. Convolving an image with the
+    composed kernel is the same as convolving it with the first kernel and
+    then the second, as convolution is associative.
+
+    :param first_kernel: The first kernel
+    :param second_kernel: The second kernel
+
+    :return: The composed kernel, whose size is the sum of the sizes of the
+        kernels minus one in each dimension
+    """
+    composed_kernel = np.zeros(shape=(
+        first_kernel.shape[0] + second_kernel.shape[0] - 1,
+        first_kernel.shape[1] + second_kernel.shape[1] - 1),
+        dtype=np.result_type(first_kernel, second_kernel, np.float64))
+
+    # Add a copy of the first kernel, shifted to and scaled by each element of
+    # the second kernel
+    height, width = first_kernel.shape
+    for (i, j), value in np.ndenumerate(second_kernel):
+        composed_kernel[i:i + height, j:j + width] += value * first_kernel
+
+    return composed_kernel
+
+
+def getFastLength(length):
+    """
+    Gets the smallest length of at least a given length whose only prime
+    factors are 2, 3 and 5. The FFT is much faster on such lengths than on
+    lengths with large prime factors.
+
+    :param length: The minimum length
+
+    :return: The fast length
+    """
+    fast_length = length
+    while True:
+        remainder = fast_length
+        for factor in (2, 3, 5):
+            while remainder % factor == 0:
+                remainder //= factor
+        if remainder == 1:
+            return fast_length
+        fast_length += 1
+
+
+def getKernelShape(shape):
+    """
+    Gets the shape of a kernel padded to the shape of an image. A kernel has
+    a single channel, which is broadcast over every channel of the image.
+
+    :param shape: The shape of the image
+
+    :return: The shape of the padded kernel
+    """
+    return tuple(shape[:2]) + (1,) * (len(shape) - 2)
+
+
+def getChannelKernel(kernel, ndim):
+    """
+    Adds a channel axis to a kernel if the image it is applied to has one
+
+    :param kernel: The kernel
+    :param ndim: The number of dimensions of the image
+
+    :return: A view of the kernel with the same number of dimensions as the
+        image
+    """
+    return kernel.reshape(kernel.shape[:2] + (1,) * (ndim - 2))
+
+
+def padImage(image, pad_width, mode='constant', out=None):
+    """
+    Pads an image in the same way as np.pad, optionally writing the padded
+    image into an existing buffer instead of allocating a new one
+
+    :param image: The image to be padded
+    :param pad_width: The number of values padded to the edges of the height
+        and width, either a single integer or ((before, after),
+        (before, after))
+    :param mode: The type of padding to use. Possible values are:
+        - 'constant'
+        - 'edge'
+        - 'linear_ramp'
+        - 'reflect'
+        - 'wrap'
+    :param out: The buffer to write the padded image into. If None, a new
+        array is allocated.
+
+    :return: The padded image
+    """
+    pad_width = getPadWidth(pad_width, image.ndim)
+    if out is None:
+        return np.pad(image, pad_width, mode=mode)
+
+    # Copy the image into the middle of the buffer
+    (top, bottom), (left, right) = pad_width[:2]
+    height, width = image.shape[:2]
+    out[top:top + height, left:left + width] = image
+
+    # Pad the rows and then the columns, using the padded rows to fill the
+    # corners, as np.pad does.
+    for axis, (before, after) in enumerate(pad_width[:2]):
+        size = image.shape[axis]
+        if axis == 0:
+            view = out[:, left:left + width]
+        else:
+            view = np.swapaxes(out, 0, 1)
+        first_edge = view[before]
+        last_edge = view[before + size - 1]
+
+        if mode == 'constant':
+            view[:before] = 0
+            view[before + size:] = 0
+        elif mode == 'edge':
+            view[:before] = first_edge
+            view[before + size:] = last_edge
+        elif mode == 'linear_ramp':
+            # Ramp linearly from the edge value down to 0 at the outermost
+            # value of the padding
+            ramp_shape = (-1,) + (1,) * first_edge.ndim
+            ramp = np.arange(before) / max(before, 1)
+            view[:before] = ramp.reshape(ramp_shape) * first_edge
+            ramp = np.arange(after - 1, -1, -1) / max(after, 1)
+            view[before + size:] = ramp.reshape(ramp_shape) * last_edge
+        elif mode in ('reflect', 'wrap'):
+            # Copy the rows of the image that each padded row reflects or
+            # wraps around to
+            indices, _ = getBorderIndices(
+                -before, size + after, size, mode, before)
+            view[:before] = view[before + indices[:before]]
+            view[before + size:] = view[before + indices[before + size:]]
+        else:
+            raise ValueError(f'Unsupported padding type: {mode}.')
+
+    return out
+
+
+def transformInPlace(transform, buffer):
+    """
+    Applies a Fourier transform over the first two axes of a complex buffer,
+    writing the result back into the buffer
+
+    :param transform: The transform, either np.fft.fftn or np.fft.ifftn
+    :param buffer: The complex buffer to transform
+
+    :return: The transformed buffer
+    """
+    if FFT_SUPPORTS_OUT:
+        return transform(buffer, axes=(0, 1), out=buffer)
+    buffer[...] = transform(buffer, axes=(0, 1))
+    return buffer
+
+
+def calculateSpatialDomainConvolution(
+        image,
+        kernel_size,
+        filter_function,
+        padding='constant',
+        dtype=None,
+        workspace=None,
+        out=None):
+    """
+    Performs a convolution on an image using a kernel using the spatial
+    domain algorithm. Shared by every class that implements ISpatialFilters.
+
+    The filter function is applied to a whole row of regions of interest at
+    a time, of shape (width, kernel_size, kernel_size) for a grayscale image
+    and (width, channels, kernel_size, kernel_size) for a multichannel image,
+    and must reduce each region over its last two axes.
+
+    :param image: The image to be convolved, either (height, width) or
+        (height, width, channels)
+    :param kernel_size: The size of the kernel
+    :param filter_function: The filter function to be applied
+    :param padding: The type of padding to use. If None, the image is
+        assumed to already include the padding and only the pixels whose
+        region of interest lies entirely inside the image are convolved.
+    :param dtype: The floating point type to compute in. If None, the type of
+        the image is used.
+    :param workspace: Unused, as the image is never padded as a whole. Kept
+        so that every algorithm takes the same arguments.
+    :param out: The array to write the convolved image into. If None, a new
+        array is allocated.
+
+    :return: The convolved image
+    """
+
+    # Convert the image to the requested precision so that the padded rows,
+    # the regions of interest and the output all share it.
+    if dtype is not None:
+        image = image.astype(dtype, copy=False)
+
+    # Get the shape of the convolved image
+    convolved_shape = getConvolvedShape(image.shape, kernel_size, padding)
+    height, width = convolved_shape[:2]
+
+    # Create an empty output image
+    with PROFILER.stage('allocate') as stage:
+        if out is None:
+            convolved_image = np.zeros(convolved_shape, dtype=image.dtype)
+            stage.allocate(convolved_image)
+        else:
+            convolved_image = out
+
+    # Pad the image virtually, gathering the rows each row of the output
+    # reads as it is convolved
+    if padding is not None:
+        padded_image = PaddedImage(image, (kernel_size - 1) // 2, padding)
+
+    # When profiling, time every call of the filter function so that the cost
+    # of the reductions can be told apart from the overhead of the loop.
+    # Each call reduces a row of regions.
+    reduction_time = [0]
+    if PROFILER.enabled:
+        reduce_roi = filter_function
+
+        def filter_function(roi):
+            start_time = time.perf_counter_ns()
+            convolved_value = reduce_roi(roi)
+            reduction_time[0] += time.perf_counter_ns() - start_time
+            return convolved_value
+
+    # Iterate over each row in the image
+    start_time = time.perf_counter_ns()
+    for i in range(height):
+        # Get the rows of the padded image the row reads. Rather than padding
+        # the whole image, only these rows are gathered from it, padding
+        # their ends and any rows beyond its edges.
+        if padding is None:
+            rows = image[i:i + kernel_size]
+        else:
+            rows = padded_image.getRows(i, kernel_size)
+
+        # Get a view of every region of interest (ROI) in the row, with the
+        # region in the last two axes. No pixels are copied.
+        rois = sliding_window_view(
+            rows, (kernel_size, kernel_size), axis=(0, 1))[0]
+
+        # Apply the desired kernel type to every channel of every ROI at once
+        convolved_image[i] = filter_function(rois)
+
+    if PROFILER.enabled:
+        loop_time = time.perf_counter_ns() - start_time
+        PROFILER.record('reduction', reduction_time[0], height)
+        PROFILER.record('loop', loop_time - reduction_time[0])
+
+    return convolved_image
+
+
+def calculateHistogramFilter(
+        image,
+        kernel_size,
+        statistic,
+        groups=None,
+        moments=False,
+        padding='constant',
+        dtype=None,
+        out=None):
+    """
+    Applies a rank filter to an integer image using histograms of the
+    windows, which are slid along the rows instead of sorting every window.
+    Used by the rank filters of NonLinearFilters.
+
+    The statistic is computed from the SlidingHistograms of a whole column of
+    windows at a time, for every row and channel, and must return one value
+    for each.
+
+    :param image: The uint8 or uint16 image to be filtered, either
+        (height, width) or (height, width, channels)
+    :param kernel_size: The size of the kernel
+    :param statistic: The function that computes the statistic from the
+        histograms
+    :param groups: The group of every offset of the window, which are kept in
+        separate histograms. If None, every offset is in one group.
+    :param moments: Whether the statistic needs the sums of the values
+    :param padding: The type of padding to use. If None, the image is
+        assumed to already include the padding.
+    :param dtype: The type of the filtered image. If None, the type of the
+        image is used.
+    :param out: The array to write the filtered image into. If None, a new
+        array is allocated.
+
+    :return: The filtered image
+    """
+    filtered_shape = getConvolvedShape(image.shape, kernel_size, padding)
+    height, width = filtered_shape[:2]
+
+    # The histograms read the padded columns straight from the image, so the
+    # image is never padded as a whole
+    with PROFILER.stage('allocate') as stage:
+        histograms = SlidingHistograms(
+            image, kernel_size, np.iinfo(image.dtype).max + 1, groups,
+            moments, padding)
+        stage.allocate(histograms.counts)
+        if out is None:
+            filtered_image = np.zeros(
+                filtered_shape, dtype=image.dtype if dtype is None else dtype)
+            stage.allocate(filtered_image)
+        else:
+            filtered_image = out
+
+    # Slide the windows of every row along the columns at once
+    with PROFILER.stage('histogram'):
+        column_shape = (height,) + filtered_shape[2:]
+        for column in range(width):
+            histograms.advance()
+            filtered_image[:, column] = np.reshape(
+                statistic(histograms), column_shape)
+
+    return filtered_image
+
+
+def calculateFrequencyDomainConvolution(
+        image,
+        kernel,
+        padding='constant',
+        dtype=None,
+        workspace=None,
+        out=None):
+    """
+    Performs a convolution on an image using a kernel using the Fast Fourier
+    Transform algorithm. Shared by every class that implements
+    IFrequencyFilters.
+
+    :param image: The image to be convolved, either (height, width) or
+        (height, width, channels). Every channel is transformed at once.
+    :param kernel: The kernel to convolve the image with
+    :param padding: The type of padding to use. If None, the image is
+        assumed to already include the padding and only the pixels whose
+        region of interest lies entirely inside the image are convolved.
+    :param dtype: The floating point type to compute in. float32 keeps the
+        padding, the kernel and the output in float32 and the spectra in
+        complex64. If None, the kernel and output are float64.
+    :param workspace: The workspace to borrow the spectrum buffer and the
+        kernel spectrum from. With NumPy 2.0 or newer, the image is padded
+        and transformed in place in the borrowed buffer. If None, every
+        intermediate array is allocated.
+    :param out: The array to write the convolved image into. If None, a new
+        array is allocated.
+
+    :return: The convolved image
+    """
+
+    # Convert the image and kernel to the requested precision. The padded
+    # kernel is float64 by default to match the kernels built by the filters.
+    kernel_dtype = np.float64
+    if dtype is not None:
+        image = image.astype(dtype, copy=False)
+        kernel = kernel.astype(dtype, copy=False)
+        kernel_dtype = dtype
+
+    # Creates tuple for size of padded image and kernel. The channels of a
+    # multichannel image are not padded.
+    new_size = (
+        image.shape[0] +
+        kernel.shape[0] -
+        1,
+        image.shape[1] +
+        kernel.shape[1] -
+        1) + image.shape[2:]
+
+    # Calculates half the size of the kernel in both dimensions
+    half_kernal = ((kernel.shape[0] - 1) / 2, (kernel.shape[1] - 1) / 2)
+    pad_width = (
+        (math.floor(half_kernal[0]), math.ceil(half_kernal[0])),
+        (math.floor(half_kernal[1]), math.ceil(half_kernal[1])))
+
+    # An image that already includes its padding is convolved as it is. The
+    # circular convolution then only wraps into the pixels that are cropped.
+    if padding is None:
+        new_size = image.shape
+        pad_width = ((0, 0), (0, 0))
+        padding = 'constant'
+
+    if workspace is None:
+        convolved_image = transformAndMultiply(
+            image, kernel, pad_width, new_size, padding, kernel_dtype, dtype)
+    else:
+        convolved_image = transformAndMultiplyInWorkspace(
+            image, kernel, pad_width, new_size, padding, kernel_dtype,
+            workspace)
+
+    # Function to calculate the padding of the convoluted image
+    def bounds(axis): return kernel.shape[axis] - 1
+
+    # Removes the padding from the convoluted image
+    with PROFILER.stage('crop') as stage:
+        convolved_image = convolved_image[bounds(
+            0): new_size[0], bounds(1): new_size[1]]
+        if out is not None:
+            np.copyto(out, convolved_image)
+            convolved_image = out
+        elif workspace is not None:
+            # The cropped image is a view of the workspace's spectrum buffer,
+            # which the next convolution would overwrite
+            convolved_image = convolved_image.copy()
+            stage.allocate(convolved_image)
+
+    return convolved_image
+
+
+def transformAndMultiply(
+        image, kernel, pad_width, new_size, padding, kernel_dtype, dtype):
+    """
+    Pads the image and kernel, multiplies their Fourier transforms and
+    inverses the product, allocating every intermediate array
+
+    :param image: The image to be convolved
+    :param kernel: The kernel to convolve the image with
+    :param pad_width: The padding to add to each edge of the image
+    :param new_size: The size of the padded image and kernel
+    :param padding: The type of padding to use
+    :param kernel_dtype: The floating point type of the padded kernel
+    :param dtype: The floating point type to compute in
+
+    :return: The real part of the convolved image, including its padding
+    """
+
+    # Pads the image with duplicate values and the kernel with 0s
+    with PROFILER.stage('pad') as stage:
+        pad_image = np.pad(
+            image, pad_width=getPadWidth(pad_width, image.ndim), mode=padding)
+
+        # Creates a new kernel with the same size as the padded image and
+        # fills it with 0s. This is requried for the convolution to work
+        # properly. The kernel has a single channel, which is broadcast over
+        # every channel of the image.
+        pad_kernel = np.zeros(
+            shape=getKernelShape(new_size), dtype=kernel_dtype)
+        pad_kernel[0: kernel.shape[0], 0: kernel.shape[1]] = \
+            getChannelKernel(kernel, pad_kernel.ndim)
+        stage.allocate(pad_image, pad_kernel)
+
+    # Calculates the Fourier transforms for the image and kernel. NumPy older
+    # than 2.0 always transforms in double precision, so the spectra are
+    # converted back to the requested precision.
+    complex_dtype = None if dtype is None else getComplexDtype(dtype)
+    with PROFILER.stage('fft_image') as stage:
+        fft_image = np.fft.fft2(pad_image, axes=(0, 1))
+        if complex_dtype is not None:
+            fft_image = fft_image.astype(complex_dtype, copy=False)
+        stage.allocate(fft_image)
+    with PROFILER.stage('fft_kernel') as stage:
+        fft_kernel = np.fft.fft2(pad_kernel, axes=(0, 1))
+        if complex_dtype is not None:
+            fft_kernel = fft_kernel.astype(complex_dtype, copy=False)
+        stage.allocate(fft_kernel)
+
+    # Performs the convolutions, inverses the fourier transforms and
+    # extracts the real part of each element
+    with PROFILER.stage('product') as stage:
+        fft_product = fft_image * fft_kernel
+        stage.allocate(fft_product)
+    with PROFILER.stage('ifft') as stage:
+        inverse_image = np.fft.ifft2(fft_product, axes=(0, 1))
+        if complex_dtype is not None:
+            inverse_image = inverse_image.astype(complex_dtype, copy=False)
+        stage.allocate(inverse_image)
+
+    return np.real(inverse_image)
+
+
+def transformAndMultiplyInWorkspace(
+        image, kernel, pad_width, new_size, padding, kernel_dtype, workspace):
+    """
+    Pads the image into a complex buffer borrowed from the workspace,
+    multiplies its Fourier transform by the cached spectrum of the kernel and
+    inverses the product, all in place
+
+    :param image: The image to be convolved
+    :param kernel: The kernel to convolve the image with
+    :param pad_width: The padding to add to each edge of the image
+    :param new_size: The size of the padded image and kernel
+    :param padding: The type of padding to use
+    :param kernel_dtype: The floating point type of the padded kernel
+    :param workspace: The workspace to borrow the buffers from
+
+    :return: The real part of the convolved image, including its padding
+    """
+    complex_dtype = getComplexDtype(np.result_type(image.dtype, kernel_dtype))
+
+    # Pads the image straight into the complex buffer
+    with PROFILER.stage('pad'):
+        spectrum = workspace.getBuffer('spectrum', new_size, complex_dtype)
+        padImage(image, pad_width, padding, spectrum)
+
+    # Calculates the Fourier transform of the image in place and gets the
+    # cached Fourier transform of the kernel
+    with PROFILER.stage('fft_image'):
+        transformInPlace(np.fft.fftn, spectrum)
+    with PROFILER.stage('fft_kernel'):
+        fft_kernel = workspace.getKernelSpectrum(
+            kernel, getKernelShape(new_size), complex_dtype)
+
+    # Performs the convolution and inverses the fourier transform in place
+    with PROFILER.stage('product'):
+        np.multiply(spectrum, fft_kernel, out=spectrum)
+    with PROFILER.stage('ifft'):
+        transformInPlace(np.fft.ifftn, spectrum)
+
+    return spectrum.real
+
+
+def calculateTransferFunctionFilter(
+        image,
+        getTransferFunction,
+        padding='constant',
+        dtype=None,
+        out=None):
+    """
+    Filters an image by multiplying its Fourier transform by a transfer
+    function built directly on the frequency grid of the image. The cost
+    depends only on the size of the image, as there is no kernel.
+
+    :param image: The image to be filtered
+    :param getTransferFunction: A function that takes the shape of the padded
+        image and the floating point type and returns the transfer function
+        on the grid of np.fft.rfft2 of that shape
+    :param padding: The type of padding to use. The image is padded to at
+        least twice its size, so that the filter does not wrap around the
+        edges, and then up to a length the FFT is fast on. If None, the image
+        is filtered as it is and treated as periodic.
+    :param dtype: The floating point type to compute in. If None, float64 is
+        used.
+    :param out: The array to write the filtered image into. If None, a new
+        array is allocated.
+
+    :return: The filtered image
+    """
+    dtype = np.float64 if dtype is None else dtype
+
+    # Pad the image by half its size on every edge and then up to a fast
+    # length
+    with PROFILER.stage('pad') as stage:
+        height, width = image.shape[:2]
+        pad_width = ((0, 0), (0, 0))
+        if padding is not None:
+            pad_width = tuple(
+                (size // 2, getFastLength(2 * size) - size - size // 2)
+                for size in (height, width))
+        pad_image = np.pad(
+            image.astype(dtype, copy=False),
+            getPadWidth(pad_width, image.ndim),
+            mode='constant' if padding is None else padding)
+        stage.allocate(pad_image)
+
+    # The image is real, so only half of its spectrum is calculated. Every
+    # channel is transformed at once.
+    with PROFILER.stage('fft_image') as stage:
+        fft_image = np.fft.rfft2(pad_image, axes=(0, 1)).astype(
+            getComplexDtype(dtype), copy=False)
+        stage.allocate(fft_image)
+    with PROFILER.stage('fft_kernel'):
+        transfer_function = getChannelKernel(
+            getTransferFunction(pad_image.shape[:2], dtype), pad_image.ndim)
+
+    # Multiply the spectrum by the transfer function in place and inverse it
+    with PROFILER.stage('product'):
+        fft_image *= transfer_function
+    with PROFILER.stage('ifft') as stage:
+        filtered_image = np.fft.irfft2(
+            fft_image, s=pad_image.shape[:2], axes=(0, 1)).astype(
+            dtype, copy=False)
+        stage.allocate(filtered_image)
+
+    # Remove the padding from the filtered image
+    with PROFILER.stage('crop'):
+        (top, _), (left, _) = pad_width
+        filtered_image = filtered_image[top:top + height, left:left + width]
+        if out is not None:
+            np.copyto(out, filtered_image)
+            filtered_image = out
+
+    return filtered_image
+
+
+def calculateRecursiveFilter(
+        image,
+        gain,
+        feedback,
+        halo,
+        padding='constant',
+        dtype=None,
+        out=None):
+    """
+    Filters an image with a separable recursive (IIR) filter, run forwards
+    and then backwards along the rows and then the columns. Each step is
+    vectorised over a whole row or column, so the cost per pixel is fixed
+    however wide the impulse response of the filter is.
+
+    :param image: The image to be filtered
+    :param gain: The gain applied to the input of each step
+    :param feedback: The weights of the previous outputs fed back into each
+        step, nearest first
+    :param halo: The number of pixels to pad each edge of the image with
+    :param padding: The type of padding to use. If None, the image is
+        assumed to already include the halo, which is cropped from the result.
+    :param dtype: The floating point type to compute in. If None, float64 is
+        used.
+    :param out: The array to write the filtered image into. If None, a new
+        array is allocated.
+
+    :return: The filtered image
+    """
+    dtype = np.float64 if dtype is None else dtype
+    order = len(feedback)
+
+    # Pad the image, unless it already includes the halo
+    with PROFILER.stage('pad') as stage:
+        if padding is None:
+            filtered_image = image.astype(dtype)
+        else:
+            filtered_image = np.pad(
+                image.astype(dtype, copy=False),
+                getPadWidth(halo, image.ndim), mode=padding)
+        stage.allocate(filtered_image)
+
+    with PROFILER.stage('recursion') as stage:
+        for axis in range(2):
+            # Filter along the columns by filtering the rows of a view with
+            # the axes swapped
+            signal = np.swapaxes(filtered_image, 0, axis)
+            length = signal.shape[0]
+
+            # The buffer starts with previous outputs equal to the first
+            # input, which is where the filter settles on a constant input
+            buffer = np.empty((length + 2 * order,) + signal.shape[1:], dtype)
+            stage.allocate(buffer)
+            buffer[:order] = signal[0]
+            np.multiply(signal, gain, out=buffer[order:order + length])
+
+            # Causal pass
+            for n in range(order, order + length):
+                for k, weight in enumerate(feedback, 1):
+                    buffer[n] += weight * buffer[n - k]
+
+            # Anti-causal pass over the output of the causal pass, starting
+            # from its last value
+            buffer[order + length:] = buffer[order + length - 1]
+            buffer[order:order + length] *= gain
+            for n in range(order + length - 1, order - 1, -1):
+                for k, weight in enumerate(feedback, 1):
+                    buffer[n] += weight * buffer[n + k]
+
+            signal[...] = buffer[order:order + length]
+
+    # Remove the halo from the filtered image
+    with PROFILER.stage('crop'):
+        height, width = filtered_image.shape[:2]
+        filtered_image = filtered_image[
+            halo:height - halo, halo:width - halo]
+        if out is not None:
+            np.copyto(out, filtered_image)
+            filtered_image = out
+
+    return filtered_image
+
+
+def calculateBoxFilter(
+        image,
+        kernel_size,
+        padding='constant',
+        dtype=None,
+        out=None):
+    """
+    Averages every (kernel_size x kernel_size) region of an image using
+    running sums. The sum of each region is the difference of two cumulative
+    sums along each axis, so the cost per pixel does not depend on the size
+    of the kernel.
+
+    :param image: The image to be filtered
+    :param kernel_size: The size of the kernel
+    :param padding: The type of padding to use. If None, the image is
+        assumed to already include the padding and only the pixels whose
+        region of interest lies entirely inside the image are filtered.
+    :param dtype: The floating point type to compute in. If None, float64 is
+        used.
+    :param out: The array to write the filtered image into. If None, a new
+        array is allocated.
+
+    :return: The filtered image
+    """
+    dtype = np.float64 if dtype is None else dtype
+
+    # Pad the image, unless it already includes the padding
+    with PROFILER.stage('pad') as stage:
+        filtered_image = image.astype(dtype, copy=False)
+        if padding is not None:
+            filtered_image = np.pad(
+                filtered_image,
+                getPadWidth((kernel_size - 1) // 2, image.ndim),
+                mode=padding)
+            stage.allocate(filtered_image)
+
+    # Sum the regions along the rows and then the columns
+    with PROFILER.stage('running_sum') as stage:
+        for axis in range(2):
+            # The cumulative sum starts with a 0 so that the sum of the first
+            # region is a difference like every other
+            shape = list(filtered_image.shape)
+            shape[axis] += 1
+            cumulative_sum = np.zeros(shape, dtype=dtype)
+            np.cumsum(
+                filtered_image, axis=axis,
+                out=cumulative_sum[1:] if axis == 0 else cumulative_sum[:, 1:])
+            stage.allocate(cumulative_sum)
+
+            if axis == 0:
+                filtered_image = \
+                    cumulative_sum[kernel_size:] - cumulative_sum[:-kernel_size]
+            else:
+                filtered_image = cumulative_sum[:, kernel_size:] - \
+                    cumulative_sum[:, :-kernel_size]
+
+        # Divide the sums by the number of pixels in each region
+        filtered_image /= kernel_size ** 2
+
+    if out is not None:
+        np.copyto(out, filtered_image)
+        filtered_image = out
+
+    return filtered_image
@@ -1,6 +1,11 @@
 import numpy as np
-import math
 
+from borders import PADDING_MODES
+import convolution
+import memoryPlanner
+from filterRegistry import FilterRegistry, FilterSpec
+from instrumentation import PROFILER, profiledFilter
+from pipeline import FilterStage
 from iFrequencyFilters import IFrequencyFilters
 
 
@@ -9,61 +14,107 @@ class EdgeDetector(IFrequencyFilters):
     Class for applying edge detection filters to an image
     """
 
+    # The filters the class can apply
+    registry = FilterRegistry()
+
+    # The fraction of the larger of two edge magnitudes within which they
+    # are equal when the edges are thinned
+    TIE_TOLERANCE = 1e-5
+
+    @profiledFilter
     def applyFilter(self, image, filter_name, kernel_size, **kwargs):
         """
         Applies a linear filter to an image
 
-        :param image: The image to be filtered
+        :param image: The image to be filtered, either (height, width) or
+            (height, width, channels). Every channel is filtered at once.
         :param filter_name: The name of the filter. Possible values are
             - 'horizontal',
             - 'vertical',
             - 'diagonal',
             - 'magnitude',
             - 'direction',
+            - 'canny',
         :param kernel_size: The size of the kernel
         :param kwargs: The arguments for the filter. Possible values are:
-            - 'padding': The type of padding to use. Possible values are:
+            - 'low_threshold': The fraction of the largest edge magnitude
+                       below which pixels are never edges (for the canny
+                       filter). Defaults to 0.1.
+            - 'high_threshold': The fraction of the largest edge magnitude
+                       above which pixels are always edges (for the canny
+                       filter). Defaults to 0.2.
+            - 'padding': The type of padding to use. Defaults to 'edge' for
+                       the canny filter and 'constant' otherwise. Possible
+                       values are:
                 - 'constant': Pads with a constant value
                 - 'edge': Pads with the edge values
                 - 'linear_ramp': Pads with a linear ramp
+                - 'reflect': Pads with the reflection of the image about
+                             its edges
+                - 'wrap': Pads with the opposite edge of the image
+            - 'dtype': The floating point type to compute in, either
+                       np.float32 or np.float64. Defaults to float64 kernels
+                       and outputs.
+            - 'workspace': A Workspace to borrow the padded image, spectra
+                       and edge images from instead of allocating them on
+                       every call
+            - 'out': The array to write the filtered image into
+            - 'mask': A boolean mask of the pixels to filter. Only the
+                       tiles of the image that contain the mask are
+                       filtered, with their halo. Canny thresholds and
+                       traces the edges of the whole image, so it filters
+                       the whole image and keeps the masked pixels.
+            - 'boxes': A list of (top, left, bottom, right) boxes of
+                       pixels to filter, instead of a mask
+            - 'fill': The value of the pixels that are not filtered. If
+                       None, they keep their value in the image.
+            - 'tile_size': The size of the tiles a mask is divided into.
+                       Defaults to 64.
+            - 'tolerance': The root mean square error allowed for
+                       approximating the filter with a smaller kernel on a
+                       downsampled level of an image pyramid. If None, the
+                       filter is exact.
+            - 'memory_budget': The most memory the filter may hold at
+                       once, in bytes. If the whole image would need more,
+                       it is filtered in the largest tiles that fit. Canny
+                       cannot be tiled, so it raises a ValueError instead.
+                       If None, the memory is not planned.
 
         :return: The filtered image
         """
 
+        # Get the padding type. None means that the image already includes
+        # the padding the filter needs, so only the valid region is returned.
+        # The Canny edge detector pads with the edges of the image, as
+        # padding with 0s would make the border of the image an edge.
+        padding = kwargs.pop(
+            'padding', 'edge' if filter_name == 'canny' else 'constant')
+
         # Check for errors in the parameters
-        self.checkErrors(kernel_size, 'constant', **kwargs)
-
-        # Get the padding type
-        padding = kwargs.get('padding', 'constant')
-
-        # Apply the filter specified by the filter name
-        if filter_name == 'horizontal':
-            # Get the horizontal kernel and apply the filter
-            kernel = self.getHorizontalKernel()
-            return self.calculateFrequencyDomainConvolution(
-                image, kernel, padding)
-        elif filter_name == 'vertical':
-            # Get the vertical kernel and apply the filter
-            kernel = self.getVerticalKernel()
-            return self.calculateFrequencyDomainConvolution(
-                image, kernel, padding)
-        elif filter_name == 'diagonal':
-            # Get the diagonal kernel and apply the filter
-            kernel = self.getDiagonalKernel()
-            return self.calculateFrequencyDomainConvolution(
-                image, kernel, padding)
-        elif filter_name == 'magnitude':
-            # Calculate the magnitude of the edges
-            return self.calculateEdgeMagnitude(image, padding)
-        elif filter_name == 'direction':
-            # Calculate the direction of the edges
-            return self.calculateEdgeDirection(image, padding)
-        else:
-            # Raise an error if the filter name is not recognized
-            raise Exception('Invalid filter name.')
+        self.checkErrors(kernel_size, padding, **kwargs)
+
+        # Get the floating point type to compute in
+        dtype = kwargs.pop('dtype', None)
+
+        # Get the workspace to borrow buffers from and the array to write the
+        # filtered image into
+        workspace = kwargs.pop('workspace', None)
+        out = kwargs.pop('out', None)
+
+        # Look the filter up in the registry and apply it. Every filter is
+        # declared at the bottom of this file.
+        return self.registry.applyFilter(
+            self, image, filter_name, kernel_size, padding, dtype, workspace,
+            out, **kwargs)
 
     def calculateFrequencyDomainConvolution(
-            self, image, kernel, padding='constant'):
+            self,
+            image,
+            kernel,
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None):
         """
         Performs a convolution on an image using a kernel using the Fast Fourier
         Transform algorithm.
@@ -71,51 +122,14 @@ class EdgeDetector(IFrequencyFilters):
         :param image: The image to be convolved
         :param kernel: The kernel to convolve the image with
         :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow buffers from
+        :param out: The array to write the convolved image into
 
         :return: The convolved image
         """
-        # Creates tuple for size of padded image and kernel
-        new_size = (
-            image.shape[0] +
-            kernel.shape[0] -
-            1,
-            image.shape[1] +
-            kernel.shape[1] -
-            1)
-        convolved_image = np.zeros(shape=new_size, dtype=image.dtype)
-
-        # Calculates half the size of the image and kernel respectfully in both
-        # dimensions
-        half_image = ((image.shape[0] - 1) / 2, (image.shape[1] - 1) / 2)
-        half_kernal = ((kernel.shape[0] - 1) / 2, (kernel.shape[1] - 1) / 2)
-
-        # Pads the image with duplicate values and the kernel with 0s
-        pad_image = np.pad(image, pad_width=(
-            (math.floor(half_kernal[0]), math.ceil(half_kernal[0])),
-            (math.floor(half_kernal[1]), math.ceil(half_kernal[1]))
-        ), mode=padding)
-
-        # Creates a new kernel with the same size as the padded image and fills
-        # it with 0s. This is requried for the convolution to work properly.
-        pad_kernel = np.zeros(shape=new_size)
-        pad_kernel[0: kernel.shape[0], 0: kernel.shape[1]] = kernel
-
-        # Calculates the Fourier transforms for the image and kernel
-        fft_image = np.fft.fft2(pad_image)
-        fft_kernel = np.fft.fft2(pad_kernel)
-
-        # Performs the convolutions, inverses the fourier transforms and
-        # extracts the real part of each element
-        convolved_image = np.real(np.fft.ifft2(fft_image * fft_kernel))
-
-        # Function to calculate the padding of the convoluted image
-        def bounds(axis): return kernel.shape[axis] - 1
-
-        # Removes the padding from the convoluted image
-        convolved_image = convolved_image[bounds(
-            0): new_size[0], bounds(1): new_size[1]]
-
-        return convolved_image
+        return convolution.calculateFrequencyDomainConvolution(
+            image, kernel, padding, dtype, workspace, out)
 
     def getHorizontalKernel(self):
         """
@@ -135,12 +149,21 @@ class EdgeDetector(IFrequencyFilters):
         """
         return np.array([[2, 1, 0], [1, 0, -1], [0, -1, -2]])
 
-    def calculateEdgeMagnitude(self, image, padding='constant'):
+    def calculateEdgeMagnitude(
+            self,
+            image,
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None):
         """
         Calculates the magnitude of the edges
 
         :param image: The image to calculate the magnitude of the edges for
         :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow buffers from
+        :param out: The array to write the magnitude of the edges into
 
         :return: The magnitude of the edges
         """
@@ -150,24 +173,43 @@ class EdgeDetector(IFrequencyFilters):
         vertical_kernel = self.getVerticalKernel()
 
         # Gets the horizontal and vertical edges
+        horizontal_edges, vertical_edges = self.getEdgeBuffers(
+            image, padding, dtype, workspace)
         horizontal_edges = self.calculateFrequencyDomainConvolution(
-            image, horizonal_kernel, padding)
+            image, horizonal_kernel, padding, dtype, workspace,
+            horizontal_edges)
         vertical_edges = self.calculateFrequencyDomainConvolution(
-            image, vertical_kernel, padding)
+            image, vertical_kernel, padding, dtype, workspace, vertical_edges)
 
         # Calculates the magnitude of the edges using the pythagorean theorem
-        edge_magnitude = np.sqrt(
-            np.square(horizontal_edges) +
-            np.square(vertical_edges))
+        if workspace is None:
+            edge_magnitude = np.sqrt(
+                np.square(horizontal_edges) +
+                np.square(vertical_edges), out=out)
+        else:
+            # Square the edges in place to avoid allocating temporaries
+            np.square(horizontal_edges, out=horizontal_edges)
+            np.square(vertical_edges, out=vertical_edges)
+            np.add(horizontal_edges, vertical_edges, out=horizontal_edges)
+            edge_magnitude = np.sqrt(horizontal_edges, out=out)
 
         return edge_magnitude
 
-    def calculateEdgeDirection(self, image, padding='constant'):
+    def calculateEdgeDirection(
+            self,
+            image,
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None):
         """
         Calculates the direction of the edges
 
         :param image: The image to calculate the direction of the edges for
         :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow buffers from
+        :param out: The array to write the direction of the edges into
 
         :return: The direction of the edges
         """
@@ -177,16 +219,353 @@ class EdgeDetector(IFrequencyFilters):
         vertical_kernel = self.getVerticalKernel()
 
         # Gets the horizontal and vertical edges
+        horizontal_edges, vertical_edges = self.getEdgeBuffers(
+            image, padding, dtype, workspace)
         horizontal_edges = self.calculateFrequencyDomainConvolution(
-            image, horizonal_kernel, padding)
+            image, horizonal_kernel, padding, dtype, workspace,
+            horizontal_edges)
         vertical_edges = self.calculateFrequencyDomainConvolution(
-            image, vertical_kernel, padding)
+            image, vertical_kernel, padding, dtype, workspace, vertical_edges)
 
         # Calculates the direction of the edges
-        edge_direction = np.arctan2(horizontal_edges, vertical_edges)
+        edge_direction = np.arctan2(
+            horizontal_edges, vertical_edges, out=out)
 
         return edge_direction
 
+    def calculateCannyEdges(
+            self,
+            image,
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None,
+            low_threshold=0.1,
+            high_threshold=0.2):
+        """
+        Finds the edges of an image with the Canny edge detector. The
+        magnitude of the edges is thinned to the pixels that are the largest
+        along the direction of the edge, and the pixels above the low
+        threshold are kept if they are connected to a pixel above the high
+        threshold. The image should be smoothed first, e.g. with
+        LF.stage('gaussian', 5) | ED.stage('canny').
+
+        :param image: The image to find the edges of
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow buffers from
+        :param out: The array to write the edges into
+        :param low_threshold: The fraction of the largest magnitude below
+            which pixels are never edges
+        :param high_threshold: The fraction of the largest magnitude above
+            which pixels are always edges
+
+        :return: An image that is 1 on the edges and 0 elsewhere
+        """
+        # Convolve the image with the horizontal and vertical kernels once,
+        # and combine the edges into both their magnitude and direction
+        horizontal_edges, vertical_edges = self.getEdgeBuffers(
+            image, padding, dtype, workspace)
+        horizontal_edges = self.calculateFrequencyDomainConvolution(
+            image, self.getHorizontalKernel(), padding, dtype, workspace,
+            horizontal_edges)
+        vertical_edges = self.calculateFrequencyDomainConvolution(
+            image, self.getVerticalKernel(), padding, dtype, workspace,
+            vertical_edges)
+        edge_magnitude = self.combineEdges(
+            'magnitude', horizontal_edges, vertical_edges)
+        edge_direction = self.combineEdges(
+            'direction', horizontal_edges, vertical_edges)
+
+        with PROFILER.stage('non_maximum_suppression') as stage:
+            edge_magnitude = self.suppressNonMaxima(
+                edge_magnitude, edge_direction)
+            stage.allocate(edge_magnitude)
+
+        with PROFILER.stage('hysteresis') as stage:
+            # Magnitudes within the rounding of the FFT of 0 are never
+            # edges, or a flat image would have edges of its rounding noise
+            largest_magnitude = np.max(edge_magnitude)
+            noise = self.TIE_TOLERANCE * np.max(np.abs(image))
+            edges = self.applyHysteresis(
+                edge_magnitude,
+                max(low_threshold * largest_magnitude, noise),
+                max(high_threshold * largest_magnitude, noise))
+            stage.allocate(edges)
+
+        if out is None:
+            return edges.astype(edge_magnitude.dtype)
+        np.copyto(out, edges)
+        return out
+
+    def suppressNonMaxima(self, edge_magnitude, edge_direction):
+        """
+        Thins the edges by setting every pixel that is smaller than either
+        of its neighbours along the gradient to 0. The direction of the
+        gradient is quantized to the four directions of the neighbours.
+
+        :param edge_magnitude: The magnitude of the edges
+        :param edge_direction: The direction of the edges
+
+        :return: The thinned magnitude of the edges
+        """
+
+        # The direction of the edges is arctan2(d/dy, -d/dx) of the image, so
+        # the gradient points along pi - direction in (row, column)
+        # coordinates. Quantize it to the nearest multiple of 45 degrees.
+        sectors = np.rint(
+            (np.pi - edge_direction) / (np.pi / 4)).astype(np.intp) % 4
+
+        # The (row, column) offset of the neighbour along each sector
+        offsets = [(0, 1), (1, 1), (1, 0), (1, -1)]
+
+        # Pad the spatial axes with their edges so every pixel has eight
+        # neighbours, and the pixels on the border of the image are not
+        # maxima just because there is nothing beyond them
+        height, width = edge_magnitude.shape[:2]
+        padded = np.pad(
+            edge_magnitude, convolution.getPadWidth(1, edge_magnitude.ndim),
+            mode='edge')
+
+        def neighbour(row, column):
+            return padded[1 + row:1 + row + height,
+                          1 + column:1 + column + width]
+
+        # A pixel is a maximum if it is no smaller than the neighbour ahead
+        # of it and larger than the neighbour behind it, so plateaus are
+        # thinned to a single pixel. Magnitudes within TIE_TOLERANCE of each
+        # other are equal, so that the rounding of the FFT does not decide
+        # which of two equal pixels is the maximum.
+        maxima = np.zeros(edge_magnitude.shape, dtype=bool)
+        for sector, (row, column) in enumerate(offsets):
+            ahead = neighbour(row, column)
+            behind = neighbour(-row, -column)
+            maxima |= (sectors == sector) & \
+                (edge_magnitude >= ahead - self.TIE_TOLERANCE * np.maximum(
+                    edge_magnitude, ahead)) & \
+                (edge_magnitude > behind + self.TIE_TOLERANCE * np.maximum(
+                    edge_magnitude, behind))
+
+        return np.where(maxima, edge_magnitude, 0)
+
+    def applyHysteresis(self, edge_magnitude, low_threshold, high_threshold):
+        """
+        Keeps the pixels above the low threshold that are connected to a
+        pixel above the high threshold. The connected pixels are labelled
+        with labelComponents rather than flood filled from each strong pixel.
+
+        :param edge_magnitude: The thinned magnitude of the edges
+        :param low_threshold: The magnitude below which pixels are never
+            edges
+        :param high_threshold: The magnitude above which pixels are always
+            edges
+
+        :return: A boolean image of the edges
+        """
+        weak = edge_magnitude > low_threshold
+        strong = edge_magnitude > high_threshold
+
+        # Label every channel separately
+        edges = np.zeros(weak.shape, dtype=bool)
+        for channel in np.ndindex(weak.shape[2:]):
+            index = (slice(None), slice(None)) + channel
+            labels = self.labelComponents(weak[index])
+
+            # Keep the components that contain a strong pixel. The
+            # background is label 0, which no strong pixel has.
+            has_strong = np.zeros(labels.max() + 1, dtype=bool)
+            has_strong[labels[strong[index]]] = True
+            has_strong[0] = False
+            edges[index] = has_strong[labels]
+
+        return edges
+
+    def labelComponents(self, mask):
+        """
+        Labels the 8-connected components of a mask. Each run of masked
+        pixels in a row gets its own label, and runs that touch in
+        neighbouring rows are merged by hooking the larger of their labels
+        onto the smaller and following the labels to their roots, until every
+        touching pair of runs shares a label. Every step is a pass over the
+        pixels or the touching pairs, so labelling scales with the image.
+
+        :param mask: A boolean (height, width) mask
+
+        :return: The label of every pixel, 0 for pixels outside the mask.
+            Labels are not consecutive.
+        """
+
+        # Label each run of masked pixels in a row, in reading order
+        starts = mask.copy()
+        starts[:, 1:] &= ~mask[:, :-1]
+        runs = np.cumsum(starts).reshape(mask.shape) * mask
+
+        # Find the pairs of runs that touch, including diagonally, in each
+        # pair of neighbouring rows
+        upper_runs = []
+        lower_runs = []
+        for column in [-1, 0, 1]:
+            upper = runs[:-1, max(column, 0):mask.shape[1] + min(column, 0)]
+            lower = runs[1:, max(-column, 0):mask.shape[1] + min(-column, 0)]
+            touching = (upper > 0) & (lower > 0)
+            upper_runs.append(upper[touching])
+            lower_runs.append(lower[touching])
+        upper_runs = np.concatenate(upper_runs)
+        lower_runs = np.concatenate(lower_runs)
+
+        labels = np.arange(runs.max() + 1)
+        while True:
+            # Hook the root of each pair with the larger label onto the other
+            upper_roots = labels[upper_runs]
+            lower_roots = labels[lower_runs]
+            if np.array_equal(upper_roots, lower_roots):
+                break
+            np.minimum.at(
+                labels,
+                np.maximum(upper_roots, lower_roots),
+                np.minimum(upper_roots, lower_roots))
+
+            # Point every label at its root
+            while True:
+                roots = labels[labels]
+                if np.array_equal(roots, labels):
+                    break
+                labels = roots
+
+        return labels[runs]
+
+    def getEdgeBuffers(
+            self, image, padding='constant', dtype=None, workspace=None):
+        """
+        Gets the buffers to write the horizontal and vertical edges into
+
+        :param image: The image the edges are calculated for
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow the buffers from
+
+        :return: The horizontal and vertical edge buffers, or None for both if
+            there is no workspace
+        """
+        if workspace is None:
+            return None, None
+
+        dtype = np.float64 if dtype is None else dtype
+        shape = convolution.getConvolvedShape(
+            image.shape, self.getHorizontalKernel().shape[0], padding)
+        return (
+            workspace.getBuffer('horizontal_edges', shape, dtype),
+            workspace.getBuffer('vertical_edges', shape, dtype))
+
+    def stage(self, filter_name, kernel_size=None, **kwargs):
+        """
+        Creates a pipeline stage that applies a filter. Stages are chained
+        with the | operator, e.g. LF.stage('gaussian', 5) | ED.stage('magnitude')
+
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param kwargs: The arguments for the filter
+
+        :return: The pipeline stage
+        """
+        return FilterStage(self, filter_name, kernel_size, **kwargs)
+
+    def getLinearKernels(self, filter_name, kernel_size=None, **kwargs):
+        """
+        Gets the kernels a filter convolves the image with, so that they can
+        be composed with the kernels of neighbouring filters in a pipeline
+
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel. Unused, as every edge
+            detection kernel is 3x3
+        :param kwargs: The arguments for the filter
+
+        :return: A list of kernels. The 'magnitude' and 'direction' filters
+            return the horizontal and vertical kernels, whose results are
+            combined with combineEdges.
+        """
+        return self.registry.getKernels(
+            self, filter_name, kernel_size, **kwargs)
+
+    def combineEdges(self, filter_name, horizontal_edges, vertical_edges):
+        """
+        Combines the horizontal and vertical edges into the magnitude or the
+        direction of the edges
+
+        :param filter_name: Either 'magnitude' or 'direction'
+        :param horizontal_edges: The horizontal edges
+        :param vertical_edges: The vertical edges
+
+        :return: The magnitude or direction of the edges
+        """
+        if filter_name == 'magnitude':
+            return np.sqrt(
+                np.square(horizontal_edges) +
+                np.square(vertical_edges))
+        return np.arctan2(horizontal_edges, vertical_edges)
+
+    def estimatePeakMemory(
+            self, shape, image_dtype, filter_name, kernel_size=None,
+            method=None, **kwargs):
+        """
+        Estimates the most memory applying a filter to an image holds at
+        once, without a workspace or an output array
+
+        :param shape: The shape of the image
+        :param image_dtype: The type of the image
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel. Unused, as every edge
+            detection kernel is 3x3
+        :param method: The method to apply the filter with, one of
+            'apply', 'histogram', 'spatial' or 'frequency'. If None, the
+            method applyFilter would use.
+        :param kwargs: The arguments for the filter, including 'padding',
+            'dtype' and 'histogram' as for applyFilter
+
+        :return: The peak bytes
+        """
+        return self.registry.estimatePeakMemory(
+            self, shape, image_dtype, filter_name, kernel_size, method,
+            **kwargs)
+
+    def getTileSize(
+            self, shape, image_dtype, filter_name, kernel_size, budget,
+            method=None, **kwargs):
+        """
+        Gets the largest square tile that a filter can be applied to an image
+        in one tile at a time within a memory budget
+
+        :param shape: The shape of the image
+        :param image_dtype: The type of the image
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel. Unused, as every edge
+            detection kernel is 3x3
+        :param budget: The most memory the filter may hold at once, in bytes
+        :param method: The method to apply the filter with. If None, the
+            method applyFilter would use.
+        :param kwargs: The arguments for the filter, including 'dtype' and
+            'histogram' as for applyFilter
+
+        :return: The size of the tiles
+        """
+        return self.registry.getTileSize(
+            self, shape, image_dtype, filter_name, kernel_size, budget,
+            method, **kwargs)
+
+    def getHalo(self, filter_name, kernel_size=None, **kwargs):
+        """
+        Gets the number of pixels a filter reads beyond each edge of an output
+        pixel
+
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel. Unused, as every edge
+            detection kernel is 3x3
+        :param kwargs: The arguments for the filter
+
+        :return: The halo of the filter
+        """
+        return self.registry.getHalo(self, filter_name, kernel_size, **kwargs)
+
     def checkErrors(self, kernel_size, padding, **kwargs):
         """
         Checks for errors in the LinearFilters class
@@ -199,7 +578,9 @@ class EdgeDetector(IFrequencyFilters):
 
         :raises ValueError: If the kernel size is even
         :raises ValueError: If the padding type is invalid
+        :raises ValueError: If the dtype is not float32 or float64
         :raises ValueError: If the kernel size is less than 1
+        :raises ValueError: If the thresholds are not 0 <= low <= high <= 1
         """
 
         # Check of errors related to the kernel size.
@@ -215,12 +596,107 @@ class EdgeDetector(IFrequencyFilters):
         elif kernel_size is not None:
             raise TypeError('Kernel size must be an integer.')
 
+        # Check for errors related to the thresholds of the canny filter.
+        low_threshold = kwargs.get('low_threshold', 0.1)
+        high_threshold = kwargs.get('high_threshold', 0.2)
+        if not 0 <= low_threshold <= high_threshold <= 1:
+            raise ValueError(
+                'Thresholds must be 0 <= low_threshold <= high_threshold <= 1.')
+
+        # Check for errors related to the floating point type.
+        if kwargs.get('dtype') is not None:
+            # Check that the type is a supported floating point type
+            if np.dtype(kwargs['dtype']) not in (np.float32, np.float64):
+                raise ValueError('dtype must be float32 or float64.')
+
         # Check for errors related to the padding type.
-        if padding not in ['constant', 'edge', 'linear_ramp']:
+        if padding is not None and padding not in PADDING_MODES:
             raise ValueError('''
             Invalid padding type. Possible values are:
-            constant, edge, linear_ramp.
+            constant, edge, linear_ramp, reflect, wrap.
             ''')
 
 
+# Declare every edge detector. Every edge detection kernel is 3x3, whatever
+# the kernel size. Filters from elsewhere are registered in the same way,
+# using EdgeDetector.registry.register.
+def getEdgeHalo(F, kernel_size, **parameters):
+    """
+    Gets the halo of an edge detector, which is that of a 3x3 kernel
+
+    :param F: The class that applies the filter
+    :param kernel_size: Unused, as every edge detection kernel is 3x3
+    :param parameters: Unused parameters of the filter
+
+    :return: The halo of the filter
+    """
+    return (F.getHorizontalKernel().shape[0] - 1) // 2
+
+
+def getEdgeMemory(
+        F, shape, image_dtype, kernel_size, padding, dtype, **parameters):
+    """
+    Estimates the peak memory of an edge detector that convolves the image
+    with both the horizontal and vertical kernels
+
+    :param F: The class that applies the filter
+    :param shape: The shape of the image
+    :param image_dtype: The type of the image
+    :param kernel_size: Unused, as every edge detection kernel is 3x3
+    :param padding: The type of padding to use
+    :param dtype: The floating point type to compute in
+    :param parameters: Unused parameters of the filter
+
+    :return: The peak bytes and the type of the edges
+    """
+    return memoryPlanner.getFrequencyMemory(
+        shape, image_dtype, F.getHorizontalKernel().shape, padding, dtype,
+        count=2)
+
+
+EdgeDetector.registry.register(FilterSpec(
+    'horizontal',
+    kernels=lambda F, kernel_size: [F.getHorizontalKernel()],
+    halo=getEdgeHalo))
+EdgeDetector.registry.register(FilterSpec(
+    'vertical',
+    kernels=lambda F, kernel_size: [F.getVerticalKernel()],
+    halo=getEdgeHalo))
+EdgeDetector.registry.register(FilterSpec(
+    'diagonal',
+    kernels=lambda F, kernel_size: [F.getDiagonalKernel()],
+    halo=getEdgeHalo))
+# The magnitude and direction combine the horizontal and vertical edges,
+# using combineEdges when folded into a pipeline
+EdgeDetector.registry.register(FilterSpec(
+    'magnitude',
+    apply=lambda F, image, kernel_size, padding, dtype, workspace, out:
+        F.calculateEdgeMagnitude(image, padding, dtype, workspace, out),
+    kernels=lambda F, kernel_size: [
+        F.getHorizontalKernel(), F.getVerticalKernel()],
+    halo=getEdgeHalo,
+    memory=getEdgeMemory))
+EdgeDetector.registry.register(FilterSpec(
+    'direction',
+    apply=lambda F, image, kernel_size, padding, dtype, workspace, out:
+        F.calculateEdgeDirection(image, padding, dtype, workspace, out),
+    kernels=lambda F, kernel_size: [
+        F.getHorizontalKernel(), F.getVerticalKernel()],
+    halo=getEdgeHalo,
+    memory=getEdgeMemory))
+# The Canny edge detector thins and thresholds the magnitude, so it cannot be
+# folded into a pipeline
+EdgeDetector.registry.register(FilterSpec(
+    'canny',
+    apply=lambda F, image, kernel_size, padding, dtype, workspace, out,
+    low_threshold, high_threshold: F.calculateCannyEdges(
+        image, padding, dtype, workspace, out, low_threshold,
+        high_threshold),
+    parameters={'low_threshold': 0.1, 'high_threshold': 0.2},
+    halo=getEdgeHalo,
+    memory=getEdgeMemory,
+    # The thresholds are relative to the largest magnitude of the whole
+    # image, and the edges are traced across it
+    tileable=False))
+
 ED = EdgeDetector()
@@ -0,0 +1,631 @@
+import functools
+
+import numpy as np
+
+import memoryPlanner
+import pyramid
+import regions
+
+
+class FilterSpec:
+    """
+    A filter declared once with its parameters and kernel builder, so that
+    applying it only has to look it up. A filter is applied in one of three
+    ways:
+
+        - kernels: The image is convolved with the single kernel the builder
+                   returns, using the frequency domain algorithm
+        - window: The function reduces every region of interest, using the
+                  spatial domain algorithm
+        - apply: The function applies the filter itself
+
+    A rank filter may also declare a histogram function, which computes it
+    from the histograms of the windows of uint8 and uint16 images instead of
+    sorting every window, and the kernel sizes from which it is the faster of
+    the two.
+
+    A filter applied by its own function declares how much memory it needs,
+    so that the memory of every filter can be planned before it is applied.
+    A filter that depends on more of the image than its halo declares that
+    it cannot be tiled, so that it is never filtered in tiles.
+
+    Every function takes the class applying the filter as its first argument
+    and the declared parameters as keyword arguments, e.g.
+
+        LF.registry.register(FilterSpec(
+            'sharpen',
+            kernels=lambda F, kernel_size, amount: [
+                F.getSharpenKernel(kernel_size, amount)],
+            parameters={'amount': 1.0}))
+    """
+
+    def __init__(
+            self,
+            name,
+            kernels=None,
+            window=None,
+            apply=None,
+            parameters=None,
+            halo=None,
+            histogram=None,
+            histogram_kernel_sizes=None,
+            groups=None,
+            moments=False,
+            memory=None,
+            window_copies=memoryPlanner.WINDOW_COPIES,
+            approximate=True,
+            tileable=True):
+        """
+        Declares a filter
+
+        :param name: The name the filter is applied by
+        :param kernels: A function (F, kernel_size, **parameters) that builds
+            the kernels the filter convolves the image with, or returns None
+            if the parameters make it something other than a convolution
+        :param window: A function (F, rois, **parameters) that reduces a stack
+            of regions of interest over their last two axes
+        :param apply: A function (F, image, kernel_size, padding, dtype,
+            workspace, out, **parameters) that applies the filter
+        :param parameters: The parameters of the filter and their defaults
+        :param halo: A function (F, kernel_size, **parameters) that returns
+            the number of pixels the filter reads beyond each edge of an
+            output pixel. Defaults to half the kernel size.
+        :param histogram: A function (F, histograms, **parameters) that
+            computes the filter of a column of windows from their
+            SlidingHistograms
+        :param histogram_kernel_sizes: The smallest kernel size from which the
+            histogram function is faster than sorting, by the name of the
+            type of the image. Types it does not contain are only filtered
+            from histograms if they are forced.
+        :param groups: A function (F, kernel_size) that returns the group of
+            every offset of the window, each kept in its own histograms. If
+            None, every offset is in one group.
+        :param moments: Whether the histogram function needs the sums of the
+            values
+        :param memory: A function (F, shape, image_dtype, kernel_size,
+            padding, dtype, **parameters) that estimates the peak bytes and
+            the type of the filtered image of the apply function, using the
+            estimates in memoryPlanner
+        :param window_copies: The number of double precision copies of the
+            regions of interest of a row that the window function holds at
+            once
+        :param approximate: Whether a tolerance lets the filter be
+            approximated on a pyramid, or a function (F, kernel_size,
+            **parameters) that returns whether. False for filters whose cost
+            does not grow with the kernel size, which the pyramid only slows
+            down.
+        :param tileable: Whether filtering a region of the image with its
+            halo gives the same pixels as filtering the whole image, or a
+            function (F, kernel_size, **parameters) that returns whether.
+            False for filters that depend on the whole image.
+
+        :raises ValueError: If none of kernels, window or apply is given
+        """
+        if kernels is None and window is None and apply is None:
+            raise ValueError('A filter needs kernels, a window or apply.')
+
+        self.name = name
+        self.kernels = kernels
+        self.window = window
+        self.apply = apply
+        self.parameters = {} if parameters is None else dict(parameters)
+        self.halo = halo
+        self.histogram = histogram
+        self.histogram_kernel_sizes = {} if histogram_kernel_sizes is None \
+            else dict(histogram_kernel_sizes)
+        self.groups = groups
+        self.moments = moments
+        self.memory = memory
+        self.window_copies = window_copies
+        self.approximate = approximate
+        self.tileable = tileable
+
+    def getParameters(self, kwargs):
+        """
+        Gets the value of every parameter of the filter
+
+        :param kwargs: The arguments passed to the filter
+
+        :return: The value of every parameter, using the default of any
+            parameter that was not passed
+        """
+        return {
+            name: kwargs.get(name, default)
+            for name, default in self.parameters.items()}
+
+
+class FilterRegistry:
+    """
+    The filters a class can apply, and a bounded cache of the kernels they
+    have built. Kernels are memoized by the name of the filter, the kernel
+    size and the parameters, so each kernel is only built and checked once.
+    """
+
+    def __init__(self, max_kernels=64):
+        """
+        Creates an empty registry
+
+        :param max_kernels: The number of built kernels to keep before the
+            least recently used are discarded
+        """
+        self.filters = {}
+        self.kernels = {}
+        self.max_kernels = max_kernels
+
+    def register(self, spec, replace=False):
+        """
+        Registers a filter
+
+        :param spec: The declaration of the filter
+        :param replace: Whether to replace a filter with the same name
+
+        :return: The declaration of the filter
+
+        :raises ValueError: If a filter with the same name is registered and
+            replace is False
+        """
+        if spec.name in self.filters and not replace:
+            raise ValueError(f'Filter {spec.name} is already registered.')
+
+        self.filters[spec.name] = spec
+
+        # Discard the kernels the replaced filter built
+        self.kernels = {
+            key: kernels for key, kernels in self.kernels.items()
+            if key[0] != spec.name}
+        return spec
+
+    def getFilter(self, filter_name):
+        """
+        Gets the declaration of a filter
+
+        :param filter_name: The name of the filter
+
+        :return: The declaration of the filter
+
+        :raises Exception: If the filter name is not recognized
+        """
+        spec = self.filters.get(filter_name)
+        if spec is None:
+            raise Exception('Invalid filter name.')
+        return spec
+
+    def getFilterNames(self):
+        """
+        Gets the names of every registered filter
+
+        :return: The names of the filters, in the order they were registered
+        """
+        return list(self.filters)
+
+    def getKernels(self, F, filter_name, kernel_size, **kwargs):
+        """
+        Gets the kernels a filter convolves the image with, building them the
+        first time they are requested
+
+        :param F: The class that applies the filter
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param kwargs: The arguments for the filter
+
+        :return: A list of kernels, or None if the filter is not a convolution
+        """
+        spec = self.getFilter(filter_name)
+        if spec.kernels is None:
+            return None
+        parameters = spec.getParameters(kwargs)
+
+        # Parameters that cannot be hashed, such as arrays, are not cached
+        key = (filter_name, kernel_size, tuple(sorted(parameters.items())))
+        try:
+            cached = key in self.kernels
+        except TypeError:
+            return spec.kernels(F, kernel_size, **parameters)
+
+        if cached:
+            kernels = self.kernels.pop(key)
+        else:
+            # Discard the least recently used kernels to keep the cache
+            # bounded
+            if len(self.kernels) >= self.max_kernels:
+                del self.kernels[next(iter(self.kernels))]
+
+            kernels = spec.kernels(F, kernel_size, **parameters)
+
+            # The kernels are shared by every call, so they must not be
+            # changed
+            if kernels is not None:
+                for kernel in kernels:
+                    kernel.flags.writeable = False
+
+        # Move the kernels to the end of the cache as the most recently used
+        self.kernels[key] = kernels
+        return kernels
+
+    def getHalo(self, F, filter_name, kernel_size, **kwargs):
+        """
+        Gets the number of pixels a filter reads beyond each edge of an output
+        pixel
+
+        :param F: The class that applies the filter
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param kwargs: The arguments for the filter
+
+        :return: The halo of the filter
+        """
+        spec = self.getFilter(filter_name)
+        if spec.halo is None:
+            return (kernel_size - 1) // 2
+        return spec.halo(F, kernel_size, **spec.getParameters(kwargs))
+
+    def isTileable(self, F, filter_name, kernel_size, **kwargs):
+        """
+        Checks whether a filter can be applied to regions of an image with
+        their halo and give the same pixels as filtering the whole image
+
+        :param F: The class that applies the filter
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param kwargs: The arguments for the filter
+
+        :return: True if the filter can be tiled, False otherwise
+        """
+        spec = self.getFilter(filter_name)
+        if callable(spec.tileable):
+            return spec.tileable(F, kernel_size, **spec.getParameters(kwargs))
+        return spec.tileable
+
+    def canApproximate(self, F, filter_name, kernel_size, **kwargs):
+        """
+        Checks whether a tolerance lets a filter be approximated on a pyramid
+
+        :param F: The class that applies the filter
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param kwargs: The arguments for the filter
+
+        :return: True if the filter can be approximated, False otherwise
+        """
+        spec = self.getFilter(filter_name)
+        if callable(spec.approximate):
+            return spec.approximate(
+                F, kernel_size, **spec.getParameters(kwargs))
+        return spec.approximate
+
+    def getMethod(self, spec, image_dtype, kernel_size, histogram=False):
+        """
+        Gets the method a filter is applied with
+
+        :param spec: The declaration of the filter
+        :param image_dtype: The type of the image
+        :param kernel_size: The size of the kernel
+        :param histogram: Whether to filter uint8 and uint16 images from
+            histograms of the windows, if the filter declares how. If True,
+            only from the kernel sizes where that is faster than sorting. If
+            'always', at every kernel size.
+
+        :return: The method, one of memoryPlanner.METHODS
+        """
+        if spec.apply is not None:
+            return 'apply'
+        image_dtype = np.dtype(image_dtype)
+        if spec.histogram is not None and histogram and \
+                image_dtype in (np.uint8, np.uint16):
+            smallest = spec.histogram_kernel_sizes.get(image_dtype.name)
+            if histogram == 'always' or \
+                    smallest is not None and kernel_size >= smallest:
+                return 'histogram'
+        if spec.window is not None:
+            return 'spatial'
+        return 'frequency'
+
+    def getMemoryEstimate(
+            self,
+            F,
+            image_dtype,
+            filter_name,
+            kernel_size,
+            method=None,
+            dtype=None,
+            histogram=False,
+            **kwargs):
+        """
+        Gets the function that estimates the peak memory of applying a filter
+        to an image of any shape
+
+        :param F: The class that applies the filter
+        :param image_dtype: The type of the image
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param method: The method to apply the filter with, one of
+            memoryPlanner.METHODS. If None, the method applyFilter would use.
+        :param dtype: The floating point type to compute in
+        :param histogram: Whether to filter uint8 and uint16 images from
+            histograms of the windows, as for getMethod
+        :param kwargs: The arguments for the filter
+
+        :return: A function (shape, padding) that estimates the peak bytes
+            and the type of the filtered image
+
+        :raises ValueError: If the filter cannot be applied with the method,
+            or does not declare the memory of its apply function
+        """
+        spec = self.getFilter(filter_name)
+        parameters = spec.getParameters(kwargs)
+        if method is None:
+            method = self.getMethod(spec, image_dtype, kernel_size, histogram)
+
+        if method == 'apply' and spec.apply is not None:
+            if spec.memory is None:
+                raise ValueError(
+                    f'Filter {filter_name} does not declare its memory.')
+            return lambda shape, padding: spec.memory(
+                F, shape, image_dtype, kernel_size, padding, dtype,
+                **parameters)
+
+        if method == 'histogram' and spec.histogram is not None and \
+                np.dtype(image_dtype) in (np.uint8, np.uint16):
+            groups = None
+            if spec.groups is not None:
+                groups = spec.groups(F, kernel_size)
+            return lambda shape, padding: memoryPlanner.getHistogramMemory(
+                shape, image_dtype, kernel_size, groups, spec.moments,
+                padding, dtype)
+
+        if method == 'spatial' and spec.window is not None:
+            return lambda shape, padding: memoryPlanner.getSpatialMemory(
+                shape, image_dtype, kernel_size, padding, dtype,
+                spec.window_copies)
+
+        kernels = None
+        if method == 'frequency':
+            kernels = self.getKernels(F, filter_name, kernel_size, **kwargs)
+        if kernels is None:
+            raise ValueError(
+                f'Filter {filter_name} cannot be applied with {method}.')
+        return lambda shape, padding: memoryPlanner.getFrequencyMemory(
+            shape, image_dtype, kernels[0].shape, padding, dtype,
+            len(kernels))
+
+    def estimatePeakMemory(
+            self,
+            F,
+            shape,
+            image_dtype,
+            filter_name,
+            kernel_size,
+            method=None,
+            padding='constant',
+            dtype=None,
+            histogram=False,
+            **kwargs):
+        """
+        Estimates the most memory applying a filter to an image holds at once,
+        without a workspace or an output array
+
+        :param F: The class that applies the filter
+        :param shape: The shape of the image
+        :param image_dtype: The type of the image
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param method: The method to apply the filter with, one of
+            memoryPlanner.METHODS. If None, the method applyFilter would use.
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param histogram: Whether to filter uint8 and uint16 images from
+            histograms of the windows, as for getMethod
+        :param kwargs: The arguments for the filter
+
+        :return: The peak bytes
+        """
+        estimate = self.getMemoryEstimate(
+            F, image_dtype, filter_name, kernel_size, method, dtype,
+            histogram, **kwargs)
+        return memoryPlanner.getPeakMemory(estimate, shape, padding)
+
+    def getTileSize(
+            self,
+            F,
+            shape,
+            image_dtype,
+            filter_name,
+            kernel_size,
+            budget,
+            method=None,
+            dtype=None,
+            histogram=False,
+            **kwargs):
+        """
+        Gets the largest square tile that a filter can be applied to an image
+        in one tile at a time within a memory budget
+
+        :param F: The class that applies the filter
+        :param shape: The shape of the image
+        :param image_dtype: The type of the image
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param budget: The most memory the filter may hold at once, in bytes
+        :param method: The method to apply the filter with, one of
+            memoryPlanner.METHODS. If None, the method applyFilter would use.
+        :param dtype: The floating point type to compute in
+        :param histogram: Whether to filter uint8 and uint16 images from
+            histograms of the windows, as for getMethod
+        :param kwargs: The arguments for the filter
+
+        :return: The size of the tiles
+        """
+        estimate = self.getMemoryEstimate(
+            F, image_dtype, filter_name, kernel_size, method, dtype,
+            histogram, **kwargs)
+        halo = self.getHalo(F, filter_name, kernel_size, **kwargs)
+        return memoryPlanner.getTileSize(
+            estimate, tuple(shape), image_dtype, halo, budget)
+
+    def applyFilter(
+            self,
+            F,
+            image,
+            filter_name,
+            kernel_size,
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None,
+            mask=None,
+            boxes=None,
+            fill=None,
+            tile_size=64,
+            tolerance=None,
+            histogram=False,
+            memory_budget=None,
+            **kwargs):
+        """
+        Applies a registered filter to an image
+
+        :param F: The class that applies the filter
+        :param image: The image to be filtered
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow buffers from
+        :param out: The array to write the filtered image into
+        :param mask: A boolean mask of the pixels to filter. If given, only
+            the tiles of the image that contain the mask are filtered, unless
+            the filter cannot be tiled.
+        :param boxes: A list of (top, left, bottom, right) boxes of pixels to
+            filter
+        :param fill: The value of the pixels outside the mask or boxes. If
+            None, they keep their value in the image.
+        :param tile_size: The size of the tiles a mask is divided into
+        :param tolerance: The root mean square error allowed for
+            approximating the filter on a downsampled pyramid level. If None,
+            the filter is exact.
+        :param histogram: Whether to filter uint8 and uint16 images from
+            histograms of the windows, if the filter declares how, as for
+            getMethod
+        :param memory_budget: The most memory the filter may hold at once, in
+            bytes. If the whole image would need more, it is filtered in the
+            largest tiles that fit, as for boxes. If None, the memory is not
+            planned.
+        :param kwargs: The arguments for the filter
+
+        :return: The filtered image
+
+        :raises ValueError: If a tolerance is given with a mask, boxes or an
+            image that already includes its padding
+        :raises ValueError: If a memory budget is given with a tolerance, a
+            mask or boxes
+        :raises ValueError: If the whole image does not fit in the memory
+            budget and the filter cannot be tiled
+        """
+        spec = self.getFilter(filter_name)
+        parameters = spec.getParameters(kwargs)
+
+        # Approximate the filter on a level of a pyramid if allowed to
+        if tolerance is not None:
+            if mask is not None or boxes is not None or padding is None:
+                raise ValueError(
+                    'A tolerance needs padding and no mask or boxes.')
+            if memory_budget is not None:
+                raise ValueError(
+                    'A memory budget needs no tolerance, mask or boxes.')
+            return pyramid.applyApproximately(
+                self, F, image, filter_name, kernel_size, padding, dtype, out,
+                tolerance, **parameters)
+
+        # Filter the image in tiles if it would not fit in the budget whole
+        if memory_budget is not None:
+            if mask is not None or boxes is not None:
+                raise ValueError(
+                    'A memory budget needs no tolerance, mask or boxes.')
+            boxes = self.getBudgetTiles(
+                F, image, filter_name, kernel_size, padding, dtype,
+                memory_budget, histogram, **parameters)
+
+        # Filter only the regions that were asked for. Every region is
+        # filtered separately, so no workspace is shared between them.
+        if mask is not None or boxes is not None:
+            return regions.applyToRegions(
+                self, F, image, filter_name, kernel_size, padding, dtype, out,
+                mask, boxes, fill, tile_size, histogram, **parameters)
+
+        method = self.getMethod(
+            spec, image.dtype, kernel_size, histogram)
+        if method == 'apply':
+            return spec.apply(
+                F, image, kernel_size, padding, dtype, workspace, out,
+                **parameters)
+
+        # Rank filters of integer images can be computed from the histograms
+        # of the windows instead of sorting every window
+        if method == 'histogram':
+            statistic = functools.partial(spec.histogram, F, **parameters)
+            groups = None
+            if spec.groups is not None:
+                groups = spec.groups(F, kernel_size)
+            return F.calculateHistogramFilter(
+                image, kernel_size, statistic, groups, spec.moments, padding,
+                dtype, out)
+
+        if method == 'spatial':
+            filter_function = functools.partial(spec.window, F, **parameters)
+            return F.calculateSpatialDomainConvolution(
+                image, kernel_size, filter_function, padding, dtype,
+                workspace, out)
+
+        kernel, = self.getKernels(F, filter_name, kernel_size, **parameters)
+        return F.calculateFrequencyDomainConvolution(
+            image, kernel, padding, dtype, workspace, out)
+
+    def getBudgetTiles(
+            self,
+            F,
+            image,
+            filter_name,
+            kernel_size,
+            padding,
+            dtype,
+            memory_budget,
+            histogram=False,
+            **kwargs):
+        """
+        Divides an image into the largest tiles a filter can be applied to
+        within a memory budget
+
+        :param F: The class that applies the filter
+        :param image: The image to be filtered
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param memory_budget: The most memory the filter may hold at once, in
+            bytes
+        :param histogram: Whether to filter uint8 and uint16 images from
+            histograms of the windows, as for getMethod
+        :param kwargs: The arguments for the filter
+
+        :return: A list of (top, left, bottom, right) tiles, or None if the
+            whole image fits in the budget
+
+        :raises ValueError: If the whole image does not fit in the budget and
+            the filter cannot be tiled, or no tile fits in the budget
+        """
+        if self.estimatePeakMemory(
+                F, image.shape, image.dtype, filter_name, kernel_size, None,
+                padding, dtype, histogram, **kwargs) <= memory_budget:
+            return None
+        if not self.isTileable(F, filter_name, kernel_size, **kwargs):
+            raise ValueError(
+                f'The image cannot be filtered within {memory_budget} bytes, '
+                f'and {filter_name} cannot be filtered in tiles.')
+
+        # An image that already includes its padding is larger than its output
+        halo = self.getHalo(F, filter_name, kernel_size, **kwargs)
+        offset = halo if padding is None else 0
+        shape = (image.shape[0] - 2 * offset, image.shape[1] - 2 * offset)
+        tile_size = self.getTileSize(
+            F, shape + image.shape[2:], image.dtype, filter_name,
+            kernel_size, memory_budget, None, dtype, histogram, **kwargs)
+        return regions.getTiles(shape[0], shape[1], tile_size)
@@ -1,14 +1,40 @@
+import os
+import sys
 import matplotlib.pyplot as plt
 import pandas as pd
-import numpy as np
+
+# The statistics index is read by the scripts that write it
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from imageStatistics import readStatistics
 
 filename = './results/results.csv'
 
-df = pd.read_csv(filename)
 
-# get the unique values of the filter_name column
-filter_names = df.filter_name.unique()
-for filter_name in filter_names:
+def getStatisticsTable():
+    """
+    Gets the statistics of every image, computed when the image was
+    filtered, so that no image is read back. Only the statistics indexed
+    last are kept.
+
+    :return: The statistics from readStatistics as a table indexed by file
+        name
+    """
+    statistics = readStatistics('./results/statistics.csv')
+    return pd.DataFrame.from_dict(statistics, orient='index') \
+        .rename_axis('file_name')
+
+
+def plotAverageIntensities(df, statistics, filter_name):
+    """
+    Plots the average intensity of every image filtered with a filter
+    against the kernel size
+
+    :param df: The results of the filters
+    :param statistics: The statistics of every image from
+        getStatisticsTable
+    :param filter_name: The name of the filter
+    """
     # Filter the dataframe by filter_name
     df_filter = df[df.filter_name == filter_name]
     # get the unique values of the image_name column
@@ -27,18 +53,15 @@ for filter_name in filter_names:
     for i, image_name in enumerate(image_names):
         # Filter the dataframe by image_name
         df_image = df_filter[df_filter.image_name == image_name]
-        
+
         # get the unique values of the kernel_size column
         kernel_sizes = df_filter.kernel_size.unique()
 
         bins_size = 20
 
         image_file_name = f'./img/{image_name}.png'
-        # read the image
-        image = plt.imread(image_file_name)
-
-        # average the intensity values of the image
-        average_intensity = np.average(image)
+        # get the average intensity of the image
+        average_intensity = statistics.loc[image_file_name, 'mean']
 
         intensities = [average_intensity]
         kernel_sizes_str = ['original']
@@ -49,13 +72,8 @@ for filter_name in filter_names:
             record = record.iloc[0]
             # get the image filename
             image_file_name = record['file_name']
-            # read the image
-            image = plt.imread(image_file_name)
-            # select the first channel of the image
-            image = image[:, :, 0]
-
-            # average the intensity values of the image
-            average_intensity = np.average(image)
+            # get the average intensity of the image
+            average_intensity = statistics.loc[image_file_name, 'mean']
             # append the first hist value to the amount_of_darks list
             intensities.append(average_intensity)
             # append the kernel_size to the kernel_sizes_str list
@@ -78,3 +96,13 @@ for filter_name in filter_names:
     plt.savefig(f'./img/intensities-{filter_name}.png', bbox_inches='tight', dpi=600)
     plt.clf()
     plt.close()
+
+
+if __name__ == '__main__':
+    df = pd.read_csv(filename)
+    statistics = getStatisticsTable()
+
+    # get the unique values of the filter_name column
+    filter_names = df.filter_name.unique()
+    for filter_name in filter_names:
+        plotAverageIntensities(df, statistics, filter_name)
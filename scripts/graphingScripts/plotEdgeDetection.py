@@ -1,6 +1,9 @@
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from thumbnails import PUBLICATION_DPI, getCellSize, readThumbnail
+
 filter_names = [
     'low_pass',
     'butterworth_low_pass',
@@ -41,45 +44,67 @@ filter_types = [
     'direction',
 ]
 
-df = pd.read_csv('./results/edge-results.csv')
 
-for i, image_name in enumerate(image_names):
-    for filter_type in filter_types:
+def plotEdgeDetection(df, image_name, filter_type, full_resolution=False):
+    """
+    Shows the edges detected in an image after each filter, at the kernel
+    size chosen for the image
+
+    :param df: The results of the edge detectors
+    :param image_name: The name of the image
+    :param filter_type: The type of edge detection, 'magnitude' or
+        'direction'
+    :param full_resolution: Whether to read the images at full resolution
+        and save the figure for publication, rather than read thumbnails
+    """
+    i = image_names.index(image_name)
 
-        fig, ax = plt.subplots(nrows=6, ncols=2)
+    fig, ax = plt.subplots(nrows=6, ncols=2)
 
-        # title subplot
-        fig.suptitle(f'{image_name} with {filter_type} detection', fontsize=14)
+    # title subplot
+    fig.suptitle(f'{image_name} with {filter_type} detection', fontsize=14)
 
-        # set the size of the figure
-        fig.set_size_inches(6, 12)
+    # set the size of the figure
+    fig.set_size_inches(6, 12)
+    dpi = PUBLICATION_DPI if full_resolution else fig.dpi
+    cell_size = getCellSize((6, 12), 6, 2, dpi)
 
-        subplot_index = 1
-        for filter_name, size in zip(filter_names, sizes):
-            kernel_size = size[i]
+    subplot_index = 1
+    for filter_name, size in zip(filter_names, sizes):
+        kernel_size = size[i]
 
-            # get the record that matches the filter name, image name, kernel size, and filter type
-            record = df.loc[(df['filter_name'] == filter_name) & (df['image_name'] == image_name) & (df['kernel_size'] == kernel_size) & (df['filter_type'] == filter_type)]
+        # get the record that matches the filter name, image name, kernel size, and filter type
+        record = df.loc[(df['filter_name'] == filter_name) & (df['image_name'] == image_name) & (df['kernel_size'] == kernel_size) & (df['filter_type'] == filter_type)]
 
-            # get the first row
-            record = record.iloc[0]
+        # get the first row
+        record = record.iloc[0]
 
-            # get the image
-            image = plt.imread(record['file_name'])
+        # get the image
+        image = readThumbnail(
+            record['file_name'], cell_size, full_resolution)
 
-            # add the image to the subplot
-            plt.subplot(6, 2, subplot_index)
-            plt.imshow(image)
-            filter_name_title = filter_name.replace('_', ' ').title()
-            plt.title(f'{filter_name_title} ({kernel_size}x{kernel_size})')
-            plt.axis('off')
-            subplot_index += 1
+        # add the image to the subplot
+        plt.subplot(6, 2, subplot_index)
+        plt.imshow(image)
+        filter_name_title = filter_name.replace('_', ' ').title()
+        plt.title(f'{filter_name_title} ({kernel_size}x{kernel_size})')
+        plt.axis('off')
+        subplot_index += 1
 
-        plt.tight_layout()
+    plt.tight_layout()
 
-        plt.savefig(f'./img/edge-detection-{image_name}-{filter_type}.png')
-        # plt.show()
+    plt.savefig(f'./img/edge-detection-{image_name}-{filter_type}.png', dpi=dpi)
+    # plt.show()
+    plt.close()
 
 
+if __name__ == '__main__':
+    # Images are read as thumbnails sized to their subplots, unless
+    # --full-resolution is passed for figures of publication quality
+    full_resolution = '--full-resolution' in sys.argv[1:]
 
+    df = pd.read_csv('./results/edge-results.csv')
 
+    for image_name in image_names:
+        for filter_type in filter_types:
+            plotEdgeDetection(df, image_name, filter_type, full_resolution)
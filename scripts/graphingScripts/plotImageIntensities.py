@@ -1,4 +1,12 @@
+import os
+import sys
 import matplotlib.pyplot as plt
+import numpy as np
+
+# The statistics index is read by the scripts that write it
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from imageStatistics import readStatistics
 
 # get the figure and axes
 fig, ax = plt.subplots(nrows=1, ncols=2)
@@ -10,16 +18,24 @@ ax[0].ticklabel_format(style='sci', axis='y', scilimits=(0,0))
 
 image_names = ['foetus', 'NZjers1']
 
+# The statistics of every image, so that no image is read. Only the
+# statistics indexed last are kept.
+statistics = readStatistics('./results/statistics.csv')
+
 # subplot the intensities of each image on seperate histograms with 26 bins
 for i, image_name in enumerate(image_names):
     # get the image file name
     image_file_name = f'./img/{image_name}.png'
-    # load in the image
-    image = plt.imread(image_file_name)
+    # get the intensity histogram of the image, whose bins are spread evenly
+    # from its least to its greatest intensity
+    record = statistics[image_file_name]
+    counts = record['histogram']
+    bins = np.histogram_bin_edges(
+        [record['min'], record['max']], bins=len(counts))
     # subplot the image
     plt.subplot(1, 2, i+1)
     # plot the intensity histogram
-    plt.hist(image.ravel(), bins=26)
+    plt.hist(bins[:-1], bins=bins, weights=counts)
     # set the title of the subplot
     plt.title(f'Intensity of {image_name}')
     # set the x-axis label
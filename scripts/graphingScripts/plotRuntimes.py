@@ -4,12 +4,14 @@ import seaborn as sns
 
 fileName = './results/results.csv'
 
-df = pd.read_csv(fileName)
 
-# get the unique values of the filter_name column
-filter_names = df.filter_name.unique()
+def plotRuntimes(df, filter_name):
+    """
+    Plots the runtimes of a filter against the kernel size for every image
 
-for filter_name in filter_names:
+    :param df: The results of the filters
+    :param filter_name: The name of the filter
+    """
     # Filter the dataframe by filter_name
     df_filter = df[df.filter_name == filter_name]
 
@@ -46,4 +48,14 @@ for filter_name in filter_names:
 
     # save the figure
     plt.savefig(f'./img/runtimes-{filter_name}.png', bbox_inches='tight', dpi=600)
-    
\ No newline at end of file
+    plt.close()
+
+
+if __name__ == '__main__':
+    df = pd.read_csv(fileName)
+
+    # get the unique values of the filter_name column
+    filter_names = df.filter_name.unique()
+
+    for filter_name in filter_names:
+        plotRuntimes(df, filter_name)
@@ -0,0 +1,294 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import importlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+
+# Render every figure without a display, as no figure is ever shown
+matplotlib.use('Agg')
+
+import pandas as pd
+
+from averageImageIntensity import getStatisticsTable
+from plotEdgeDetection import filter_types, image_names as edge_image_names
+
+# The record of the inputs every figure was last rendered from
+FIGURE_MANIFEST = './results/figures.json'
+
+# The tables every worker renders its figures from, loaded once by the
+# driver and passed to each worker when it starts
+TABLES = {}
+
+
+class Figure:
+    """
+    A figure rendered by a function of one of the graphing scripts, and the
+    signature of the inputs it is rendered from
+    """
+
+    def __init__(
+            self, figure_path, module_name, function_name, table_names, args,
+            signature):
+        """
+        Creates a figure
+
+        :param figure_path: The path the figure is saved to
+        :param module_name: The name of the graphing script
+        :param function_name: The name of the function that renders it
+        :param table_names: The names of the tables passed to the function
+            first, in order
+        :param args: The arguments passed to the function after the tables
+        :param signature: The signature of the inputs from getSignature
+        """
+        self.figure_path = figure_path
+        self.module_name = module_name
+        self.function_name = function_name
+        self.table_names = table_names
+        self.args = args
+        self.signature = signature
+
+
+def getSignature(module_name, args, rows, file_names):
+    """
+    Gets a signature of everything a figure is rendered from, which changes
+    if any of it changes
+
+    :param module_name: The name of the graphing script, whose source is
+        part of the signature
+    :param args: The arguments the figure is rendered with
+    :param rows: The tables of the rows of the results the figure reads
+    :param file_names: The images the figure reads, whose sizes and times of
+        modification are part of the signature
+
+    :return: The signature as a hexadecimal string
+    """
+    signature = hashlib.sha1()
+    script_path = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), f'{module_name}.py')
+    with open(script_path, 'rb') as scriptFile:
+        signature.update(scriptFile.read())
+    signature.update(repr(args).encode())
+    for table in rows:
+        signature.update(table.to_csv(index=False).encode())
+    for file_name in file_names:
+        status = os.stat(file_name)
+        signature.update(
+            f'{file_name}:{status.st_size}:{status.st_mtime_ns}'.encode())
+    return signature.hexdigest()
+
+
+def readTables():
+    """
+    Reads the tables of results the figures are rendered from. The edge
+    detection results and the statistics index are optional.
+
+    :return: A dictionary of the tables by name
+    """
+    tables = {'results': pd.read_csv('./results/results.csv')}
+    if os.path.isfile('./results/edge-results.csv'):
+        tables['edge_results'] = pd.read_csv('./results/edge-results.csv')
+    if os.path.isfile('./results/statistics.csv'):
+        tables['statistics'] = getStatisticsTable()
+    return tables
+
+
+def getFigures(tables, full_resolution=False):
+    """
+    Gets every figure of plotRuntimes.py, averageImageIntensity.py,
+    showImages.py and plotEdgeDetection.py
+
+    :param tables: The tables of results from readTables
+    :param full_resolution: Whether the images are shown at full resolution
+
+    :return: A list of the figures
+    """
+    figures = []
+    df = tables['results']
+    for filter_name in df.filter_name.unique():
+        df_filter = df[df.filter_name == filter_name]
+
+        figures.append(Figure(
+            f'./img/runtimes-{filter_name}.png', 'plotRuntimes',
+            'plotRuntimes', ['results'], (filter_name,),
+            getSignature(
+                'plotRuntimes', (filter_name,), [df_filter], [])))
+
+        if 'statistics' in tables:
+            # The averages are read from the statistics of the images
+            file_names = list(df_filter.file_name) + [
+                f'./img/{image_name}.png'
+                for image_name in df_filter.image_name.unique()]
+            statistics = tables['statistics']
+            # Only the means are plotted, and the histograms are arrays
+            statistics = statistics.loc[
+                statistics.index.isin(file_names), ['mean']]
+            figures.append(Figure(
+                f'./img/intensities-{filter_name}.png',
+                'averageImageIntensity', 'plotAverageIntensities',
+                ['results', 'statistics'], (filter_name,),
+                getSignature(
+                    'averageImageIntensity', (filter_name,),
+                    [df_filter, statistics], [])))
+
+        for image_name in df_filter.image_name.unique():
+            df_image = df_filter[df_filter.image_name == image_name]
+            args = (image_name, filter_name, full_resolution)
+            file_names = [f'./img/{image_name}.png'] + \
+                list(df_image.file_name)
+            figures.append(Figure(
+                f'./img/{image_name}-{filter_name}.png', 'showImages',
+                'showImages', ['results'], args,
+                getSignature('showImages', args, [df_image], file_names)))
+
+    if 'edge_results' in tables:
+        df = tables['edge_results']
+        for image_name in edge_image_names:
+            for filter_type in filter_types:
+                df_edge = df[(df.image_name == image_name) &
+                             (df.filter_type == filter_type)]
+                args = (image_name, filter_type, full_resolution)
+                figures.append(Figure(
+                    f'./img/edge-detection-{image_name}-{filter_type}.png',
+                    'plotEdgeDetection', 'plotEdgeDetection',
+                    ['edge_results'], args,
+                    getSignature(
+                        'plotEdgeDetection', args, [df_edge],
+                        list(df_edge.file_name))))
+
+    return figures
+
+
+def shareTables(tables):
+    """
+    Keeps the tables in a worker for every figure it renders
+
+    :param tables: The tables of results from readTables
+    """
+    matplotlib.use('Agg')
+    TABLES.update(tables)
+
+
+def renderFigure(figure):
+    """
+    Renders a figure in a worker
+
+    :param figure: The figure
+    """
+    module = importlib.import_module(figure.module_name)
+    tables = [TABLES[name] for name in figure.table_names]
+    getattr(module, figure.function_name)(*tables, *figure.args)
+
+
+def readManifest(file_name=FIGURE_MANIFEST):
+    """
+    Reads the signatures of the figures rendered so far
+
+    :param file_name: The name of the manifest
+
+    :return: A dictionary of the signatures by the path of the figure
+    """
+    if not os.path.isfile(file_name):
+        return {}
+    with open(file_name) as manifestFile:
+        return json.load(manifestFile)
+
+
+def writeManifest(manifest, file_name=FIGURE_MANIFEST):
+    """
+    Writes the signatures of the figures rendered so far. The manifest is
+    written under a temporary name and then renamed, so an interrupted
+    write never leaves it half written.
+
+    :param manifest: A dictionary of the signatures by the path of the figure
+    :param file_name: The name of the manifest
+    """
+    directory = os.path.dirname(file_name)
+    handle, temporary_path = tempfile.mkstemp(suffix='.json', dir=directory)
+    with os.fdopen(handle, 'w') as manifestFile:
+        json.dump(manifest, manifestFile, indent=1, sort_keys=True)
+    os.replace(temporary_path, file_name)
+
+
+def renderFigures(tables, figures, workers=None, force=False):
+    """
+    Renders every figure whose inputs have changed since it was last
+    rendered, in a pool of worker processes. Every worker is given the tables
+    once when it starts. A figure that fails to render is reported and left
+    to be rendered again next time.
+
+    :param tables: The tables of results from readTables
+    :param figures: The figures from getFigures
+    :param workers: The number of worker processes. If None, one per CPU.
+    :param force: Whether to render every figure even if it is unchanged
+
+    :return: The number of figures rendered, skipped and failed
+    """
+    manifest = readManifest()
+    pending = [
+        figure for figure in figures
+        if force or not os.path.isfile(figure.figure_path)
+        or manifest.get(figure.figure_path) != figure.signature]
+
+    failed = 0
+    with ProcessPoolExecutor(
+            workers, initializer=shareTables, initargs=(tables,)) as executor:
+        futures = {
+            executor.submit(renderFigure, figure): figure
+            for figure in pending}
+        for future in as_completed(futures):
+            figure = futures[future]
+            try:
+                future.result()
+            except Exception as error:
+                failed += 1
+                print(f'Failed: {figure.figure_path}\t'
+                      f'{type(error).__name__}: {error}')
+                continue
+
+            # Record each figure as it is rendered, so an interrupted run
+            # keeps the figures rendered so far
+            manifest[figure.figure_path] = figure.signature
+            writeManifest(manifest)
+            print(f'Rendered: {figure.figure_path}')
+
+    return len(pending) - failed, len(figures) - len(pending), failed
+
+
+def main():
+    """
+    Main function
+    """
+
+    # Get the arguments passed to the script and check if they are valid.
+    arguments = sys.argv[1:]
+    force = '--force' in arguments
+    full_resolution = '--full-resolution' in arguments
+    workers = None
+    if '--workers' in arguments:
+        index = arguments.index('--workers')
+        if index + 1 >= len(arguments) or not arguments[index + 1].isdigit():
+            arguments = None
+        else:
+            workers = int(arguments.pop(index + 1))
+            arguments.remove('--workers')
+    if arguments is None or set(arguments) - {'--force', '--full-resolution'}:
+        print('Usage: python renderFigures.py [--workers N] [--force] '
+              '[--full-resolution]')
+        sys.exit(1)
+
+    start_time = time.perf_counter_ns()
+    tables = readTables()
+    figures = getFigures(tables, full_resolution)
+    rendered, skipped, failed = renderFigures(tables, figures, workers, force)
+    runtime = (time.perf_counter_ns() - start_time) / 1e9
+    print(f'Rendered: {rendered}\tSkipped: {skipped}\tFailed: {failed}\t'
+          f'Runtime: {runtime:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
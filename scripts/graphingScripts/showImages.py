@@ -1,68 +1,92 @@
+import sys
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 
-fileName = './results/results.csv'
+from thumbnails import PREVIEW_DPI, PUBLICATION_DPI, getCellSize, \
+    readThumbnail
 
-df = pd.read_csv(fileName)
+fileName = './results/results.csv'
 
-# get the unique values of the image_name column
-image_names = df.image_name.unique()
 
+def showImages(df, image_name, filter_name, full_resolution=False):
+    """
+    Shows an image filtered with a filter at every kernel size next to the
+    original image
 
+    :param df: The results of the filters
+    :param image_name: The name of the image
+    :param filter_name: The name of the filter
+    :param full_resolution: Whether to read the images at full resolution
+        and save the figure for publication, rather than read thumbnails
+    """
+    dpi = PUBLICATION_DPI if full_resolution else PREVIEW_DPI
 
-for image_name in image_names:
     # Filter the dataframe by image_name
     df_image = df[df.image_name == image_name]
-    
-    # get the unique values of the filter_name column
-    filter_names = df_image.filter_name.unique()
-    for filter_name in filter_names:
-        # Filter the dataframe by filter_name
-        df_filter = df_image[df_image.filter_name == filter_name]
-
-        # get the unique values of the kernel_size column
-        kernel_sizes = df_filter.kernel_size.unique()
-        num_kernel_sizes = len(kernel_sizes)
-        num_rows = np.ceil(num_kernel_sizes / 2.0).astype(int)
-
-        subplot_index = 1
-        fig, ax = plt.subplots(nrows=num_rows, ncols=2)
-
-        # Split the filter_name into words and capitalize the first letter of each word
-        title = ' '.join([word.capitalize() for word in filter_name.split('_')])
-        # set the title of the figure
-        fig.suptitle(f'{title} with varying Kernal Sizes', fontsize=14)
-
-        # set the size of the figure
-        fig.set_size_inches(6, 8)
-
-        # Plot the original image for comparison
-        original_image_file_name = f'./img/{image_name}.png'
-        image = plt.imread(original_image_file_name)
+    # Filter the dataframe by filter_name
+    df_filter = df_image[df_image.filter_name == filter_name]
+
+    # get the unique values of the kernel_size column
+    kernel_sizes = df_filter.kernel_size.unique()
+    num_kernel_sizes = len(kernel_sizes)
+    num_rows = np.ceil(num_kernel_sizes / 2.0).astype(int)
+
+    subplot_index = 1
+    fig, ax = plt.subplots(nrows=num_rows, ncols=2)
+
+    # Split the filter_name into words and capitalize the first letter of each word
+    title = ' '.join([word.capitalize() for word in filter_name.split('_')])
+    # set the title of the figure
+    fig.suptitle(f'{title} with varying Kernal Sizes', fontsize=14)
+
+    # set the size of the figure
+    fig.set_size_inches(6, 8)
+    cell_size = getCellSize((6, 8), num_rows, 2, dpi)
+
+    # Plot the original image for comparison
+    original_image_file_name = f'./img/{image_name}.png'
+    image = readThumbnail(
+        original_image_file_name, cell_size, full_resolution)
+    plt.subplot(num_rows, 2, subplot_index)
+    plt.imshow(image, cmap='gray')
+    plt.title('Original')
+    plt.axis('off')
+    subplot_index += 1
+
+    for kernel_size in kernel_sizes:
+        # Filter the dataframe by kernel_size
+        record = df_filter[df_filter.kernel_size == kernel_size]
+        record = record.iloc[0]
+
+        # get image fileName
+        image_file_name = record.file_name
+
+        # load in the image
+        image = readThumbnail(image_file_name, cell_size, full_resolution)
+
         plt.subplot(num_rows, 2, subplot_index)
         plt.imshow(image, cmap='gray')
-        plt.title('Original')
+        plt.title(f'Kernel size: {kernel_size} x {kernel_size}')
         plt.axis('off')
         subplot_index += 1
+    plt.savefig(f'./img/{image_name}-{filter_name}.png', bbox_inches='tight', dpi=dpi)
+    plt.clf()
+    plt.close()
 
-        for kernel_size in kernel_sizes:
-            # Filter the dataframe by kernel_size
-            record = df_filter[df_filter.kernel_size == kernel_size]
-            record = record.iloc[0]
 
-            # get image fileName
-            image_file_name = record.file_name
+if __name__ == '__main__':
+    # Images are read as thumbnails sized to their subplots, unless
+    # --full-resolution is passed for figures of publication quality
+    full_resolution = '--full-resolution' in sys.argv[1:]
 
-            # load in the image
-            image = plt.imread(image_file_name)
+    df = pd.read_csv(fileName)
 
-            plt.subplot(num_rows, 2, subplot_index)
-            plt.imshow(image, cmap='gray')
-            plt.title(f'Kernel size: {kernel_size} x {kernel_size}')
-            plt.axis('off')
-            subplot_index += 1
-        plt.savefig(f'./img/{image_name}-{filter_name}.png', bbox_inches='tight', dpi=600)
-        plt.clf()
-        plt.close()
+    # get the unique values of the image_name column
+    image_names = df.image_name.unique()
 
+    for image_name in image_names:
+        # get the unique values of the filter_name column
+        filter_names = df[df.image_name == image_name].filter_name.unique()
+        for filter_name in filter_names:
+            showImages(df, image_name, filter_name, full_resolution)
@@ -0,0 +1,90 @@
+import os
+import hashlib
+import tempfile
+import matplotlib.pyplot as plt
+from PIL import Image
+
+
+# The directory thumbnails are cached in
+THUMBNAIL_DIRECTORY = './results/thumbnails/'
+
+# The resolution figures of thumbnails are saved at, and the resolution
+# figures of full resolution images are saved at for publication
+PREVIEW_DPI = 150
+PUBLICATION_DPI = 600
+
+
+def getCellSize(figure_size, rows, columns, dpi):
+    """
+    Gets the size in pixels of a cell of a grid of subplots
+
+    :param figure_size: The (width, height) of the figure in inches
+    :param rows: The number of rows of subplots
+    :param columns: The number of columns of subplots
+    :param dpi: The resolution the figure is saved at
+
+    :return: The (width, height) of a cell in pixels
+    """
+    width, height = figure_size
+    return int(width * dpi / columns), int(height * dpi / rows)
+
+
+def getSourceHash(image_path):
+    """
+    Gets the hash of the contents of an image file, so that a thumbnail of
+    an image that has changed is never read
+
+    :param image_path: The path to the image
+
+    :return: The hash as a hexadecimal string
+    """
+    with open(image_path, 'rb') as imageFile:
+        return hashlib.sha1(imageFile.read()).hexdigest()
+
+
+def getThumbnailPath(image_path, cell_size):
+    """
+    Gets the path of the thumbnail of an image for a size of cell
+
+    :param image_path: The path to the image
+    :param cell_size: The (width, height) of the cell in pixels
+
+    :return: The path of the thumbnail
+    """
+    width, height = cell_size
+    return os.path.join(
+        THUMBNAIL_DIRECTORY,
+        f'{getSourceHash(image_path)}-{width}x{height}.png')
+
+
+def readThumbnail(image_path, cell_size, full_resolution=False):
+    """
+    Reads an image shrunk to fit a cell of a grid of subplots. Thumbnails are
+    made the first time they are read and cached by the hash of the image
+    and the size of the cell. Images smaller than the cell are not enlarged.
+
+    :param image_path: The path to the image
+    :param cell_size: The (width, height) of the cell in pixels
+    :param full_resolution: Whether to read the image itself, for figures
+        of publication quality
+
+    :return: The thumbnail, as plt.imread reads it
+    """
+    if full_resolution:
+        return plt.imread(image_path)
+
+    thumbnail_path = getThumbnailPath(image_path, cell_size)
+    if not os.path.isfile(thumbnail_path):
+        os.makedirs(THUMBNAIL_DIRECTORY, exist_ok=True)
+        with Image.open(image_path) as image:
+            image.thumbnail(cell_size)
+
+            # Write the thumbnail under a temporary name and then rename it,
+            # so that a thumbnail being written is never read
+            handle, temporary_path = tempfile.mkstemp(
+                suffix='.png', dir=THUMBNAIL_DIRECTORY)
+            os.close(handle)
+            image.save(temporary_path, format='PNG')
+            os.replace(temporary_path, thumbnail_path)
+
+    return plt.imread(thumbnail_path)
@@ -7,7 +7,8 @@ class IFrequencyFilters(ABC):
         """
         Applies a linear filter to an image
 
-        :param image: The image to be filtered
+        :param image: The image to be filtered, either (height, width) or
+            (height, width, channels)
         :param filter_name: The name of the filter
         :param kernel_size: The size of the kernel
         :param kwargs: The arguments for the filter
@@ -18,14 +19,24 @@ class IFrequencyFilters(ABC):
 
     @abstractmethod
     def calculateFrequencyDomainConvolution(
-            self, image, kernel, padding='constant'):
+            self,
+            image,
+            kernel,
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None):
         """
         Performs a convolution on an image using a kernel using the Fast Fourier
         Transform algorithm.
 
-        :param image: The image to be convolved
+        :param image: The image to be convolved, either (height, width) or
+            (height, width, channels)
         :param kernel: The kernel to convolve the image with
         :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow buffers from
+        :param out: The array to write the convolved image into
 
         :return: The convolved image
         """
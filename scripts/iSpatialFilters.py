@@ -7,7 +7,8 @@ class ISpatialFilters(ABC):
         """
         Applies a linear filter to an image
 
-        :param image: The image to be filtered
+        :param image: The image to be filtered, either (height, width) or
+            (height, width, channels)
         :param filter_name: The name of the filter
         :param kernel_size: The size of the kernel
         :param kwargs: The arguments for the filter
@@ -22,15 +23,24 @@ class ISpatialFilters(ABC):
             image,
             kernel_size,
             filter_function,
-            padding='constant'):
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None):
         """
         Performs a convolution on an image using a kernel using the spatial
         domain algorithm.
 
-        :param image: The image to be convolved
+        :param image: The image to be convolved, either (height, width) or
+            (height, width, channels)
         :param kernel_size: The size of the kernel
-        :param filter_function: The filter function to be applied
+        :param filter_function: The filter function to be applied to a row
+            of regions of interest at a time, reducing each region over its
+            last two axes
         :param padding: The type of padding to use. Possible values:
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow buffers from
+        :param out: The array to write the convolved image into
 
         :return: The convolved image
         """
@@ -0,0 +1,122 @@
+import csv
+import math
+import os.path
+import numpy as np
+
+
+# The statistics of every image in the statistics index, in the order of its
+# columns after the file name
+STATISTICS = ['mean', 'std', 'min', 'max', 'psnr', 'histogram']
+
+# The number of bins of the intensity histogram of every image, spread
+# evenly from the least to the greatest intensity as plt.hist spreads them
+HISTOGRAM_BINS = 26
+
+
+def getPeakValue(dtype):
+    """
+    Gets the greatest intensity an image of a type can hold
+
+    :param dtype: The type of the image
+
+    :return: The greatest value of an integer type, or 1 as floating point
+        images hold intensities from 0 to 1
+    """
+    dtype = np.dtype(dtype)
+    if np.issubdtype(dtype, np.integer):
+        return np.iinfo(dtype).max
+    return 1.0
+
+
+def getPSNR(image, source_image):
+    """
+    Gets the peak signal-to-noise ratio of a filtered image against the image
+    it was filtered from
+
+    :param image: The filtered image
+    :param source_image: The image it was filtered from
+
+    :return: The ratio in decibels, or infinity if the images are equal
+
+    :raises ValueError: If the images have different shapes
+    """
+    if image.shape != source_image.shape:
+        raise ValueError(
+            f'The filtered image has shape {image.shape}, but the source '
+            f'image has shape {source_image.shape}.')
+
+    error = np.subtract(image, source_image, dtype=np.float64)
+    mean_squared_error = np.mean(np.square(error))
+    if mean_squared_error == 0:
+        return math.inf
+    peak = getPeakValue(source_image.dtype)
+    return 10 * math.log10(peak ** 2 / mean_squared_error)
+
+
+def getImageStatistics(image, source_image=None):
+    """
+    Gets the statistics of an image while it is still in memory, so that
+    figures of them need not read the image back
+
+    :param image: The image
+    :param source_image: The image it was filtered from. If None, the image
+        has no peak signal-to-noise ratio.
+
+    :return: A dictionary of every statistic in STATISTICS. The histogram is
+        a list of the counts of HISTOGRAM_BINS bins from the least to the
+        greatest intensity, so the statistics can be sent as JSON.
+    """
+    histogram, _ = np.histogram(image, bins=HISTOGRAM_BINS)
+    return {
+        'mean': float(np.mean(image, dtype=np.float64)),
+        'std': float(np.std(image, dtype=np.float64)),
+        'min': float(np.min(image)),
+        'max': float(np.max(image)),
+        'psnr': None if source_image is None else getPSNR(image, source_image),
+        'histogram': histogram.tolist(),
+    }
+
+
+def writeStatistics(file_name, image_file_name, statistics):
+    """
+    Appends the statistics of an image to the statistics index. An image
+    indexed again keeps only the statistics written last.
+
+    :param file_name: The name of the statistics index
+    :param image_file_name: The file name of the image, as it is written in
+        the results files
+    :param statistics: The statistics of the image from getImageStatistics
+    """
+    # Write the header if the file does not exist yet
+    fileExists = os.path.isfile(file_name)
+    with open(file_name, 'a', newline='') as statisticsFile:
+        csvWriter = csv.writer(statisticsFile)
+        if not fileExists:
+            csvWriter.writerow(['file_name'] + STATISTICS)
+
+        # The histogram counts are written in one column, separated by spaces
+        histogram = ' '.join(str(count) for count in statistics['histogram'])
+        csvWriter.writerow(
+            [image_file_name] +
+            [statistics[name] for name in STATISTICS[:-1]] + [histogram])
+
+
+def readStatistics(file_name):
+    """
+    Reads the statistics index
+
+    :param file_name: The name of the statistics index
+
+    :return: A dictionary of the statistics of every image by its file name,
+        with the histogram as an array of counts
+    """
+    statistics = {}
+    with open(file_name, newline='') as statisticsFile:
+        for row in csv.DictReader(statisticsFile):
+            image_file_name = row.pop('file_name')
+            for name in ['mean', 'std', 'min', 'max']:
+                row[name] = float(row[name])
+            row['psnr'] = float(row['psnr']) if row['psnr'] else None
+            row['histogram'] = np.array(row['histogram'].split(), dtype=int)
+            statistics[image_file_name] = row
+    return statistics
@@ -0,0 +1,210 @@
+import csv
+import functools
+import os.path
+import time
+from contextlib import contextmanager
+
+
+class Stage:
+    """
+    Times a single stage of a convolution engine and records it with the
+    profiler when the stage finishes
+    """
+
+    def __init__(self, profiler, stage_name):
+        """
+        Creates a stage timer
+
+        :param profiler: The profiler to record the stage with
+        :param stage_name: The name of the stage
+        """
+        self.profiler = profiler
+        self.stage_name = stage_name
+        self.calls = 1
+        self.allocated_bytes = 0
+        self.start_time = 0
+
+    def __enter__(self):
+        self.start_time = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_time = time.perf_counter_ns() - self.start_time
+        self.profiler.record(
+            self.stage_name, wall_time, self.calls, self.allocated_bytes)
+        return False
+
+    def allocate(self, *arrays):
+        """
+        Adds the size of the arrays allocated by the stage to its record
+
+        :param arrays: The arrays allocated by the stage
+        """
+        for array in arrays:
+            self.allocated_bytes += array.nbytes
+
+
+class NullStage:
+    """
+    Stage used when profiling is disabled. Every method is a no-op so that the
+    convolution engines pay next to nothing for the instrumentation.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def allocate(self, *arrays):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class Profiler:
+    """
+    Collects the wall time, call count and bytes allocated of each stage of
+    the convolution engines used by LinearFilters, NonLinearFilters and
+    EdgeDetector.
+
+    Profiling is disabled by default. Enable it with the profile context
+    manager:
+
+        with PROFILER.profile():
+            LF.applyFilter(image, 'gaussian', 5)
+        PROFILER.getRecords()
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = {}
+        self.scope = ''
+
+    @contextmanager
+    def profile(self):
+        """
+        Enables profiling for the duration of the context
+        """
+        enabled = self.enabled
+        self.enabled = True
+        try:
+            yield self
+        finally:
+            self.enabled = enabled
+
+    @contextmanager
+    def filterScope(self, filter_class, filter_name):
+        """
+        Records every stage run inside the context against the given filter
+
+        :param filter_class: The name of the class applying the filter
+        :param filter_name: The name of the filter being applied
+        """
+        scope = self.scope
+        self.scope = f'{filter_class}.{filter_name}'
+        try:
+            with self.stage('total'):
+                yield
+        finally:
+            self.scope = scope
+
+    def stage(self, stage_name):
+        """
+        Gets a context manager that times a stage of a convolution engine
+
+        :param stage_name: The name of the stage
+
+        :return: The stage timer, or a no-op stage if profiling is disabled
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, stage_name)
+
+    def record(self, stage_name, wall_time, calls=1, allocated_bytes=0):
+        """
+        Adds a measurement to the record of a stage
+
+        :param stage_name: The name of the stage
+        :param wall_time: The wall time of the stage in nanoseconds
+        :param calls: The number of calls made by the stage
+        :param allocated_bytes: The number of bytes allocated by the stage
+        """
+        key = (self.scope, stage_name)
+        record = self.records.setdefault(key, [0, 0, 0])
+        record[0] += wall_time
+        record[1] += calls
+        record[2] += allocated_bytes
+
+    def getRecords(self):
+        """
+        Gets the records of every stage profiled since the last reset
+
+        :return: A list of dictionaries with the keys 'scope', 'stage',
+            'wall_time', 'calls' and 'allocated_bytes'
+        """
+        return [
+            {
+                'scope': scope,
+                'stage': stage_name,
+                'wall_time': wall_time,
+                'calls': calls,
+                'allocated_bytes': allocated_bytes,
+            }
+            for (scope, stage_name), (wall_time, calls, allocated_bytes)
+            in self.records.items()
+        ]
+
+    def reset(self):
+        """
+        Removes every record collected so far
+        """
+        self.records = {}
+
+    def writeCsv(self, file_name, **columns):
+        """
+        Appends the records to a CSV file so that they can be read alongside
+        the sweep results
+
+        :param file_name: The name of the CSV file
+        :param columns: Extra columns written in front of every record, such
+            as the image and filter the records belong to
+        """
+        headers = list(columns.keys()) + \
+            ['scope', 'stage', 'wall_time', 'calls', 'allocated_bytes']
+
+        # Write the header if the file does not exist yet
+        fileExists = os.path.isfile(file_name)
+        with open(file_name, 'a', newline='') as profileFile:
+            csvWriter = csv.writer(profileFile)
+            if not fileExists:
+                csvWriter.writerow(headers)
+            for record in self.getRecords():
+                csvWriter.writerow(
+                    list(columns.values()) + [record[key] for key in headers
+                                              if key not in columns])
+
+
+PROFILER = Profiler()
+
+
+def profiledFilter(apply_filter):
+    """
+    Decorates an applyFilter method so that every stage it runs is recorded
+    against the class and the name of the filter being applied
+
+    :param apply_filter: The applyFilter method to decorate
+
+    :return: The decorated method
+    """
+
+    @functools.wraps(apply_filter)
+    def wrapper(self, image, filter_name, *args, **kwargs):
+        # Skip the bookkeeping entirely when profiling is disabled
+        if not PROFILER.enabled:
+            return apply_filter(self, image, filter_name, *args, **kwargs)
+        with PROFILER.filterScope(type(self).__name__, filter_name):
+            return apply_filter(self, image, filter_name, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,274 @@
+import json
+import time
+import sqlite3
+import threading
+
+
+# The states of a job in the queue
+PENDING = 'pending'
+CLAIMED = 'claimed'
+COMPLETE = 'complete'
+FAILED = 'failed'
+
+
+class JobQueue:
+    """
+    A queue of sweep jobs in an SQLite database, which workers on several
+    hosts claim jobs from when the database lies on storage they share:
+
+        queue = JobQueue('./results/queue.db')
+        queue.addJobs(jobs)
+
+        # On every host
+        while (claimed := queue.claim(worker_id)) is not None:
+            job_id, job = claimed
+            queue.complete(job_id, worker_id, runJob(job))
+
+    A worker holds a claimed job for a lease, which it renews while the job
+    runs. A job whose lease expires, e.g. because its worker died, is
+    claimed again by the next worker. A job that fails or outlives its
+    lease is returned to the queue until it has been claimed a given number
+    of times, so a job that kills every worker that runs it is given up.
+
+    Leases are compared against the clocks of the hosts, so the clocks must
+    be kept in sync. The database uses SQLite's default rollback journal, as
+    its write-ahead log needs shared memory that network file systems do not
+    provide.
+    """
+
+    def __init__(self, file_name, lease_time=600, max_attempts=3):
+        """
+        Opens the queue, creating it if it does not exist
+
+        :param file_name: The name of the database file
+        :param lease_time: The number of seconds a claim or renewal holds a
+            job for
+        :param max_attempts: The number of times a job is claimed before it
+            is failed for good
+        """
+        self.file_name = file_name
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+
+        # Transactions are begun explicitly, so that a claim holds the write
+        # lock from reading the next job to claiming it
+        self.connection = sqlite3.connect(
+            file_name, timeout=60, isolation_level=None)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                job TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                lease_expiry REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                collected INTEGER NOT NULL DEFAULT 0)''')
+
+    def close(self):
+        """
+        Closes the connection to the database
+        """
+        self.connection.close()
+
+    def addJobs(self, jobs):
+        """
+        Adds jobs to the queue as pending. Jobs already in the queue keep
+        their state.
+
+        :param jobs: The jobs, each a dictionary
+
+        :return: The number of jobs added
+        """
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            before = self.connection.total_changes
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO jobs (key, job, status) '
+                'VALUES (?, ?, ?)',
+                [(json.dumps(job, sort_keys=True), json.dumps(job), PENDING)
+                 for job in jobs])
+            return self.connection.total_changes - before
+
+    def claim(self, worker_id):
+        """
+        Claims the next pending job, or the next job whose lease has expired.
+        A job whose lease expired after its last attempt is failed instead.
+
+        :param worker_id: The name of the worker claiming the job
+
+        :return: The ID of the job and the job, or None if no job can be
+            claimed
+        """
+        now = time.time()
+        with self.connection:
+            # Take the write lock before reading, so that no two workers
+            # claim the same job
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.connection.execute(
+                'UPDATE jobs SET status = ?, error = ?, lease_expiry = NULL '
+                'WHERE status = ? AND lease_expiry < ? AND attempts >= ?',
+                (FAILED, 'The lease expired on the last attempt.', CLAIMED,
+                 now, self.max_attempts))
+            row = self.connection.execute(
+                'SELECT id, job FROM jobs WHERE status = ? '
+                'OR (status = ? AND lease_expiry < ?) ORDER BY id LIMIT 1',
+                (PENDING, CLAIMED, now)).fetchone()
+            if row is None:
+                return None
+            job_id, job = row
+            self.connection.execute(
+                'UPDATE jobs SET status = ?, worker = ?, lease_expiry = ?, '
+                'attempts = attempts + 1 WHERE id = ?',
+                (CLAIMED, worker_id, now + self.lease_time, job_id))
+        return job_id, json.loads(job)
+
+    def renew(self, job_id, worker_id):
+        """
+        Renews the lease of a claimed job
+
+        :param job_id: The ID of the job
+        :param worker_id: The name of the worker holding the job
+
+        :return: True if the worker still holds the job, False if its lease
+            expired and another worker claimed it
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                'UPDATE jobs SET lease_expiry = ? '
+                'WHERE id = ? AND worker = ? AND status = ?',
+                (time.time() + self.lease_time, job_id, worker_id, CLAIMED))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id, result):
+        """
+        Reports the result of a claimed job. A result reported by a worker
+        whose lease expired and was claimed by another is discarded, so every
+        job has exactly one result.
+
+        :param job_id: The ID of the job
+        :param worker_id: The name of the worker holding the job
+        :param result: The result of the job, which must be JSON serializable
+
+        :return: True if the result was kept, False if it was discarded
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                'UPDATE jobs SET status = ?, result = ?, lease_expiry = NULL '
+                'WHERE id = ? AND worker = ? AND status = ?',
+                (COMPLETE, json.dumps(result), job_id, worker_id, CLAIMED))
+            return cursor.rowcount == 1
+
+    def fail(self, job_id, worker_id, error):
+        """
+        Reports that a claimed job failed. The job is returned to the queue
+        unless it has been claimed max_attempts times.
+
+        :param job_id: The ID of the job
+        :param worker_id: The name of the worker holding the job
+        :param error: A description of the error
+        """
+        with self.connection:
+            self.connection.execute(
+                'UPDATE jobs SET status = CASE WHEN attempts < ? THEN ? '
+                'ELSE ? END, error = ?, lease_expiry = NULL '
+                'WHERE id = ? AND worker = ? AND status = ?',
+                (self.max_attempts, PENDING, FAILED, error, job_id,
+                 worker_id, CLAIMED))
+
+    def getCounts(self):
+        """
+        Gets the number of jobs in every state
+
+        :return: A dictionary of the number of jobs by state
+        """
+        counts = {PENDING: 0, CLAIMED: 0, COMPLETE: 0, FAILED: 0}
+        counts.update(self.connection.execute(
+            'SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        return counts
+
+    def isFinished(self):
+        """
+        Checks whether every job is complete or failed for good
+
+        :return: True if no job is pending or claimed, False otherwise
+        """
+        counts = self.getCounts()
+        return counts[PENDING] == 0 and counts[CLAIMED] == 0
+
+    def getResults(self):
+        """
+        Gets the results of the complete jobs not collected yet
+
+        :return: A list of the IDs of the jobs, the jobs and their results
+        """
+        rows = self.connection.execute(
+            'SELECT id, job, result FROM jobs '
+            'WHERE status = ? AND collected = 0 ORDER BY id',
+            (COMPLETE,)).fetchall()
+        return [(job_id, json.loads(job), json.loads(result))
+                for job_id, job, result in rows]
+
+    def markCollected(self, job_id):
+        """
+        Marks the result of a job collected, once it has been written, so an
+        interrupted collection collects it again
+
+        :param job_id: The ID of the job
+        """
+        with self.connection:
+            self.connection.execute(
+                'UPDATE jobs SET collected = 1 WHERE id = ?', (job_id,))
+
+
+class LeaseRenewer:
+    """
+    Renews the lease of a claimed job in a background thread while the job
+    runs, three times per lease so that one late renewal never loses it:
+
+        with LeaseRenewer(queue, job_id, worker_id):
+            result = runJob(job)
+
+    The thread has its own connection to the database, as a connection
+    cannot be shared between threads. It stops renewing once the lease is
+    lost to another worker, in which case the result of the job is
+    discarded when it is reported.
+    """
+
+    def __init__(self, queue, job_id, worker_id):
+        """
+        Creates the renewer
+
+        :param queue: The queue the job was claimed from
+        :param job_id: The ID of the job
+        :param worker_id: The name of the worker holding the job
+        """
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.renew, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def renew(self):
+        """
+        Renews the lease until the job finishes or the lease is lost
+        """
+        queue = JobQueue(
+            self.queue.file_name, self.queue.lease_time,
+            self.queue.max_attempts)
+        try:
+            while not self.stopped.wait(self.queue.lease_time / 3):
+                if not queue.renew(self.job_id, self.worker_id):
+                    break
+        finally:
+            queue.close()
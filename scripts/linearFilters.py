@@ -1,6 +1,13 @@
 import numpy as np
 import math
-
+import functools
+
+from borders import PADDING_MODES
+import convolution
+import memoryPlanner
+from filterRegistry import FilterRegistry, FilterSpec
+from instrumentation import profiledFilter
+from pipeline import FilterStage
 from iFrequencyFilters import IFrequencyFilters
 from iSpatialFilters import ISpatialFilters
 
@@ -10,13 +17,19 @@ class LinearFilters(IFrequencyFilters, ISpatialFilters):
     Class for applying linear filters to an image
     """
 
+    # The filters the class can apply
+    registry = FilterRegistry()
+
+    @profiledFilter
     def applyFilter(self, image, filter_name, kernel_size, **kwargs):
         """
         Applies a linear filter to an image
 
-        :param image: The image to be filtered
+        :param image: The image to be filtered, either (height, width) or
+            (height, width, channels). Every channel is filtered at once.
         :param filter_name: The name of the filter. Possible values are
             - 'gaussian',
+            - 'recursive_gaussian',
             - 'box',
             - 'butterworth_low_pass',
             - 'low_pass'
@@ -29,96 +42,290 @@ class LinearFilters(IFrequencyFilters, ISpatialFilters):
                        'butterworth_low_pass' and 'contra_harmonic_mean'
             - 'cutoff': The cutoff frequency. Required for
                        'butterworth_low_pass' and 'low_pass'
+            - 'passes': The number of times to apply 'box'. Three passes
+                       are a cheap approximation of a Gaussian filter.
+                       Defaults to 1.
+            - 'sigma': The standard deviation of 'recursive_gaussian'. If
+                       not given, it is derived from the kernel size in the
+                       same way as for 'gaussian'.
+            - 'domain': The domain 'butterworth_low_pass' and 'low_pass'
+                       are built in. Possible values are:
+                - 'spatial': A (kernel_size x kernel_size) kernel is built
+                             and convolved with the image. The default.
+                - 'frequency': The transfer function is built on the
+                             frequency grid of the image and multiplied with
+                             its Fourier transform. The kernel size is
+                             ignored and the cutoff is a frequency in
+                             percent of the Nyquist frequency of half a
+                             cycle per pixel, the same along both axes
+                             whatever the size of the image.
             - 'padding': The type of padding to use. Possible values are:
                 - 'constant'
                 - 'edge'
                 - 'linear_ramp'
+                - 'reflect'
+                - 'wrap'
+            - 'dtype': The floating point type to compute in, either
+                       np.float32 or np.float64. float32 keeps the padding,
+                       kernels, spectra and output in single precision.
+                       Defaults to float64 kernels and outputs.
+            - 'workspace': A Workspace to borrow the padded image, spectra
+                       and intermediate images from instead of allocating
+                       them on every call
+            - 'out': The array to write the filtered image into
+            - 'mask': A boolean mask of the pixels to filter. Only the
+                       tiles of the image that contain the mask are
+                       filtered, with their halo. Filters that cannot be
+                       tiled filter the whole image and keep the masked
+                       pixels.
+            - 'boxes': A list of (top, left, bottom, right) boxes of
+                       pixels to filter, instead of a mask
+            - 'fill': The value of the pixels that are not filtered. If
+                       None, they keep their value in the image.
+            - 'tile_size': The size of the tiles a mask is divided into.
+                       Defaults to 64.
+            - 'tolerance': The root mean square error allowed for
+                       approximating the filter with a smaller kernel on a
+                       downsampled level of an image pyramid. If None, the
+                       filter is exact.
+            - 'memory_budget': The most memory the filter may hold at
+                       once, in bytes. If the whole image would need more,
+                       it is filtered in the largest tiles that fit. The
+                       recursive Gaussian, the contra-harmonic mean and the
+                       frequency domain low pass filters cannot be tiled,
+                       so they raise a ValueError instead. If None, the
+                       memory is not planned.
+
+        :return: The filtered image
+        """
+
+        # Get the padding type. None means that the image already includes
+        # the padding the filter needs, so only the valid region is returned.
+        padding = kwargs.pop('padding', 'constant')
+
+        # Check for errors in the parameters
+        self.checkErrors(kernel_size, padding, **kwargs)
+
+        # Get the floating point type to compute in
+        dtype = kwargs.pop('dtype', None)
+
+        # Get the workspace to borrow buffers from and the array to write the
+        # filtered image into
+        workspace = kwargs.pop('workspace', None)
+        out = kwargs.pop('out', None)
+
+        # Look the filter up in the registry and apply it. Some filters have
+        # kernels and are applied using the frequency domain algorithm. Other
+        # filters reduce each region of interest and are applied using the
+        # spatial domain algorithm. Every filter is declared at the bottom of
+        # this file.
+        return self.registry.applyFilter(
+            self, image, filter_name, kernel_size, padding, dtype, workspace,
+            out, **kwargs)
+
+    def applyRecursiveGaussian(
+            self,
+            image,
+            kernel_size,
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None,
+            sigma=None):
+        """
+        Applies the recursive Gaussian filter along the rows and columns of an
+        image. The cost does not depend on the standard deviation.
+
+        :param image: The image to be filtered
+        :param kernel_size: The size of the kernel
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param workspace: Unused, as the filter needs no reusable buffers
+        :param out: The array to write the filtered image into
+        :param sigma: The standard deviation. If None, it is derived from the
+            kernel size.
+
+        :return: The filtered image
+        """
+        halo = self.getHalo('recursive_gaussian', kernel_size, sigma=sigma)
+        sigma = self.getRecursiveGaussianSigma(kernel_size, sigma=sigma)
+        gain, feedback = self.getRecursiveGaussianCoefficients(sigma)
+        return self.calculateRecursiveFilter(
+            image, gain, feedback, halo, padding, dtype, out)
+
+    def applyIteratedBox(
+            self,
+            image,
+            kernel_size,
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None,
+            passes=1):
+        """
+        Applies the box filter to an image one or more times using running
+        sums, which cost the same for any kernel size
+
+        :param image: The image to be filtered
+        :param kernel_size: The size of the kernel
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param workspace: Unused, as the filter needs no reusable buffers
+        :param out: The array to write the filtered image into
+        :param passes: The number of times to apply the filter. Three passes
+            approximate a Gaussian filter.
+
+        :return: The filtered image
+        """
+        # Only the last pass writes into the output
+        for box_pass in range(passes):
+            image = self.calculateBoxFilter(
+                image, kernel_size, padding, dtype,
+                out if box_pass == passes - 1 else None)
+        return image
+
+    def applyButterworthLowPass(
+            self,
+            image,
+            kernel_size,
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None,
+            cutoff=50.0,
+            order=2,
+            domain='spatial'):
+        """
+        Applies the Butterworth low pass filter to an image
+
+        :param image: The image to be filtered
+        :param kernel_size: The size of the kernel
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow buffers from
+        :param out: The array to write the filtered image into
+        :param cutoff: The cutoff frequency. In the spatial domain it is the
+            distance in pixels at which the kernel falls to half, and in the
+            frequency domain it is in percent of the Nyquist frequency.
+        :param order: The order of the filter
+        :param domain: The domain the filter is built in, either 'spatial'
+            or 'frequency'
+
+        :return: The filtered image
+        """
+        # Build the transfer function on the frequency grid of the image if
+        # requested, so that the cost does not depend on the kernel size.
+        if domain == 'frequency':
+            getTransferFunction = functools.partial(
+                self.getTransferFunction,
+                'butterworth_low_pass',
+                cutoff=cutoff,
+                order=order)
+            return self.calculateTransferFunctionFilter(
+                image, getTransferFunction, padding, dtype, out)
+
+        # Get the Butterworth low pass filter of the specified size and apply
+        # it using the frequency domain algorithm.
+        kernel, = self.getLinearKernels(
+            'butterworth_low_pass', kernel_size, cutoff=cutoff, order=order)
+        return self.calculateFrequencyDomainConvolution(
+            image, kernel, padding, dtype, workspace, out)
+
+    def applyLowPass(
+            self,
+            image,
+            kernel_size,
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None,
+            cutoff=50.0,
+            domain='spatial'):
+        """
+        Applies the ideal low pass filter to an image
+
+        :param image: The image to be filtered
+        :param kernel_size: The size of the kernel
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow buffers from
+        :param out: The array to write the filtered image into
+        :param cutoff: The cutoff frequency. In the spatial domain it is the
+            distance in pixels the kernel reaches, and in the frequency
+            domain it is in percent of the Nyquist frequency.
+        :param domain: The domain the filter is built in, either 'spatial'
+            or 'frequency'
 
         :return: The filtered image
         """
+        # Build the ideal low pass mask on the frequency grid of the image if
+        # requested.
+        if domain == 'frequency':
+            getTransferFunction = functools.partial(
+                self.getTransferFunction, 'low_pass', cutoff=cutoff)
+            return self.calculateTransferFunctionFilter(
+                image, getTransferFunction, padding, dtype, out)
+
+        # Get the low pass filter of the specified size and apply it using
+        # the frequency domain algorithm.
+        kernel, = self.getLinearKernels(
+            'low_pass', kernel_size, cutoff=cutoff)
+        return self.calculateFrequencyDomainConvolution(
+            image, kernel, padding, dtype, workspace, out)
+
+    def applyContraHarmonicMean(
+            self,
+            image,
+            kernel_size,
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None,
+            order=2):
+        """
+        Applies the contra-harmonic mean filter to an image twice, once with
+        the order and once with the negative order to combat both pepper and
+        salt noise
+
+        :param image: The image to be filtered
+        :param kernel_size: The size of the kernel
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow buffers from
+        :param out: The array to write the filtered image into
+        :param order: The order of the filter
 
-        # Check for errors in the parameters.
-        self.checkErrors(kernel_size, 'constant', **kwargs)
-
-        # Get the padding type to be used for the convolution
-        padding = kwargs.get('padding', 'constant')
-
-        # Some filters have kernels and can be applied using the frequency
-        # domain algorithm. Other filters do not have kernels and can only be
-        # applied using the spatial domain algorithm. Check if the filter has a
-        # kernel and if so, apply it using the frequency domain algorithm.
-        # Otherwise, apply it using the spatial domain algorithm.
-        if filter_name == 'gaussian':
-            # Get the Gaussian kernel of the specified size and apply it using
-            # the frequency domain algorithm.
-            kernel = self.getGaussianKernel(kernel_size)
-            return self.calculateFrequencyDomainConvolution(
-                image, kernel, padding)
-        elif filter_name == 'box':
-            # Get the box kernel of the specified size and apply it using the
-            # frequency domain algorithm.
-            kernel = self.getBoxKernel(kernel_size)
-            return self.calculateFrequencyDomainConvolution(
-                image, kernel, padding)
-        elif filter_name == 'butterworth_low_pass':
-            # Get the order and cutoff frequency from the kwargs to be used in
-            # the Butterworth low pass filter.
-            order = kwargs.get('order', 2)
-            cutoff = kwargs.get('cutoff', 50.0)
-            # Get the Butterworth low pass filter of the specified size and
-            # apply it using the frequency domain algorithm.
-            kernel = self.getButterworthLowPassFilter(
-                kernel_size, cutoff, order)
-            return self.calculateFrequencyDomainConvolution(
-                image, kernel, padding)
-        elif filter_name == 'low_pass':
-            # Get the cutoff frequency from the kwargs to be used in the low
-            # pass filter.
-            cutoff = kwargs.get('cutoff', 50.0)
-            # Get the low pass filter of the specified size and apply it using
-            # the frequency domain algorithm.
-            kernel = self.getLowPassFilter(kernel_size, cutoff)
-            return self.calculateFrequencyDomainConvolution(
-                image, kernel, padding)
-        elif filter_name == 'geometric_mean':
-            # Get the filter function to be applied. The filter function is the
-            # algorithm to be applied to the region of interest (ROI).
-            def filter_function(roi): return self.applyGeometricMeanFilter(roi)
-            return self.calculateSpatialDomainConvolution(
-                image, kernel_size, filter_function, padding)
-        elif filter_name == 'harmonic_mean':
-            # Get the filter function to be applied. The filter function is the
-            # algorithm to be applied to the region of interest (ROI).
-            def filter_function(roi): return self.applyHarmonicMeanFilter(roi)
-            return self.calculateSpatialDomainConvolution(
-                image, kernel_size, filter_function, padding)
-        elif filter_name == 'contra_harmonic_mean':
-            # Get the order from the kwargs to be used in the contra-harmonic
-            # mean filter.
-            order = kwargs.get('order', 2)
-            # Get the filter function to be applied. The filter function is the
-            # algorithm to be applied to the region of interest (ROI). The
-            # filter function is applied twice, once with the order and once
-            # with the negative order to combat both pepper and salt noise.
-
-            def filter_function(
-                roi): return self.applyContraHarmonicMeanFilter(roi, order)
-            filtered_image = self.calculateSpatialDomainConvolution(
-                image, kernel_size, filter_function, padding)
-            def filter_function(
-                roi): return self.applyContraHarmonicMeanFilter(roi, -order)
-            return self.calculateSpatialDomainConvolution(
-                filtered_image, kernel_size, filter_function, padding)
-        else:
-            # If the filter name is not recognized, raise an error.
-            raise Exception('Invalid filter name.')
+        :return: The filtered image
+        """
+        # The result of the first pass is kept in the workspace if one is
+        # given.
+        filtered_image = None
+        if workspace is not None:
+            filtered_image = workspace.getBuffer(
+                'contra_harmonic_mean',
+                convolution.getConvolvedShape(
+                    image.shape, kernel_size, padding),
+                image.dtype if dtype is None else dtype)
+
+        filtered_image = self.calculateSpatialDomainConvolution(
+            image, kernel_size,
+            functools.partial(self.applyContraHarmonicMeanFilter, order=order),
+            padding, dtype, workspace, filtered_image)
+        return self.calculateSpatialDomainConvolution(
+            filtered_image, kernel_size,
+            functools.partial(
+                self.applyContraHarmonicMeanFilter, order=-order),
+            padding, dtype, workspace, out)
 
     def calculateSpatialDomainConvolution(
             self,
             image,
             kernel_size,
             filter_function,
-            padding='constant'):
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None):
         """
         Performs a convolution on an image using a kernel using the spatial
         domain algorithm.
@@ -127,36 +334,24 @@ class LinearFilters(IFrequencyFilters, ISpatialFilters):
         :param kernel_size: The size of the kernel
         :param filter_function: The filter function to be applied
         :param padding: The type of padding to use. Possible values:
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow buffers from
+        :param out: The array to write the convolved image into
 
         :return: The convolved image
         """
-
-        # Get the height and width of the image
-        height, width = image.shape
-
-        # Calculate how much the image needs to be padded
-        padding_size = int((kernel_size - 1) / 2)
-
-        # Create a padded image with zeros
-        padded_image = np.pad(image, padding_size, mode=padding)
-
-        # Create an empty output image
-        convolved_image = np.zeros_like(image)
-
-        # Iterate over each pixel in the image
-        for i in range(height):
-            for j in range(width):
-                # Get the region of interest (ROI) from the padded image
-                roi = padded_image[i:i + kernel_size, j:j + kernel_size]
-
-                # Apply the desired kernel type
-                convolved_value = filter_function(roi)
-                convolved_image[i, j] = convolved_value
-
-        return convolved_image
+        return convolution.calculateSpatialDomainConvolution(
+            image, kernel_size, filter_function, padding, dtype, workspace,
+            out)
 
     def calculateFrequencyDomainConvolution(
-            self, image, kernel, padding='constant'):
+            self,
+            image,
+            kernel,
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None):
         """
         Performs a convolution on an image using a kernel using the Fast Fourier
         Transform algorithm.
@@ -164,50 +359,85 @@ class LinearFilters(IFrequencyFilters, ISpatialFilters):
         :param image: The image to be convolved
         :param kernel: The kernel to convolve the image with
         :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow buffers from
+        :param out: The array to write the convolved image into
 
         :return: The convolved image
         """
+        return convolution.calculateFrequencyDomainConvolution(
+            image, kernel, padding, dtype, workspace, out)
 
-        # Creates tuple for size of padded image and kernel
-        new_size = (
-            image.shape[0] +
-            kernel.shape[0] -
-            1,
-            image.shape[1] +
-            kernel.shape[1] -
-            1)
-        convolved_image = np.zeros(shape=new_size, dtype=image.dtype)
+    def calculateTransferFunctionFilter(
+            self,
+            image,
+            getTransferFunction,
+            padding='constant',
+            dtype=None,
+            out=None):
+        """
+        Filters an image by multiplying its Fourier transform by a transfer
+        function.
 
-        # Calculates half the size of the image and kernel respectfully in both
-        # dimensions
-        half_image = ((image.shape[0] - 1) / 2, (image.shape[1] - 1) / 2)
-        half_kernal = ((kernel.shape[0] - 1) / 2, (kernel.shape[1] - 1) / 2)
+        :param image: The image to be filtered
+        :param getTransferFunction: A function that returns the transfer
+            function for the shape of the padded image and a floating point
+            type
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param out: The array to write the filtered image into
 
-        # Pads the image with duplicate values and the kernel with 0s
-        pad_image = np.pad(image, pad_width=(
-            (math.floor(half_kernal[0]), math.ceil(half_kernal[0])),
-            (math.floor(half_kernal[1]), math.ceil(half_kernal[1]))
-        ), mode=padding)
+        :return: The filtered image
+        """
+        return convolution.calculateTransferFunctionFilter(
+            image, getTransferFunction, padding, dtype, out)
 
-        pad_kernel = np.zeros(shape=new_size)
-        pad_kernel[0: kernel.shape[0], 0: kernel.shape[1]] = kernel
+    def calculateRecursiveFilter(
+            self,
+            image,
+            gain,
+            feedback,
+            halo,
+            padding='constant',
+            dtype=None,
+            out=None):
+        """
+        Filters an image with a separable recursive filter run forwards and
+        backwards along the rows and columns.
 
-        # Calculates the Fourier transforms for the image and kernel
-        fft_image = np.fft.fft2(pad_image)
-        fft_kernel = np.fft.fft2(pad_kernel)
+        :param image: The image to be filtered
+        :param gain: The gain applied to the input of each step
+        :param feedback: The weights of the previous outputs, nearest first
+        :param halo: The number of pixels to pad each edge of the image with
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param out: The array to write the filtered image into
 
-        # Performs the convolutions, inverses the fourier transforms and
-        # extracts the real part of each element
-        convolved_image = np.real(np.fft.ifft2(fft_image * fft_kernel))
+        :return: The filtered image
+        """
+        return convolution.calculateRecursiveFilter(
+            image, gain, feedback, halo, padding, dtype, out)
 
-        # Function to calculate the padding of the convoluted image
-        def bounds(axis): return kernel.shape[axis] - 1
+    def calculateBoxFilter(
+            self,
+            image,
+            kernel_size,
+            padding='constant',
+            dtype=None,
+            out=None):
+        """
+        Averages every region of an image using running sums.
 
-        # Removes the padding from the convoluted image
-        convolved_image = convolved_image[bounds(
-            0): new_size[0], bounds(1): new_size[1]]
+        :param image: The image to be filtered
+        :param kernel_size: The size of the kernel
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        :param out: The array to write the filtered image into
 
-        return convolved_image
+        :return: The filtered image
+        """
+        return convolution.calculateBoxFilter(
+            image, kernel_size, padding, dtype, out)
 
     def getGaussianKernel(self, size):
         """
@@ -241,6 +471,77 @@ class LinearFilters(IFrequencyFilters, ISpatialFilters):
         kernel /= np.sum(kernel)
         return kernel
 
+    def getRecursiveGaussianSigma(self, kernel_size, **kwargs):
+        """
+        Gets the standard deviation of the recursive Gaussian filter, either
+        given explicitly or derived from the kernel size
+
+        :param kernel_size: The size of the kernel
+        :param kwargs: The arguments for the filter
+
+        :return: The standard deviation
+        """
+        if kwargs.get('sigma') is not None:
+            return kwargs['sigma']
+        # Use the same standard deviation as getGaussianKernel
+        return (kernel_size - 1) / 6
+
+    def getRecursiveGaussianCoefficients(self, sigma):
+        """
+        Calculates the coefficients of the third order recursive Gaussian
+        filter of Young and van Vliet (1995). Run forwards and then backwards,
+        the filter approximates a Gaussian of standard deviation sigma.
+
+        The parameter q of the filter is solved for so that the variance of
+        its impulse response is exactly sigma ^ 2, as the closed form fit in
+        the paper gives a response about 10% wider than sigma. Compared with
+        the 'gaussian' filter of the same kernel size on the test images, for
+        intensities in [0, 1]:
+            - foetus: a largest absolute error of about 3e-2 and an RMS error
+              of 1e-3 to 3e-3 for kernel sizes 3 to 63
+            - NZjers1: the speckle makes the difference in shape between the
+              responses show more, with a largest absolute error of about
+              1e-1 and an RMS error of about 1.5e-2 for kernel sizes 3 to 7,
+              falling to 3e-2 and 6e-3 from kernel size 15
+        A kernel size of 3 gives a standard deviation of 1/3 pixel, which the
+        sampled FIR kernel cannot represent, so the two differ the most there.
+
+        :param sigma: The standard deviation
+
+        :return: The gain applied to each input and the weights of the three
+            previous outputs
+        """
+        def getCoefficients(q):
+            # Calculate the coefficients of the filter from its parameter
+            b0 = 1.57825 + 2.44413 * q + 1.4281 * q ** 2 + 0.422205 * q ** 3
+            b1 = 2.44413 * q + 2.85619 * q ** 2 + 1.26661 * q ** 3
+            b2 = -(1.4281 * q ** 2 + 1.26661 * q ** 3)
+            b3 = 0.422205 * q ** 3
+
+            # Normalise the coefficients so that the filter has a gain of 1
+            gain = 1 - (b1 + b2 + b3) / b0
+            return gain, (b1 / b0, b2 / b0, b3 / b0)
+
+        def getVariance(gain, feedback):
+            # The variance of the impulse response of one pass is the second
+            # cumulant of gain / (1 - sum(feedback[k] * z ^ -(k + 1))). The
+            # forward and backward passes add their variances.
+            first_moment = sum(
+                k * weight for k, weight in enumerate(feedback, 1))
+            second_moment = sum(
+                k ** 2 * weight for k, weight in enumerate(feedback, 1))
+            return 2 * (second_moment / gain + (first_moment / gain) ** 2)
+
+        # The variance grows with q, so find q by bisection
+        low, high = 0.0, 2 * sigma + 1
+        for _ in range(64):
+            q = (low + high) / 2
+            if getVariance(*getCoefficients(q)) < sigma ** 2:
+                low = q
+            else:
+                high = q
+        return getCoefficients(q)
+
     def getBoxKernel(self, size):
         """
         Creates a box kernel of size (size x size)
@@ -312,18 +613,115 @@ class LinearFilters(IFrequencyFilters, ISpatialFilters):
         kernel = np.outer(low_pass_filter, low_pass_filter)
         return kernel
 
+    # The transfer functions built so far, keyed by the filter name, the shape
+    # of the padded image, the floating point type, the cutoff and the order
+    transfer_functions = {}
+    max_transfer_functions = 32
+
+    def getTransferFunction(
+            self, filter_name, shape, dtype, cutoff, order=None):
+        """
+        Gets the transfer function of a frequency domain filter for the
+        spectrum of an image, building it the first time it is requested
+
+        :param filter_name: The name of the filter, either
+            'butterworth_low_pass' or 'low_pass'
+        :param shape: The shape of the image
+        :param dtype: The floating point type of the transfer function
+        :param cutoff: The cutoff frequency
+        :param order: The order of the filter. Only used by
+            'butterworth_low_pass'
+
+        :return: The transfer function on the grid of np.fft.rfft2 of an image
+            of the given shape
+        """
+        key = (filter_name, tuple(shape), np.dtype(dtype), cutoff, order)
+        transfer_function = self.transfer_functions.get(key)
+        if transfer_function is None:
+            # Discard the oldest transfer function to keep the cache bounded
+            if len(self.transfer_functions) >= self.max_transfer_functions:
+                oldest_key = next(iter(self.transfer_functions))
+                del self.transfer_functions[oldest_key]
+
+            if filter_name == 'butterworth_low_pass':
+                transfer_function = self.getButterworthTransferFunction(
+                    shape, cutoff, order)
+            else:
+                transfer_function = self.getLowPassTransferFunction(
+                    shape, cutoff)
+
+            # The transfer function is shared by every call, so it must not
+            # be changed
+            transfer_function = transfer_function.astype(dtype, copy=False)
+            transfer_function.flags.writeable = False
+            self.transfer_functions[key] = transfer_function
+        return transfer_function
+
+    def getFrequencyDistances(self, shape):
+        """
+        Calculates the distance of every frequency in the spectrum of an image
+        from the zero frequency, in percent of the Nyquist frequency of half a
+        cycle per pixel
+
+        :param shape: The shape of the image
+
+        :return: The distances on the grid of np.fft.rfft2 of an image of the
+            given shape
+        """
+        # The frequencies along each axis, in cycles per pixel, so that a
+        # distance means the same along both axes whatever the padded shape.
+        # Only the non-negative frequencies of the last axis are in the
+        # spectrum of a real image.
+        rows = np.fft.fftfreq(shape[0])
+        columns = np.fft.rfftfreq(shape[1])
+        # Half a cycle per pixel is 100 percent
+        return np.sqrt(np.add.outer(rows ** 2, columns ** 2)) * 200
+
+    def getButterworthTransferFunction(self, shape, cutoff, order):
+        """
+        Creates the transfer function of a Butterworth low pass filter,
+        H = 1 / (1 + (D / cutoff) ^ (2 * order)), for the spectrum of an image
+
+        :param shape: The shape of the image
+        :param cutoff: The cutoff frequency, in percent of the Nyquist
+            frequency
+        :param order: The order of the filter
+
+        :return: The transfer function
+        """
+        distances = self.getFrequencyDistances(shape)
+        return 1 / (1 + (distances / cutoff) ** (2 * order))
+
+    def getLowPassTransferFunction(self, shape, cutoff):
+        """
+        Creates the transfer function of an ideal low pass filter, which keeps
+        every frequency within the cutoff and removes the rest, for the
+        spectrum of an image
+
+        :param shape: The shape of the image
+        :param cutoff: The cutoff frequency, in percent of the Nyquist
+            frequency
+
+        :return: The transfer function
+        """
+        distances = self.getFrequencyDistances(shape)
+        return np.where(distances <= cutoff, 1.0, 0.0)
+
     def applyGeometricMeanFilter(self, image_section):
         """
         Performs geometic mean filtering on an image section.
 
-        :param image_section: The image section to be filtered
+        :param image_section: The image section to be filtered. Sections are
+            reduced over the last two axes, so a stack of sections can be
+            filtered at once.
 
         :return: The filtered image section
         """
         # Calculate the geometric median by taking the product of the image
         # section and taking the nth root of the product.
-        product = np.product(image_section)
-        geometric_median = product ** (1 / image_section.size)
+        product = np.prod(image_section, axis=(-2, -1))
+        size = image_section.shape[-2] * image_section.shape[-1]
+        geometric_median = product ** (1 / size)
 
         return geometric_median
 
@@ -331,7 +729,9 @@ class LinearFilters(IFrequencyFilters, ISpatialFilters):
         """
         Performs harmonic mean filtering on an image section.
 
-        :param image_section: The image section to be filtered
+        :param image_section: The image section to be filtered. Sections are
+            reduced over the last two axes, so a stack of sections can be
+            filtered at once.
 
         :return: The filtered image section
         """
@@ -343,22 +743,25 @@ class LinearFilters(IFrequencyFilters, ISpatialFilters):
             where=image_section != 0)
 
         # Sum of the reciprocal.
-        reciprocal_sum = np.sum(reciprocal)
-
-        # Return 0 if the sum of the reciprocal is 0.
-        if reciprocal_sum == 0:
-            return 0
+        reciprocal_sum = np.sum(reciprocal, axis=(-2, -1))
 
         # Harmonic mean is the size of the image section divided by the sum of
-        # the reciprocal.
-        harmonic_mean = image_section.size / np.sum(reciprocal)
+        # the reciprocal. Return 0 if the sum of the reciprocal is 0.
+        size = image_section.shape[-2] * image_section.shape[-1]
+        harmonic_mean = np.divide(
+            size,
+            reciprocal_sum,
+            out=np.zeros_like(reciprocal_sum),
+            where=reciprocal_sum != 0)
         return harmonic_mean
 
     def applyContraHarmonicMeanFilter(self, image_section, order):
         """
         Performs contra-harmonic mean filtering on an image section.
 
-        :param image_section: The image section to be filtered
+        :param image_section: The image section to be filtered. Sections are
+            reduced over the last two axes, so a stack of sections can be
+            filtered at once.
         :param order: The order of the filter
 
         :return: The filtered image section
@@ -376,7 +779,7 @@ class LinearFilters(IFrequencyFilters, ISpatialFilters):
             order + 1,
             out=np.zeros_like(image_section),
             where=image_section != 0.0)
-        numerator = np.sum(power, initial=0)
+        numerator = np.sum(power, axis=(-2, -1), initial=0)
 
         # Calculate the denominator by taking the sum of the image section to
         # the power of the order. If the image section is 0, return 0 for that
@@ -388,17 +791,106 @@ class LinearFilters(IFrequencyFilters, ISpatialFilters):
             order,
             out=np.zeros_like(image_section),
             where=image_section != 0.0)
-        denominator = np.sum(power, initial=0)
-
-        # Return 0 if the denominator is 0.
-        if denominator == 0:
-            return 0
+        denominator = np.sum(power, axis=(-2, -1), initial=0)
 
         # Contra-harmonic mean is the numerator divided by the denominator.
-        contra_harmonic_mean = numerator / denominator
+        # Return 0 if the denominator is 0.
+        contra_harmonic_mean = np.divide(
+            numerator,
+            denominator,
+            out=np.zeros_like(denominator),
+            where=denominator != 0)
 
         return contra_harmonic_mean
 
+    def stage(self, filter_name, kernel_size, **kwargs):
+        """
+        Creates a pipeline stage that applies a filter. Stages are chained
+        with the | operator, e.g. LF.stage('gaussian', 5) | ED.stage('magnitude')
+
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param kwargs: The arguments for the filter
+
+        :return: The pipeline stage
+        """
+        return FilterStage(self, filter_name, kernel_size, **kwargs)
+
+    def getLinearKernels(self, filter_name, kernel_size, **kwargs):
+        """
+        Gets the kernel a filter convolves the image with, so that it can be
+        composed with the kernels of neighbouring filters in a pipeline.
+        Kernels are built once and cached by the registry.
+
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param kwargs: The arguments for the filter
+
+        :return: A list containing the kernel, or None if the filter is not a
+            single convolution
+        """
+        return self.registry.getKernels(
+            self, filter_name, kernel_size, **kwargs)
+
+    def estimatePeakMemory(
+            self, shape, image_dtype, filter_name, kernel_size, method=None,
+            **kwargs):
+        """
+        Estimates the most memory applying a filter to an image holds at
+        once, without a workspace or an output array
+
+        :param shape: The shape of the image
+        :param image_dtype: The type of the image
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param method: The method to apply the filter with, one of
+            'apply', 'histogram', 'spatial' or 'frequency'. If None, the
+            method applyFilter would use.
+        :param kwargs: The arguments for the filter, including 'padding',
+            'dtype' and 'histogram' as for applyFilter
+
+        :return: The peak bytes
+        """
+        return self.registry.estimatePeakMemory(
+            self, shape, image_dtype, filter_name, kernel_size, method,
+            **kwargs)
+
+    def getTileSize(
+            self, shape, image_dtype, filter_name, kernel_size, budget,
+            method=None, **kwargs):
+        """
+        Gets the largest square tile that a filter can be applied to an image
+        in one tile at a time within a memory budget
+
+        :param shape: The shape of the image
+        :param image_dtype: The type of the image
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param budget: The most memory the filter may hold at once, in bytes
+        :param method: The method to apply the filter with. If None, the
+            method applyFilter would use.
+        :param kwargs: The arguments for the filter, including 'dtype' and
+            'histogram' as for applyFilter
+
+        :return: The size of the tiles
+        """
+        return self.registry.getTileSize(
+            self, shape, image_dtype, filter_name, kernel_size, budget,
+            method, **kwargs)
+
+    def getHalo(self, filter_name, kernel_size, **kwargs):
+        """
+        Gets the number of pixels a filter reads beyond each edge of an output
+        pixel
+
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param kwargs: The arguments for the filter
+
+        :return: The halo of the filter
+        """
+        return self.registry.getHalo(self, filter_name, kernel_size, **kwargs)
+
     def checkErrors(self, kernel_size, padding, **kwargs):
         """
         Checks for errors in the LinearFilters class
@@ -413,8 +905,16 @@ class LinearFilters(IFrequencyFilters, ISpatialFilters):
 
         :raises ValueError: If the kernel size is even
         :raises ValueError: If the padding type is invalid
+        :raises ValueError: If the dtype is not float32 or float64
         :raises ValueError: If the kernel size is less than 1
         :raises ValueError: If the cutoff frequency is less than 0
+        :raises TypeError: If the number of passes is not an integer
+        :raises ValueError: If the number of passes is less than 1
+        :raises TypeError: If the standard deviation is not a number
+        :raises ValueError: If the standard deviation is not greater than 0
+        :raises ValueError: If the domain is invalid
+        :raises ValueError: If the cutoff frequency is 0 in the frequency
+            domain
         """
 
         # Check of errors related to the kernel size.
@@ -451,12 +951,169 @@ class LinearFilters(IFrequencyFilters, ISpatialFilters):
             elif cutoff is not None:
                 raise TypeError('Cutoff frequency must be a float.')
 
+        # Check for errors related to the number of passes.
+        if kwargs.get('passes') is not None:
+            passes = kwargs['passes']
+            # Check that the number of passes is an integer
+            if not isinstance(passes, int):
+                raise TypeError('Passes must be an integer.')
+            # Check that the number of passes is at least 1
+            if passes < 1:
+                raise ValueError('Passes must be greater than 0.')
+
+        # Check for errors related to the standard deviation.
+        if kwargs.get('sigma') is not None:
+            sigma = kwargs['sigma']
+            # Check that the standard deviation is a number
+            if not isinstance(sigma, (int, float)):
+                raise TypeError('Sigma must be a number.')
+            # Check that the standard deviation is greater than 0
+            if sigma <= 0:
+                raise ValueError('Sigma must be greater than 0.')
+
+        # Check for errors related to the domain.
+        if kwargs.get('domain') is not None:
+            if kwargs['domain'] not in ['spatial', 'frequency']:
+                raise ValueError('Domain must be spatial or frequency.')
+            # The Butterworth transfer function divides by the cutoff
+            if kwargs['domain'] == 'frequency' and kwargs.get('cutoff') == 0:
+                raise ValueError(
+                    'Cutoff frequency must be greater than 0 in the '
+                    'frequency domain.')
+
+        # Check for errors related to the floating point type.
+        if kwargs.get('dtype') is not None:
+            # Check that the type is a supported floating point type
+            if np.dtype(kwargs['dtype']) not in (np.float32, np.float64):
+                raise ValueError('dtype must be float32 or float64.')
+
         # Check for errors related to the padding type.
-        if padding not in ['constant', 'edge', 'linear_ramp']:
+        if padding is not None and padding not in PADDING_MODES:
             raise ValueError('''
             Invalid padding type. Possible values are:
-            constant, edge, linear_ramp.
+            constant, edge, linear_ramp, reflect, wrap.
             ''')
 
 
+# Declare every linear filter. Filters from elsewhere are registered in the
+# same way, using LinearFilters.registry.register.
+def getLowPassMemory(
+        F, shape, image_dtype, kernel_size, padding, dtype, domain,
+        **parameters):
+    """
+    Estimates the peak memory of a low pass filter, which either multiplies
+    the spectrum of the image by a transfer function or convolves the image
+    with a kernel
+
+    :param F: The class that applies the filter
+    :param shape: The shape of the image
+    :param image_dtype: The type of the image
+    :param kernel_size: The size of the kernel
+    :param padding: The type of padding to use
+    :param dtype: The floating point type to compute in
+    :param domain: The domain the filter is built in
+    :param parameters: Unused parameters of the filter
+
+    :return: The peak bytes and the type of the filtered image
+    """
+    if domain == 'frequency':
+        return memoryPlanner.getTransferMemory(
+            shape, image_dtype, padding, dtype)
+    return memoryPlanner.getFrequencyMemory(
+        shape, image_dtype, (kernel_size, kernel_size), padding, dtype)
+
+
+LinearFilters.registry.register(FilterSpec(
+    'gaussian',
+    kernels=lambda F, kernel_size: [F.getGaussianKernel(kernel_size)]))
+LinearFilters.registry.register(FilterSpec(
+    'recursive_gaussian',
+    apply=LinearFilters.applyRecursiveGaussian,
+    parameters={'sigma': None},
+    # The filter reads 3 standard deviations beyond each edge when its
+    # standard deviation is given
+    halo=lambda F, kernel_size, sigma: (kernel_size - 1) // 2
+    if sigma is None else math.ceil(3 * sigma),
+    memory=lambda F, shape, image_dtype, kernel_size, padding, dtype, sigma:
+        memoryPlanner.getRecursiveMemory(
+            shape, image_dtype,
+            F.getHalo('recursive_gaussian', kernel_size, sigma=sigma),
+            padding, dtype),
+    # The recursive filter costs the same whatever the kernel size
+    approximate=False,
+    # The recursion is truncated at the halo of a tile, but not of the image
+    tileable=False))
+LinearFilters.registry.register(FilterSpec(
+    'box',
+    apply=LinearFilters.applyIteratedBox,
+    # Each pass of the box filter convolves the image with the kernel
+    kernels=lambda F, kernel_size, passes: [functools.reduce(
+        convolution.composeKernels,
+        [F.getBoxKernel(kernel_size)] * passes)],
+    parameters={'passes': 1},
+    # The box filter reads its halo again on every pass
+    halo=lambda F, kernel_size, passes: passes * ((kernel_size - 1) // 2),
+    memory=lambda F, shape, image_dtype, kernel_size, padding, dtype, passes:
+        memoryPlanner.getBoxMemory(
+            shape, image_dtype, kernel_size, padding, dtype, passes),
+    # The running sums of the box filter cost the same whatever the kernel
+    # size
+    approximate=False))
+LinearFilters.registry.register(FilterSpec(
+    'butterworth_low_pass',
+    apply=LinearFilters.applyButterworthLowPass,
+    # Frequency domain filters have no kernel and pad the image themselves
+    kernels=lambda F, kernel_size, cutoff, order, domain: None
+    if domain == 'frequency'
+    else [F.getButterworthLowPassFilter(kernel_size, cutoff, order)],
+    parameters={'cutoff': 50.0, 'order': 2, 'domain': 'spatial'},
+    halo=lambda F, kernel_size, domain, **parameters: 0
+    if domain == 'frequency' else (kernel_size - 1) // 2,
+    memory=getLowPassMemory,
+    # The transfer function of the frequency domain depends on the size of
+    # the whole image
+    tileable=lambda F, kernel_size, domain, **parameters:
+        domain != 'frequency',
+    # The frequency domain ignores the kernel size, so it costs the same on
+    # a pyramid level
+    approximate=lambda F, kernel_size, domain, **parameters:
+        domain != 'frequency'))
+LinearFilters.registry.register(FilterSpec(
+    'low_pass',
+    apply=LinearFilters.applyLowPass,
+    kernels=lambda F, kernel_size, cutoff, domain: None
+    if domain == 'frequency'
+    else [F.getLowPassFilter(kernel_size, cutoff)],
+    parameters={'cutoff': 50.0, 'domain': 'spatial'},
+    halo=lambda F, kernel_size, domain, **parameters: 0
+    if domain == 'frequency' else (kernel_size - 1) // 2,
+    memory=getLowPassMemory,
+    # The transfer function of the frequency domain depends on the size of
+    # the whole image
+    tileable=lambda F, kernel_size, domain, **parameters:
+        domain != 'frequency',
+    # The frequency domain ignores the kernel size, so it costs the same on
+    # a pyramid level, and the spatial kernel is not normalized, so its gain
+    # is the number of pixels within the cutoff, which no level keeps
+    approximate=False))
+LinearFilters.registry.register(FilterSpec(
+    'geometric_mean',
+    window=LinearFilters.applyGeometricMeanFilter,
+    # Only the buffers NumPy reduces the strided regions through are held
+    window_copies=1))
+LinearFilters.registry.register(FilterSpec(
+    'harmonic_mean',
+    window=LinearFilters.applyHarmonicMeanFilter))
+LinearFilters.registry.register(FilterSpec(
+    'contra_harmonic_mean',
+    apply=LinearFilters.applyContraHarmonicMean,
+    parameters={'order': 2},
+    # The contra-harmonic mean filter is applied twice
+    halo=lambda F, kernel_size, order: kernel_size - 1,
+    memory=lambda F, shape, image_dtype, kernel_size, padding, dtype, order:
+        memoryPlanner.getSpatialMemory(
+            shape, image_dtype, kernel_size, padding, dtype, passes=2),
+    # The second pass pads the first at the edges of the image only
+    tileable=False))
+
 LF = LinearFilters()
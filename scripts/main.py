@@ -1,15 +1,66 @@
 import sys
 import os.path
-import matplotlib.pyplot as plt
 import random
 import string
+import socket
 import csv
 import time
-import pandas as pd
 
 from linearFilters import LF
 from nonLinearFilters import NLF
 from edgeDetector import ED
+from instrumentation import PROFILER
+from imageStatistics import getImageStatistics, readStatistics, \
+    writeStatistics
+from sweepManifest import SweepManifest, parseSelectors, removeResults
+from jobQueue import JobQueue, LeaseRenewer
+
+
+# The index of the statistics of every filtered image and source image
+STATISTICS_FILE = './results/statistics.csv'
+
+# The manifests of the jobs of the filter and edge detector sweeps
+FILTER_MANIFEST = './results/filter-manifest.json'
+EDGE_MANIFEST = './results/edge-manifest.json'
+
+# The queue of jobs that workers on several hosts claim, on storage they
+# share along with the results directory
+QUEUE_FILE = './results/queue.db'
+
+# The results file of each sweep, and the columns of the rows a job of the
+# sweep writes that identify the job. The edges of a filtered image are
+# identified by the same columns as the filtered image, so the padding it
+# was filtered with is written to its edge rows.
+RESULTS_FILES = {
+    'filter': './results/results.csv',
+    'edge': './results/edge-results.csv',
+}
+RESULT_KEYS = {
+    'filter': ['image_name', 'filter_type', 'filter_name', 'kernel_size',
+               'padding'],
+    'edge': ['image_name', 'filter_name', 'kernel_size', 'padding'],
+}
+
+# The images the filters are tested on
+IMAGE_PATHS = ['./img/NZjers1.png', './img/foetus.png']
+
+# The linear and non-linear filters to test
+LINEAR_FILTERS = [
+    'gaussian',
+    'box',
+    'butterworth_low_pass',
+    'low_pass',
+    'geometric_mean',
+    'harmonic_mean',
+    'contra_harmonic_mean']
+NON_LINEAR_FILTERS = [
+    'median',
+    'adaptive_weighted_median',
+    'truncated_median',
+    'max',
+    'min',
+    'midpoint',
+    'alpha_trimmed_mean']
 
 
 def main():
@@ -19,49 +70,87 @@ def main():
 
     # Get the arguments passed to the script and check if they are valid.
     arguments = sys.argv[1:]
-    if len(arguments) != 1:
-        print('Usage: python main.py <image>')
+
+    # Profiling the stages of the filters is opt-in as it slows every filter
+    # down slightly.
+    if '--profile' in arguments:
+        arguments.remove('--profile')
+        PROFILER.enabled = True
+
+    # Complete jobs are skipped when a sweep is run again, unless they match
+    # the key=value selectors after --force. --force on its own runs every
+    # job again.
+    selectors = None
+    if '--force' in arguments:
+        arguments.remove('--force')
+        selectors = parseSelectors(
+            [argument for argument in arguments if '=' in argument])
+        arguments = [argument for argument in arguments if '=' not in argument]
+
+    # The number of seconds a worker holds a job for without renewing it
+    lease_time = 600
+    if '--lease' in arguments:
+        index = arguments.index('--lease')
+        if index + 1 < len(arguments) and arguments[index + 1].isdigit():
+            lease_time = int(arguments.pop(index + 1))
+            arguments.remove('--lease')
+
+    modes = ['filter', 'edge', 'statistics', 'work', 'collect']
+    if not (len(arguments) == 1 and arguments[0] in modes
+            or len(arguments) == 2 and arguments[0] == 'queue'
+            and arguments[1] in ['filter', 'edge']):
+        print('Usage: python main.py <filter|edge|statistics> [--profile] '
+              '[--force [key=value[,value...] ...]]\n'
+              '       python main.py queue <filter|edge>\n'
+              '       python main.py work [--lease SECONDS] [--profile]\n'
+              '       python main.py collect')
         sys.exit(1)
 
     # If the argument is 'filter', test the linear and non-linear filters
     if arguments[0] == 'filter':
-        # Test the filters on the images
-        image_paths = ['./img/NZjers1.png', './img/foetus.png']
-        for image_path in image_paths:
-
-            # The linear and non-linear filters to test
-            linear_filters = [
-                'gaussian',
-                'box',
-                'butterworth_low_pass',
-                'low_pass',
-                'geometric_mean',
-                'harmonic_mean',
-                'contra_harmonic_mean']
-            non_linear_filters = [
-                'median',
-                'adaptive_weighted_median',
-                'truncated_median',
-                'max',
-                'min',
-                'midpoint',
-                'alpha_trimmed_mean']
+        # Index the statistics of the source images once, to compare the
+        # filtered images against
+        indexSourceStatistics()
+
+        # Plan every job of the sweep before running any, so an interrupted
+        # sweep knows which jobs are still pending
+        manifest = SweepManifest(FILTER_MANIFEST)
+        manifest.plan(getSweepJobs())
+        if selectors is not None:
+            manifest.force(selectors)
 
+        # Test the filters on the images
+        for image_path in IMAGE_PATHS:
             # Test the linear filters
-            testFilters(image_path, LF, linear_filters)
+            testFilters(image_path, LF, LINEAR_FILTERS, manifest=manifest)
 
             # Test the non-linear filters
-            testFilters(image_path, NLF, non_linear_filters)
+            testFilters(
+                image_path, NLF, NON_LINEAR_FILTERS, manifest=manifest)
+    elif arguments[0] == 'queue':
+        # Add the jobs of a sweep to the queue for workers to claim
+        queueJobs(arguments[1])
+    elif arguments[0] == 'work':
+        # Run jobs from the queue until every job is complete
+        work(lease_time)
+    elif arguments[0] == 'collect':
+        # Write the results the workers reported to the results files
+        collectResults()
     elif arguments[0] == 'edge':
         # Test the edge detectors
-        testEdgeDetectors()
+        testEdgeDetectors(selectors)
         sys.exit(0)
+    elif arguments[0] == 'statistics':
+        # Index the statistics of results saved before the index existed
+        indexStatistics()
     else:
         # raise an error if the argument is not recognized
-        raise ValueError('Argument not recognized. Use \'filter\' or \'edge\'.')
+        raise ValueError(
+            'Argument not recognized. Use \'filter\', \'edge\' or '
+            '\'statistics\'.')
 
 
-def testFilters(
+def getFilterJobs(
         source_image_path,
         F,
         filters,
@@ -69,6 +158,55 @@ def testFilters(
         max_kernel_size=15,
         padding='constant'):
     """
+    Gets the jobs of testing the filters on an image
+
+    :param source_image_path: The path to the image to be filtered
+    :param F: The class that applies the given filter.
+    :param filters: The names of the filters
+    :param min_kernel_size: The minimum kernel size
+    :param max_kernel_size: The maximum kernel size
+    :param padding: The type of padding to use
+
+    :return: A list of the jobs, one for every filter and kernel size
+    """
+    source_image_name = os.path.splitext(os.path.basename(source_image_path))[0]
+    filter_type = 'linear' if F == LF else 'nonlinear'
+    return [
+        {
+            'image_name': source_image_name,
+            'filter_type': filter_type,
+            'filter_name': filter_name,
+            'kernel_size': kernel_size,
+            'padding': padding,
+            'params': {},
+        }
+        for filter_name in filters
+        for kernel_size in range(min_kernel_size, max_kernel_size + 1, 2)]
+
+
+def getSweepJobs():
+    """
+    Gets the jobs of testing every linear and non-linear filter on every
+    image
+
+    :return: A list of the jobs
+    """
+    jobs = []
+    for image_path in IMAGE_PATHS:
+        jobs += getFilterJobs(image_path, LF, LINEAR_FILTERS)
+        jobs += getFilterJobs(image_path, NLF, NON_LINEAR_FILTERS)
+    return jobs
+
+
+def testFilters(
+        source_image_path,
+        F,
+        filters,
+        min_kernel_size=3,
+        max_kernel_size=15,
+        padding='constant',
+        manifest=None):
+    """
     Tests the filters
 
     :param source_image_path: The path to the image to be filtered
@@ -77,155 +215,433 @@ def testFilters(
     :param min_kernel_size: The minimum kernel size
     :param max_kernel_size: The maximum kernel size
     :param padding: The type of padding to use
+    :param manifest: The manifest of the sweep. If given, complete jobs are
+        skipped and every job is marked complete once its results are
+        written. If None, every job is run.
     """
 
-    # get image name without the extension
-    source_image_name = os.path.splitext(os.path.basename(source_image_path))[0]
-
     # Read the image
-    source_image = plt.imread(source_image_path)
+    source_image = readImage(source_image_path)
 
     # Generate the results file name and create the file if it doesn't exist
-    results_csv_file_name = getResultsFile()
+    results_csv_file_name = getResultsFile(RESULTS_FILES['filter'])
+
+    # Test the filters with different kernel sizes
+    for job in getFilterJobs(source_image_path, F, filters, min_kernel_size,
+                             max_kernel_size, padding):
+        if manifest is not None and manifest.isComplete(job):
+            continue
+
+        # Remove the results of an earlier run of the job, which was either
+        # interrupted before it was marked complete or is being run again
+        removeResults(results_csv_file_name, {
+            key: job[key] for key in RESULT_KEYS['filter']})
+
+        result = runFilterJob(job, source_image)
+        writeResult(results_csv_file_name, result)
+
+        # Mark the job complete only once its results are written
+        if manifest is not None:
+            manifest.complete(job)
 
-    # Get the filter type being tested
-    filter_type = 'linear' if F == LF else 'nonlinear'
 
-    # Create a list of kernel sizes to test
-    kernel_sizes = range(min_kernel_size, max_kernel_size + 1, 2)
+def runFilterJob(job, source_image):
+    """
+    Applies the filter of a job to its image and saves the filtered image
+
+    :param job: The job from getFilterJobs
+    :param source_image: The image to be filtered
 
-    # Test the filters
-    for filter_name in filters:
-        # Test the filters with different kernel sizes
-        for kernel_size in kernel_sizes:
-            # Get the image filename
-            dest_image_file_name = getFileName(
-                kernel_size, padding, 'filter', source_image_name, filter_name)
+    :return: The result of the job, a dictionary of the 'rows' of the
+        results file and the 'statistics' of the filtered image
+    """
+    source_image_name = job['image_name']
+    filter_type = job['filter_type']
+    filter_name = job['filter_name']
+    kernel_size = job['kernel_size']
+    padding = job['padding']
+    F = LF if filter_type == 'linear' else NLF
+
+    # Get the image filename
+    dest_image_file_name = getFileName(
+        kernel_size, padding, 'filter', source_image_name, filter_name)
+
+    # Start the timer
+    start_time = time.perf_counter_ns()
+    # Apply the filter
+    dest_image = F.applyFilter(
+        source_image, filter_name, kernel_size, **job['params'])
+    # Stop the timer
+    end_time = time.perf_counter_ns()
+    # Calculate the runtime
+    runtime = end_time - start_time
+
+    # Save the image
+    saveImage(dest_image_file_name, dest_image, cmap='gray')
+
+    # Save the time spent in each stage of the filter
+    writeProfile(source_image_name, filter_type, filter_name,
+                 kernel_size, padding)
+
+    # Print the results
+    print(f'''
+        Image: {source_image_name}\tFilter Type: {filter_type}\tFilter:
+        {filter_name}\tKernel Size: {kernel_size}\tPadding: constant
+    ''')
+
+    return {
+        'rows': [[source_image_name,
+                  filter_type,
+                  filter_name,
+                  kernel_size,
+                  padding,
+                  runtime,
+                  dest_image_file_name]],
+        # The statistics of the image while it is still in memory
+        'statistics': [[dest_image_file_name,
+                        getImageStatistics(dest_image, source_image)]],
+    }
+
+
+def writeResult(results_csv_file_name, result):
+    """
+    Writes the result of a job to a results file and the statistics index
 
-            # Start the timer
-            start_time = time.perf_counter_ns()
-            # Apply the filter
-            dest_image = F.applyFilter(source_image, filter_name, kernel_size)
-            # Stop the timer
-            end_time = time.perf_counter_ns()
-            # Calculate the runtime
-            runtime = end_time - start_time
+    :param results_csv_file_name: The name of the results file
+    :param result: The result from runFilterJob or runEdgeJob
+    """
+    for image_file_name, statistics in result['statistics']:
+        writeStatistics(STATISTICS_FILE, image_file_name, statistics)
 
-            # Save the image
-            plt.imsave(dest_image_file_name, dest_image, cmap='gray')
+    # Write the results to the results file
+    with open(results_csv_file_name, 'a', newline='') as resultsFile:
+        csvWriter = csv.writer(resultsFile)
+        csvWriter.writerows(result['rows'])
 
-            # Print the results
-            print(f'''
-                Image: {source_image_name}\tFilter Type: {filter_type}\tFilter:
-                {filter_name}\tKernel Size: {kernel_size}\tPadding: constant
-            ''')
 
-            # Write the results to the results file
-            with open(results_csv_file_name, 'a', newline='') as resultsFile:
-                csvWriter = csv.writer(resultsFile)
-                csvWriter.writerow([source_image_name,
-                                    filter_type,
-                                    filter_name,
-                                    kernel_size,
-                                    padding,
-                                    runtime,
-                                    dest_image_file_name])
+def getEdgeJob(row):
+    """
+    Gets the job of detecting the edges of a filtered image
 
+    :param row: The row of the results of the filters
 
-def testEdgeDetectors():
+    :return: The job
     """
-    Tests the edge detectors
+    return {
+        'image_name': row['image_name'],
+        'filter_name': row['filter_name'],
+        'kernel_size': int(row['kernel_size']),
+        'padding': row['padding'],
+        'file_name': row['file_name'],
+        'params': {},
+    }
+
+
+def testEdgeDetectors(selectors=None):
     """
+    Tests the edge detectors. Complete jobs in the manifest of the edge
+    detector sweep are skipped.
+
+    :param selectors: The selectors of the jobs to run again even if they
+        are complete, from parseSelectors. If None, no job is run again.
+    """
+
+    # pandas is only needed to read the results table, so it is not imported
+    # by the filter mode
+    import pandas as pd
 
     # Get the results from the linear and non-linear filters tests.
     df = pd.read_csv('./results/results.csv')
 
     # Generate the results file name and create the file if it doesn't exist
-    results_csv_file_name = getResultsFile('./results/edge-results.csv')
+    results_csv_file_name = getResultsFile(RESULTS_FILES['edge'])
+
+    # Plan a job for every filtered image before running any. A filtered
+    # image that was filtered again has a new file name, so its edges are
+    # detected again.
+    manifest = SweepManifest(EDGE_MANIFEST)
+    manifest.plan([getEdgeJob(row) for _, row in df.iterrows()])
+    if selectors is not None:
+        manifest.force(selectors)
 
     # for each row in the results file, apply the edge detector
     for row in df.iterrows():
-        # Get the image name, filter name, kernel size, padding, and file name
-        image_name = row[1]['image_name']
-        filter_name = row[1]['filter_name']
-        kernel_size = row[1]['kernel_size']
-        padding = row[1]['padding']
-        file_name = row[1]['file_name']
-
-        # Get the image
-        image = plt.imread(file_name)
-
-        # Get the images first channel as the image is grayscale
-        image = image[:, :, 0]
-
-        # Get the image filename
-        magnitude_image_file_name = getFileName(
-            kernel_size,
-            f'{padding}',
-            'edge',
-            image_name,
-            filter_name,
-            'magnitude')
-        direction_image_file_name = getFileName(
-            kernel_size,
-            f'{padding}',
-            'edge',
-            image_name,
-            filter_name,
-            'direction')
-        combined_image_file_name = getFileName(
-            kernel_size,
-            f'{padding}',
-            'edge',
-            image_name,
-            filter_name,
-            'combined')
-
-        # Apply the filter
-        magnitude_image = ED.applyFilter(image, 'magnitude', kernel_size)
-        direction_image = ED.applyFilter(image, 'direction', kernel_size)
-        combined_image = magnitude_image * direction_image
-
-        # Save the image
-        plt.imsave(magnitude_image_file_name, magnitude_image, cmap='gray')
-        # Save the directional image using a rainbow colormap
-        plt.imsave(direction_image_file_name, direction_image, cmap='rainbow')
-        # Save the combined image
-        plt.imsave(combined_image_file_name, combined_image, cmap='rainbow')
-
-        # Print the results
-        print(f'Image: {image_name}\tFilter Type: edge\tFilter: {filter_name}')
-
-        # Write the results to the results file
-        with open(results_csv_file_name, 'a', newline='') as resultsFile:
-            csvWriter = csv.writer(resultsFile)
-            csvWriter.writerow([
-                image_name,
-                'magnitude',
-                filter_name,
-                kernel_size,
-                'constant',
-                -1,
-                magnitude_image_file_name
-            ])
-            csvWriter.writerow([
-                image_name,
-                'direction',
-                filter_name,
-                kernel_size,
-                'constant',
-                -1,
-                direction_image_file_name
-            ])
-            csvWriter.writerow([
-                image_name,
-                'combined',
-                filter_name,
-                kernel_size,
-                'constant',
-                -1,
-                combined_image_file_name
-            ])
+        job = getEdgeJob(row[1])
+        if manifest.isComplete(job):
+            continue
+
+        # Remove the results of an earlier run of the job
+        removeResults(results_csv_file_name, {
+            key: job[key] for key in RESULT_KEYS['edge']})
+
+        result = runEdgeJob(job)
+        writeResult(results_csv_file_name, result)
+
+        # Mark the job complete only once its results are written
+        manifest.complete(job)
+
+
+def runEdgeJob(job):
+    """
+    Detects the edges of a filtered image and saves the magnitude, direction
+    and combined images
+
+    :param job: The job from getEdgeJob
+
+    :return: The result of the job, a dictionary of the 'rows' of the edge
+        results file and the 'statistics' of the edge images
+    """
+    # Get the image name, filter name, kernel size, padding, and file name
+    image_name = job['image_name']
+    filter_name = job['filter_name']
+    kernel_size = job['kernel_size']
+    padding = job['padding']
+    file_name = job['file_name']
+
+    # Get the image
+    image = readImage(file_name)
+
+    # Get the images first channel as the image is grayscale
+    image = image[:, :, 0]
+
+    # Get the image filename
+    magnitude_image_file_name = getFileName(
+        kernel_size,
+        f'{padding}',
+        'edge',
+        image_name,
+        filter_name,
+        'magnitude')
+    direction_image_file_name = getFileName(
+        kernel_size,
+        f'{padding}',
+        'edge',
+        image_name,
+        filter_name,
+        'direction')
+    combined_image_file_name = getFileName(
+        kernel_size,
+        f'{padding}',
+        'edge',
+        image_name,
+        filter_name,
+        'combined')
+
+    # Apply the filter
+    magnitude_image = ED.applyFilter(image, 'magnitude', kernel_size)
+    direction_image = ED.applyFilter(image, 'direction', kernel_size)
+    combined_image = magnitude_image * direction_image
+
+    # Save the image
+    saveImage(magnitude_image_file_name, magnitude_image, cmap='gray')
+    # Save the directional image using a rainbow colormap
+    saveImage(direction_image_file_name, direction_image, cmap='rainbow')
+    # Save the combined image
+    saveImage(combined_image_file_name, combined_image, cmap='rainbow')
+
+    # Save the time spent in each stage of the edge detectors
+    writeProfile(image_name, 'edge', filter_name, kernel_size, padding)
+
+    # Print the results
+    print(f'Image: {image_name}\tFilter Type: edge\tFilter: {filter_name}')
+
+    rows = []
+    statistics = []
+    for filter_type, edge_image_file_name, edge_image in [
+            ('magnitude', magnitude_image_file_name, magnitude_image),
+            ('direction', direction_image_file_name, direction_image),
+            ('combined', combined_image_file_name, combined_image)]:
+        rows.append([image_name, filter_type, filter_name, kernel_size,
+                     padding, -1, edge_image_file_name])
+        # The statistics of the images while they are still in memory
+        statistics.append(
+            [edge_image_file_name, getImageStatistics(edge_image)])
+
+    return {'rows': rows, 'statistics': statistics}
+
+
+def queueJobs(sweep):
+    """
+    Adds the jobs of a sweep to the queue for workers to claim. The jobs of
+    the edge detector sweep are those of the filtered images in the results
+    file, so the filter sweep must be collected before they are queued.
+
+    :param sweep: The sweep, 'filter' or 'edge'
+    """
+    if sweep == 'filter':
+        jobs = getSweepJobs()
+
+        # Index the statistics of the source images here, as workers report
+        # the statistics of the images they save only
+        indexSourceStatistics()
+    else:
+        with open(RESULTS_FILES['filter'], newline='') as resultsFile:
+            jobs = [getEdgeJob(row) for row in csv.DictReader(resultsFile)]
+
+    queue = JobQueue(QUEUE_FILE)
+    added = queue.addJobs([{'sweep': sweep, 'job': job} for job in jobs])
+    queue.close()
+    print(f'Queued: {added}\tAlready queued: {len(jobs) - added}')
+
+
+def work(lease_time, poll_interval=1):
+    """
+    Claims and runs jobs from the queue until every job is complete or
+    failed for good. Any number of workers can run at once, on one host or
+    on several hosts that share the results directory. Workers report the
+    results of their jobs to the queue rather than write the results files,
+    which are written by collectResults.
+
+    :param lease_time: The number of seconds a worker holds a job for
+        without renewing it. A job whose worker died is claimed again once
+        its lease expires.
+    :param poll_interval: The number of seconds to wait before trying again
+        when every job left is claimed by another worker
+    """
+    worker_id = f'{socket.gethostname()}-{os.getpid()}'
+    queue = JobQueue(QUEUE_FILE, lease_time)
+
+    # The source images read so far, as every source image is filtered by
+    # many jobs
+    source_images = {}
+
+    while True:
+        claimed = queue.claim(worker_id)
+        if claimed is None:
+            # The jobs claimed by other workers return to the queue if they
+            # fail or their leases expire, so wait for them to finish
+            if queue.isFinished():
+                break
+            time.sleep(poll_interval)
+            continue
+        job_id, entry = claimed
+        job = entry['job']
+
+        try:
+            with LeaseRenewer(queue, job_id, worker_id):
+                if entry['sweep'] == 'filter':
+                    source_image_path = f'./img/{job["image_name"]}.png'
+                    if source_image_path not in source_images:
+                        source_images[source_image_path] = readImage(
+                            source_image_path)
+                    result = runFilterJob(
+                        job, source_images[source_image_path])
+                else:
+                    result = runEdgeJob(job)
+        except Exception as error:
+            message = f'{type(error).__name__}: {error}'
+            queue.fail(job_id, worker_id, message)
+            print(f'Failed: {job}\t{message}')
+            continue
+
+        # The job was claimed again by another worker if this worker held it
+        # past its lease, so the images this worker saved are not kept
+        if not queue.complete(job_id, worker_id, result):
+            for row in result['rows']:
+                if os.path.isfile(row[-1]):
+                    os.remove(row[-1])
+            print(f'Lease lost: {job}')
+
+    queue.close()
+
+
+def collectResults():
+    """
+    Writes the results the workers reported to the queue to the results
+    files and the statistics index. The rows of an earlier run of each job
+    are removed first, so a job run again never leaves a duplicate row.
+    """
+    queue = JobQueue(QUEUE_FILE)
+    results = queue.getResults()
+    for job_id, entry, result in results:
+        sweep = entry['sweep']
+        job = entry['job']
+        results_csv_file_name = getResultsFile(RESULTS_FILES[sweep])
+        removeResults(results_csv_file_name, {
+            key: job[key] for key in RESULT_KEYS[sweep]})
+        writeResult(results_csv_file_name, result)
+        queue.markCollected(job_id)
+
+    counts = queue.getCounts()
+    queue.close()
+    print(f'Collected: {len(results)}\t' + '\t'.join(
+        f'{status.title()}: {count}' for status, count in counts.items()))
+
+
+def indexStatistics():
+    """
+    Indexes the statistics of every image in the results files that is not
+    in the statistics index yet, along with the source images. The images
+    were saved before the index existed, so their statistics are computed
+    from the saved images, which are scaled to the range of the colormap
+    they were saved with. Their PSNR is left empty, as it would not be
+    comparable to the PSNR of the filtered images the sweeps index.
+    """
+    indexed = set()
+    if os.path.isfile(STATISTICS_FILE):
+        indexed = set(readStatistics(STATISTICS_FILE))
+
+    for results_file_name in ['./results/results.csv',
+                              './results/edge-results.csv']:
+        if not os.path.isfile(results_file_name):
+            continue
+        with open(results_file_name, newline='') as resultsFile:
+            rows = list(csv.DictReader(resultsFile))
+
+        for row in rows:
+            # Index the source image of the filtered images
+            source_image_path = f'./img/{row["image_name"]}.png'
+            if row['filter_type'] in ['linear', 'nonlinear'] and \
+                    source_image_path not in indexed:
+                writeStatistics(STATISTICS_FILE, source_image_path,
+                                getImageStatistics(
+                                    readImage(source_image_path)))
+                indexed.add(source_image_path)
+
+            if row['file_name'] in indexed:
+                continue
+
+            # Get the images first channel as the image is grayscale
+            image = readImage(row['file_name'])[:, :, 0]
+            writeStatistics(STATISTICS_FILE, row['file_name'],
+                            getImageStatistics(image))
+            indexed.add(row['file_name'])
+            print(f'Indexed: {row["file_name"]}')
+
+
+def indexSourceStatistics():
+    """
+    Indexes the statistics of every source image, which the filtered images
+    are compared against
+    """
+    for image_path in IMAGE_PATHS:
+        writeStatistics(STATISTICS_FILE, image_path,
+                        getImageStatistics(readImage(image_path)))
+
+
+def readImage(image_path):
+    """
+    Reads an image. matplotlib is imported on the first read, and only its
+    image module, so pyplot and its backends are never loaded.
+
+    :param image_path: The path to the image
+
+    :return: The image
+    """
+    import matplotlib.image
+    return matplotlib.image.imread(image_path)
+
+
+def saveImage(image_path, image, cmap):
+    """
+    Saves an image using a colormap
+
+    :param image_path: The path to save the image to
+    :param image: The image to be saved
+    :param cmap: The name of the colormap
+    """
+    import matplotlib.image
+    matplotlib.image.imsave(image_path, image, cmap=cmap)
 
 
 def getResultsFile(file_name='./results/results.csv'):
@@ -260,6 +676,31 @@ def getResultsFile(file_name='./results/results.csv'):
     return resultsFileName
 
 
+def writeProfile(image_name, filter_type, filter_name, kernel_size, padding):
+    """
+    Writes the stages profiled since the last call to the profile results
+    file so that they can be read alongside the results file. Does nothing if
+    profiling is disabled.
+
+    :param image_name: The name of the filtered image
+    :param filter_type: The type of filter applied
+    :param filter_name: The name of the filter applied
+    :param kernel_size: The size of the kernel
+    :param padding: The type of padding used
+    """
+    if not PROFILER.enabled:
+        return
+
+    PROFILER.writeCsv(
+        './results/profile-results.csv',
+        image_name=image_name,
+        filter_type=filter_type,
+        filter_name=filter_name,
+        kernel_size=kernel_size,
+        padding=padding)
+    PROFILER.reset()
+
+
 def getFileName(kernel_size, padding, *args):
     """
     Creates a file name for the results of the filter
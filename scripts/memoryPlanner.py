@@ -0,0 +1,409 @@
+import math
+
+import numpy as np
+
+from convolution import getComplexDtype, getConvolvedShape, getFastLength
+
+
+# The methods a filter can be applied with, as chosen by
+# FilterRegistry.applyFilter
+METHODS = ['apply', 'histogram', 'spatial', 'frequency']
+
+# The number of arrays the size of its output that NumPy holds at once while
+# computing a 2D transform, as measured with NumPy 2. Single precision
+# forward transforms hold more.
+TRANSFORM_COPIES = 2
+SINGLE_FORWARD_TRANSFORM_COPIES = 6
+
+# The memory of the indices, small arrays and Python objects every filter
+# allocates, whatever the size of the image
+OVERHEAD = 64 * 2 ** 10
+
+# The number of double precision copies of the regions of interest of a row
+# that a window function holds at once, unless its filter declares otherwise
+WINDOW_COPIES = 2
+
+
+def getPixelCount(shape):
+    """
+    Gets the number of values in an image, counting every channel
+
+    :param shape: The shape of the image
+
+    :return: The number of values
+    """
+    return int(np.prod(shape, dtype=np.int64))
+
+
+def getTransformMemory(input_dtype, output_bytes, forward=True):
+    """
+    Gets the peak memory NumPy holds while computing a 2D Fourier transform,
+    including its output
+
+    :param input_dtype: The type of the transformed array
+    :param output_bytes: The size of the transform in bytes
+    :param forward: Whether the transform is forward or inverse
+
+    :return: The peak bytes
+    """
+    copies = TRANSFORM_COPIES
+    if forward and np.dtype(input_dtype) in (np.float32, np.complex64):
+        copies = SINGLE_FORWARD_TRANSFORM_COPIES
+    return copies * output_bytes
+
+
+def getConversionMemory(shape, image_dtype, dtype):
+    """
+    Gets the memory of the copy of an image converted to the type a filter
+    computes in
+
+    :param shape: The shape of the image
+    :param image_dtype: The type of the image
+    :param dtype: The type to compute in. If None, the image is not converted.
+
+    :return: The bytes of the copy, or 0 if the image is not copied
+    """
+    if dtype is None or np.dtype(dtype) == np.dtype(image_dtype):
+        return 0
+    return getPixelCount(shape) * np.dtype(dtype).itemsize
+
+
+def getFrequencyMemory(
+        shape,
+        image_dtype,
+        kernel_shape,
+        padding='constant',
+        dtype=None,
+        count=1):
+    """
+    Estimates the peak memory of convolving an image with a kernel using the
+    frequency domain algorithm without a workspace. The padded image and
+    kernel, both spectra and their product are all held while the product
+    is inverted, and the filtered image is a view of the inverse.
+
+    :param shape: The shape of the image
+    :param image_dtype: The type of the image
+    :param kernel_shape: The (height, width) of the kernel
+    :param padding: The type of padding to use
+    :param dtype: The floating point type to compute in
+    :param count: The number of convolutions of the image whose results are
+        held at once, e.g. 2 for the horizontal and vertical edges
+
+    :return: The peak bytes and the type of the filtered image
+    """
+    pad_dtype = np.dtype(image_dtype if dtype is None else dtype)
+    kernel_dtype = np.dtype(np.float64 if dtype is None else dtype)
+
+    padded_size = tuple(shape[:2])
+    if padding is not None:
+        padded_size = (
+            shape[0] + kernel_shape[0] - 1, shape[1] + kernel_shape[1] - 1)
+    kernel_count = getPixelCount(padded_size)
+    padded_count = kernel_count * getPixelCount(shape[2:])
+
+    # NumPy 2 transforms single precision arrays in single precision, and
+    # every other array in double precision
+    image_complex = np.dtype(
+        np.complex64 if pad_dtype == np.float32 else np.complex128)
+    kernel_complex = getComplexDtype(kernel_dtype)
+    product_complex = np.result_type(image_complex, kernel_complex)
+
+    padded = getConversionMemory(shape, image_dtype, dtype) + \
+        padded_count * pad_dtype.itemsize + \
+        kernel_count * kernel_dtype.itemsize
+    image_spectrum = padded_count * image_complex.itemsize
+    kernel_spectrum = kernel_count * kernel_complex.itemsize
+    product = padded_count * product_complex.itemsize
+
+    peak = max(
+        padded + getTransformMemory(pad_dtype, image_spectrum),
+        padded + image_spectrum +
+        getTransformMemory(kernel_dtype, kernel_spectrum),
+        padded + image_spectrum + kernel_spectrum + product +
+        getTransformMemory(product_complex, product, forward=False))
+
+    # The earlier results are views of their whole inverses
+    return peak + (count - 1) * product, \
+        np.empty(0, dtype=product_complex).real.dtype
+
+
+def getSpatialMemory(
+        shape,
+        image_dtype,
+        kernel_size,
+        padding='constant',
+        dtype=None,
+        copies=WINDOW_COPIES,
+        passes=1):
+    """
+    Estimates the peak memory of reducing every region of interest of an
+    image using the spatial domain algorithm. Only the rows of the padded
+    image one row of the output reads are gathered, and the window function
+    reduces the regions of one row at a time.
+
+    :param shape: The shape of the image
+    :param image_dtype: The type of the image
+    :param kernel_size: The size of the kernel
+    :param padding: The type of padding to use
+    :param dtype: The floating point type to compute in
+    :param copies: The number of double precision copies of the regions of
+        a row that the window function holds at once
+    :param passes: The number of times the image is filtered, each pass
+        holding the result of the previous one
+
+    :return: The peak bytes and the type of the filtered image
+    """
+    compute_dtype = np.dtype(image_dtype if dtype is None else dtype)
+    filtered_shape = getConvolvedShape(shape, kernel_size, padding)
+    channels = getPixelCount(shape[2:])
+
+    # The band of rows is gathered twice at the edges of the image, once
+    # into its buffer and once from the rows of the image
+    band = 0
+    if padding is not None:
+        band = 2 * kernel_size * (shape[1] + kernel_size - 1) * channels * \
+            compute_dtype.itemsize
+    regions = copies * filtered_shape[1] * channels * kernel_size ** 2 * \
+        np.dtype(np.float64).itemsize
+    output = getPixelCount(filtered_shape) * compute_dtype.itemsize
+
+    return getConversionMemory(shape, image_dtype, dtype) + passes * output + \
+        band + regions, compute_dtype
+
+
+def getHistogramMemory(
+        shape,
+        image_dtype,
+        kernel_size,
+        groups=None,
+        moments=False,
+        padding='constant',
+        dtype=None):
+    """
+    Estimates the peak memory of a rank filter computed from the sliding
+    histograms of the windows of an integer image
+
+    :param shape: The shape of the image
+    :param image_dtype: The integer type of the image
+    :param kernel_size: The size of the kernel
+    :param groups: The group of every offset of the window. If None, every
+        offset is in one group.
+    :param moments: Whether the sums of the values are kept
+    :param padding: The type of padding to use
+    :param dtype: The floating point type to compute in
+
+    :return: The peak bytes and the type of the filtered image
+    """
+    output_dtype = np.dtype(image_dtype if dtype is None else dtype)
+    filtered_shape = getConvolvedShape(shape, kernel_size, padding)
+    rows = filtered_shape[0] * getPixelCount(shape[2:])
+
+    levels = np.iinfo(image_dtype).max + 1
+    fine_width = math.isqrt(levels)
+    coarse_levels = -(-levels // fine_width)
+    if groups is None:
+        group_count, group_size = 1, kernel_size ** 2
+    else:
+        group_sizes = np.bincount(np.reshape(groups, -1))
+        group_count, group_size = len(group_sizes), group_sizes.max()
+    count_size = np.min_scalar_type(group_size).itemsize
+
+    histograms = group_count * rows * count_size * \
+        (coarse_levels * fine_width + coarse_levels)
+    if moments:
+        histograms += 2 * rows * coarse_levels * np.dtype(np.int64).itemsize
+
+    # Each step gathers the columns entering and leaving the windows with
+    # their indices, and searches the histograms of every row
+    columns = 2 * (shape[0] + kernel_size - 1) * getPixelCount(shape[2:]) * \
+        np.dtype(image_dtype).itemsize
+    step = 3 * kernel_size + 4 * coarse_levels + 2 * fine_width
+    if moments:
+        # The sums of the values are accumulated over the levels as well
+        step += coarse_levels + 4 * fine_width
+    step *= rows * np.dtype(np.intp).itemsize
+    output = getPixelCount(filtered_shape) * output_dtype.itemsize
+
+    return histograms + columns + step + output, output_dtype
+
+
+def getTransferMemory(shape, image_dtype, padding='constant', dtype=None):
+    """
+    Estimates the peak memory of multiplying the Fourier transform of an
+    image by a transfer function. The image is padded to at least twice its
+    size.
+
+    :param shape: The shape of the image
+    :param image_dtype: The type of the image
+    :param padding: The type of padding to use
+    :param dtype: The floating point type to compute in
+
+    :return: The peak bytes and the type of the filtered image
+    """
+    dtype = np.dtype(np.float64 if dtype is None else dtype)
+    padded_size = tuple(shape[:2])
+    if padding is not None:
+        padded_size = tuple(getFastLength(2 * size) for size in shape[:2])
+    half_size = (padded_size[0], padded_size[1] // 2 + 1)
+    channels = getPixelCount(shape[2:])
+
+    padded = getConversionMemory(shape, image_dtype, dtype) + \
+        getPixelCount(padded_size) * channels * dtype.itemsize
+    spectrum = getPixelCount(half_size) * channels * \
+        getComplexDtype(dtype).itemsize
+    transfer_function = getPixelCount(half_size) * dtype.itemsize
+    filtered = getPixelCount(padded_size) * channels * dtype.itemsize
+
+    return max(
+        padded + getTransformMemory(dtype, spectrum),
+        padded + spectrum + transfer_function +
+        getTransformMemory(
+            getComplexDtype(dtype), filtered, forward=False)), dtype
+
+
+def getRecursiveMemory(shape, image_dtype, halo, padding='constant',
+                       dtype=None):
+    """
+    Estimates the peak memory of a separable recursive filter, which pads
+    the image by its halo and runs along each axis through a buffer. NumPy
+    holds a temporary the size of the buffer while filling it.
+
+    :param shape: The shape of the image
+    :param image_dtype: The type of the image
+    :param halo: The number of pixels padded to each edge
+    :param padding: The type of padding to use
+    :param dtype: The floating point type to compute in
+
+    :return: The peak bytes and the type of the filtered image
+    """
+    dtype = np.dtype(np.float64 if dtype is None else dtype)
+    padded_shape = tuple(shape)
+    if padding is not None:
+        padded_shape = (shape[0] + 2 * halo, shape[1] + 2 * halo) + \
+            tuple(shape[2:])
+    padded = getPixelCount(padded_shape) * dtype.itemsize
+
+    # The buffer of each axis adds the order of the filter to its length
+    buffer = max(
+        (padded_shape[axis] + 6) * getPixelCount(padded_shape) //
+        padded_shape[axis] for axis in range(2)) * dtype.itemsize
+
+    # The converted image is freed once it is padded
+    return max(
+        getConversionMemory(shape, image_dtype, dtype) + padded,
+        padded + 2 * buffer), dtype
+
+
+def getBoxMemory(shape, image_dtype, kernel_size, padding='constant',
+                 dtype=None, passes=1):
+    """
+    Estimates the peak memory of the box filter computed from running sums,
+    which holds the padded image, its running sums along both axes and their
+    differences at once
+
+    :param shape: The shape of the image
+    :param image_dtype: The type of the image
+    :param kernel_size: The size of the kernel
+    :param padding: The type of padding to use
+    :param dtype: The floating point type to compute in
+    :param passes: The number of times the filter is applied, each pass
+        holding the result of the previous one
+
+    :return: The peak bytes and the type of the filtered image
+    """
+    dtype = np.dtype(np.float64 if dtype is None else dtype)
+    padded_shape = tuple(shape)
+    if padding is not None:
+        padded_shape = (
+            shape[0] + kernel_size - 1, shape[1] + kernel_size - 1) + \
+            tuple(shape[2:])
+    padded = getPixelCount(padded_shape)
+    running_sums = padded + getPixelCount(padded_shape[1:])
+    filtered = getPixelCount(getConvolvedShape(
+        padded_shape, kernel_size, None))
+
+    # The converted image is freed once it is padded. The running sums along
+    # the rows are held until those along the columns replace them.
+    peak = max(
+        getConversionMemory(shape, image_dtype, dtype) +
+        padded * dtype.itemsize,
+        (padded + 2 * running_sums + filtered) * dtype.itemsize)
+    if passes > 1:
+        peak += getPixelCount(shape) * dtype.itemsize
+    return peak, dtype
+
+
+def getPeakMemory(estimate, shape, padding='constant'):
+    """
+    Estimates the peak memory of filtering an image, including the overhead
+    every filter has
+
+    :param estimate: A function (shape, padding) that estimates the peak
+        bytes and the type of the filtered image of filtering an image
+    :param shape: The shape of the image
+    :param padding: The type of padding to use
+
+    :return: The peak bytes
+    """
+    return int(estimate(tuple(shape), padding)[0]) + OVERHEAD
+
+
+def getTiledMemory(estimate, shape, image_dtype, halo, tile_size):
+    """
+    Estimates the peak memory of filtering an image one square tile at a
+    time. The filtered image is allocated whole, and each tile is filtered
+    from a copy of it and its halo.
+
+    :param estimate: A function (shape, padding) that estimates the peak
+        bytes and the type of the filtered image of filtering an image
+    :param shape: The shape of the image
+    :param image_dtype: The type of the image
+    :param halo: The number of pixels the filter reads beyond each edge of an
+        output pixel
+    :param tile_size: The size of the tiles
+
+    :return: The peak bytes
+    """
+    tile_shape = (
+        min(tile_size, shape[0]) + 2 * halo,
+        min(tile_size, shape[1]) + 2 * halo) + tuple(shape[2:])
+    output_dtype = estimate(tile_shape, None)[1]
+    return getPixelCount(shape) * output_dtype.itemsize + \
+        getPeakMemory(estimate, tile_shape, None) + \
+        getPixelCount(tile_shape) * np.dtype(image_dtype).itemsize
+
+
+def getTileSize(estimate, shape, image_dtype, halo, budget):
+    """
+    Gets the largest square tile an image can be filtered in within a memory
+    budget, searching the sizes by bisection
+
+    :param estimate: A function (shape, padding) that estimates the peak
+        bytes and the type of the filtered image of filtering an image
+    :param shape: The shape of the image
+    :param image_dtype: The type of the image
+    :param halo: The number of pixels the filter reads beyond each edge of an
+        output pixel
+    :param budget: The most memory the filter may hold at once, in bytes
+
+    :return: The size of the tiles
+
+    :raises ValueError: If the image cannot be filtered within the budget,
+        even one pixel at a time
+    """
+    def fits(tile_size):
+        return getTiledMemory(
+            estimate, shape, image_dtype, halo, tile_size) <= budget
+
+    if not fits(1):
+        raise ValueError(
+            f'The image cannot be filtered within {budget} bytes.')
+
+    smallest, largest = 1, max(shape[:2])
+    while smallest < largest:
+        tile_size = (smallest + largest + 1) // 2
+        if fits(tile_size):
+            smallest = tile_size
+        else:
+            largest = tile_size - 1
+    return smallest
@@ -1,14 +1,24 @@
 import numpy as np
 
+from borders import PADDING_MODES
+import convolution
+from filterRegistry import FilterRegistry, FilterSpec
+from instrumentation import profiledFilter
+from pipeline import FilterStage
 from iSpatialFilters import ISpatialFilters
 
 
 class NonLinearFilters(ISpatialFilters):
+    # The filters the class can apply
+    registry = FilterRegistry()
+
+    @profiledFilter
     def applyFilter(self, image, filter_name, kernel_size, **kwargs):
         """
         Applies a non-linear filter to an image
 
-        :param image: The image to be convolved
+        :param image: The image to be convolved, either (height, width) or
+            (height, width, channels). Every channel is filtered at once.
         :param filter_name: The type of kernel to convolve the image with.
         Possible values:
             - 'median',
@@ -23,71 +33,52 @@ class NonLinearFilters(ISpatialFilters):
             - 'central_value': The central value of the weights (for adaptive weighted median filter)
             - 'constant': The constant (for adaptive weighted median filter)
             - 'd': The number of pixels to be trimmed (for alpha-trimmed mean filter)
-            - 'padding': The type of padding to use. Possible values:
+            - 'padding': The type of padding to use. Possible values: 'constant', 'edge', 'linear_ramp', 'reflect' and 'wrap'.
+            - 'dtype': The floating point type to compute in, either np.float32 or np.float64. Defaults to the type of the image.
+            - 'workspace': Accepted so that every class takes the same arguments. Unused, as only the strips along the edges of the image are padded.
+            - 'out': The array to write the filtered image into
+            - 'mask': A boolean mask of the pixels to filter. Only the windows of the masked pixels are reduced.
+            - 'boxes': A list of (top, left, bottom, right) boxes of pixels to filter, instead of a mask
+            - 'fill': The value of the pixels that are not filtered. If None, they keep their value in the image.
+            - 'tile_size': The size of the tiles a mask is divided into. Defaults to 64.
+            - 'tolerance': The root mean square error allowed for approximating the filter with a smaller kernel on a downsampled level of an image pyramid. If None, the filter is exact.
+            - 'histogram': Whether to filter uint8 and uint16 images from histograms of the windows slid along the rows instead of sorting every window. If True, only at the kernel sizes where the filter declares that is faster; if 'always', at every kernel size. Defaults to False.
+            - 'memory_budget': The most memory the filter may hold at once, in bytes. If the whole image would need more, it is filtered in the largest tiles that fit. If None, the memory is not planned.
 
         :return: The filtered image
         """
 
+        # Get the padding type. None means that the image already includes
+        # the padding the filter needs, so only the valid region is returned.
+        padding = kwargs.pop('padding', 'constant')
+
         # Check for errors in the parameters
-        self.checkErrors(kernel_size, 'constant', **kwargs)
-
-        # Get the padding type
-        padding = kwargs.get('padding', 'constant')
-
-        # The filter function is the equation to apply to the region of interest
-        # when convolving the image. The filter function is determined by the
-        # filter name.
-        if filter_name == 'median':
-            # The median filter function is the median of the region of interest
-            def filter_function(roi): return self.applyMedianFilter(roi)
-        elif filter_name == 'adaptive_weighted_median':
-            # The adaptive weighted median filter function is the weighted
-            # median of the region of interest. The filter function requires two
-            # parameters: the central value and the constant. These parameters
-            # are got from the kwargs dictionary.
-            central_value = kwargs.get('central_value', 100)
-            constant = kwargs.get('constant', 10)
-
-            def filter_function(roi): return self.applyAdaptiveWeightedMedianFilter(
-                roi, central_value, constant)
-        elif filter_name == 'truncated_median':
-            # The truncated median filter function is the truncated median of
-            # the region of interest
-            def filter_function(
-                roi): return self.applyTruncatedMedianFilter(roi)
-        elif filter_name == 'min':
-            # The min filter function is the minimum value of the region of
-            # interest
-            def filter_function(roi): return self.applyMinFilter(roi)
-        elif filter_name == 'max':
-            # The max filter function is the maximum value of the region of
-            # interest
-            def filter_function(roi): return self.applyMaxFilter(roi)
-        elif filter_name == 'midpoint':
-            # The midpoint filter function is the midpoint of the region of
-            # interest
-            def filter_function(roi): return self.applyMidpointFilter(roi)
-        elif filter_name == 'alpha_trimmed_mean':
-            # The alpha-trimmed mean filter function is the alpha-trimmed mean
-            # of the region of interest. The filter function requires one
-            # parameter: d. This parameter is got from the kwargs dictionary.
-            d = kwargs.get('d', 2)
-            def filter_function(
-                roi): return self.applyAlphaTrimmedMeanFilter(roi, d)
-        else:
-            # If the filter name is not recognized, raise an error.
-            raise Exception('Invalid filter name.')
-
-        # Apply the filter
-        return self.calculateSpatialDomainConvolution(
-            image, kernel_size, filter_function, padding)
+        self.checkErrors(kernel_size, padding, **kwargs)
+
+        # Get the floating point type to compute in
+        dtype = kwargs.pop('dtype', None)
+
+        # Get the workspace to borrow buffers from and the array to write the
+        # filtered image into
+        workspace = kwargs.pop('workspace', None)
+        out = kwargs.pop('out', None)
+
+        # Look the filter up in the registry and apply it. The filter
+        # function applied to each region of interest when convolving the
+        # image is declared for each filter at the bottom of this file.
+        return self.registry.applyFilter(
+            self, image, filter_name, kernel_size, padding, dtype, workspace,
+            out, **kwargs)
 
     def calculateSpatialDomainConvolution(
             self,
             image,
             kernel_size,
             filter_function,
-            padding='constant'):
+            padding='constant',
+            dtype=None,
+            workspace=None,
+            out=None):
         """
         Performs a convolution on an image using a kernel using the spatial
         domain algorithm.
@@ -96,45 +87,29 @@ class NonLinearFilters(ISpatialFilters):
         :param kernel_size: The size of the kernel
         :param filter_function: The filter function to be applied
         :param padding: The type of padding to use. Possible values:
+        :param dtype: The floating point type to compute in
+        :param workspace: The workspace to borrow buffers from
+        :param out: The array to write the convolved image into
 
         :return: The convolved image
         """
-
-        # Get the height and width of the image
-        height, width = image.shape
-
-        # Calculate how much the image needs to be padded
-        padding_size = int((kernel_size - 1) / 2)
-
-        # Create a padded image with zeros
-        padded_image = np.pad(image, padding_size, mode=padding)
-
-        # Create an empty output image
-        convolved_image = np.zeros_like(image)
-
-        # Iterate over each pixel in the image
-        for i in range(height):
-            for j in range(width):
-                # Get the region of interest (ROI) from the padded image
-                roi = padded_image[i:i + kernel_size, j:j + kernel_size]
-
-                # Apply the desired kernel type
-                convolved_value = filter_function(roi)
-                convolved_image[i, j] = convolved_value
-
-        return convolved_image
+        return convolution.calculateSpatialDomainConvolution(
+            image, kernel_size, filter_function, padding, dtype, workspace,
+            out)
 
     def applyMedianFilter(self, image_section):
         """
         Performs median filtering on an image section.
 
-        :param image_section: The image section to be filtered
+        :param image_section: The image section to be filtered. Sections are
+            reduced over the last two axes, so a stack of sections can be
+            filtered at once.
 
         :return: The filtered image section
         """
 
         # Calculate the median
-        median = np.median(image_section)
+        median = np.median(image_section, axis=(-2, -1))
         return median
 
     def applyAdaptiveWeightedMedianFilter(
@@ -145,7 +120,9 @@ class NonLinearFilters(ISpatialFilters):
         """
         Performs adaptive weighted median filtering on an image section.
 
-        :param image_section: The image section to be filtered
+        :param image_section: The image section to be filtered. Sections are
+            reduced over the last two axes, so a stack of sections can be
+            filtered at once.
         :param central_value: The central value of the weights
         :param constant: The constant
 
@@ -153,77 +130,115 @@ class NonLinearFilters(ISpatialFilters):
         """
 
         # Get the height and width of the image section
-        height, width = image_section.shape
-
-        # Create a matrix of weights with zeros
-        weights = np.zeros((height, width))
-
-        # Set the center of the weights to the central value
-        weights[int(height / 2), int(width / 2)] = central_value
-
-        # Calculates the distances from the center by creating a vector of
-        # values from -center to center and squaring them and then creating a
-        # matrix of distances from the center by adding the vector to its
-        # transpose and taking the square root of the result
-        center = (width - 1) / 2
-        vector = np.linspace(-center, center, width)
-        vector = vector ** 2
-        distances = np.sqrt(np.add.outer(vector, vector))
+        height, width = image_section.shape[-2:]
 
-        # Flatten the image
-        flattened_image_section = image_section.flatten()
+        # Get the distance of every pixel from the center
+        distances = self.getWeightDistances(width)
 
-        # Calculate the standard deviation
-        standard_deviation = np.std(flattened_image_section)
-        # Calculate the mean
-        mean = np.mean(flattened_image_section)
+        # Calculate the standard deviation and the mean of each section
+        standard_deviation = np.std(image_section, axis=(-2, -1))
+        mean = np.mean(image_section, axis=(-2, -1))
 
         # If the mean is 0, then the weights are equal to the central value.
         # else the weights are calculated using the formula.
-        if mean == 0:
-            weights = central_value
-        else:
-            weights = central_value - \
-                (constant * distances * standard_deviation / mean)
+        spread = np.divide(
+            standard_deviation,
+            mean,
+            out=np.zeros_like(mean, dtype=np.float64),
+            where=mean != 0)
+        weights = central_value - \
+            (constant * distances * spread[..., np.newaxis, np.newaxis])
+
+        # floor the weights and convert them to integers, setting any weights
+        # less than 0 to 0
+        weights = np.maximum(np.floor(weights).astype(int), 0)
+
+        # Sort the pixels of each section along with their weights
+        flattened_shape = image_section.shape[:-2] + (height * width,)
+        flattened_image_section = image_section.reshape(flattened_shape)
+        order = np.argsort(flattened_image_section, axis=-1)
+        sorted_pixels = np.take_along_axis(
+            flattened_image_section, order, axis=-1)
+        sorted_weights = np.take_along_axis(
+            weights.reshape(flattened_shape), order, axis=-1)
+
+        # The weighted median is the median of the pixels repeated according
+        # to their weights. Find the two middle pixels of the repeated pixels
+        # from the cumulative weights instead of repeating them.
+        cumulative_weights = np.cumsum(sorted_weights, axis=-1)
+        total_weight = cumulative_weights[..., -1:]
+        middle_pixels = [
+            np.take_along_axis(
+                sorted_pixels,
+                np.minimum(
+                    np.sum(cumulative_weights <= position, axis=-1,
+                           keepdims=True),
+                    height * width - 1),
+                axis=-1)
+            for position in ((total_weight - 1) // 2, total_weight // 2)]
+
+        # Calculate the weighted median. There is no median if every weight
+        # is 0.
+        weighted_median = np.where(
+            total_weight > 0, (middle_pixels[0] + middle_pixels[1]) / 2, np.nan)
+
+        return weighted_median[..., 0]
+
+    def getWeightDistances(self, kernel_size):
+        """
+        Gets the distance of every pixel of a section from its center, which
+        the adaptive weighted median filter weights the pixels by
 
-        # floor the weights and convert them to integers
-        weights = np.floor(weights).astype(int).flatten()
+        :param kernel_size: The size of the section
 
-        # check if any of the weights are less than 0
-        if np.any(weights < 0):
-            # If any of the weights are less than 0, then set them to 0
-            weights[weights < 0] = 0
+        :return: The (kernel_size, kernel_size) distances
+        """
 
-        # Repeat the pixels according to their weights
-        repeated_pixels = sorted(np.repeat(flattened_image_section, weights))
+        # Calculates the distances from the center by creating a vector of
+        # values from -center to center and squaring them and then creating a
+        # matrix of distances from the center by adding the vector to its
+        # transpose and taking the square root of the result
+        center = (kernel_size - 1) / 2
+        vector = np.linspace(-center, center, kernel_size)
+        vector = vector ** 2
+        return np.sqrt(np.add.outer(vector, vector))
 
-        # Sort the repeated pixels
+    def getWeightGroups(self, kernel_size):
+        """
+        Groups the pixels of a section by their distance from its center, so
+        that the pixels of each group share a weight
 
-        # Calculate the weighted median
-        weighted_median = np.median(repeated_pixels)
+        :param kernel_size: The size of the section
 
-        return weighted_median
+        :return: The (kernel_size, kernel_size) group of every pixel
+        """
+        _, groups = np.unique(
+            self.getWeightDistances(kernel_size), return_inverse=True)
+        return groups.reshape(kernel_size, kernel_size)
 
     def applyTruncatedMedianFilter(self, image_section):
         """
         Performs truncated median filtering on an image section.
 
-        :param image_section: The image section to be filtered
+        :param image_section: The image section to be filtered. Sections are
+            reduced over the last two axes, so a stack of sections can be
+            filtered at once.
 
         :return: The filtered image section
         """
 
-        # Flatten the image
-        flattened_image_section = sorted(image_section.flatten())
-
-        # Sort the pixels
+        # Flatten and sort the pixels of each section
+        height, width = image_section.shape[-2:]
+        flattened_image_section = np.sort(image_section.reshape(
+            image_section.shape[:-2] + (height * width,)), axis=-1)
 
         # Get the minimum and maximum values
-        min_value = np.min(flattened_image_section)
-        max_value = np.max(flattened_image_section)
+        min_value = flattened_image_section[..., :1]
+        max_value = flattened_image_section[..., -1:]
 
         # Get the median value
-        median_value = np.median(flattened_image_section)
+        median_value = np.median(
+            flattened_image_section, axis=-1, keepdims=True)
 
         # Calculate the difference between the median and the minimum value
         difference_median_min = np.abs(median_value - min_value)
@@ -231,67 +246,77 @@ class NonLinearFilters(ISpatialFilters):
         # Calculate the difference between the median and the maximum value
         difference_median_max = np.abs(median_value - max_value)
 
-        if difference_median_min > difference_median_max:
-            # Calculate the lower threshold
-            lower_threshold = median_value - difference_median_max
-
-            # Get the pixels that are greater than the lower threshold
-            truncated_image = flattened_image_section[flattened_image_section >= lower_threshold]
-        elif difference_median_min < difference_median_max:
-            # Calculate the upper threshold
-            upper_threshold = median_value + difference_median_min
-
-            # Get the pixels that are less than the upper threshold
-            truncated_image = flattened_image_section[flattened_image_section <= upper_threshold]
-        else:
-            # If the difference between the median and the minimum value is equal
-            # to the difference between the median and the maximum value, then
-            # the median is eqaul to the mode
-            truncated_image = flattened_image_section
-
-        # Calculate the truncated median
-        truncated_median = np.median(truncated_image)
-
-        return truncated_median
+        # The pixels are sorted, so the pixels that are kept are a range of
+        # them. If the median is further from the minimum, keep the pixels
+        # greater than the lower threshold. If it is further from the maximum,
+        # keep the pixels less than the upper threshold. If it is as far from
+        # both, the median is equal to the mode and every pixel is kept.
+        lower_threshold = median_value - difference_median_max
+        upper_threshold = median_value + difference_median_min
+        start = np.where(
+            difference_median_min > difference_median_max,
+            np.sum(flattened_image_section < lower_threshold, axis=-1,
+                   keepdims=True),
+            0)
+        stop = np.where(
+            difference_median_min < difference_median_max,
+            np.sum(flattened_image_section <= upper_threshold, axis=-1,
+                   keepdims=True),
+            height * width)
+
+        # Calculate the truncated median from the middle of the kept range
+        middle_pixels = [
+            np.take_along_axis(flattened_image_section, index, axis=-1)
+            for index in (
+                start + (stop - start - 1) // 2, start + (stop - start) // 2)]
+        truncated_median = (middle_pixels[0] + middle_pixels[1]) / 2
+
+        return truncated_median[..., 0]
 
     def applyMinFilter(self, image_section):
         """
         Performs min filtering on an image section.
 
-        :param image_section: The image section to be filtered
+        :param image_section: The image section to be filtered. Sections are
+            reduced over the last two axes, so a stack of sections can be
+            filtered at once.
 
         :return: The filtered image section
         """
 
         # Calculate the minimum
-        min_value = np.min(image_section)
+        min_value = np.min(image_section, axis=(-2, -1))
         return min_value
 
     def applyMaxFilter(self, image_section):
         """
         Performs max filtering on an image section.
 
-        :param image_section: The image section to be filtered
+        :param image_section: The image section to be filtered. Sections are
+            reduced over the last two axes, so a stack of sections can be
+            filtered at once.
 
         :return: The filtered image section
         """
 
         # Calculate the maximum
-        max_value = np.max(image_section)
+        max_value = np.max(image_section, axis=(-2, -1))
         return max_value
 
     def applyMidpointFilter(self, image_section):
         """
         Performs midpoint filtering on an image section.
 
-        :param image_section: The image section to be filtered
+        :param image_section: The image section to be filtered. Sections are
+            reduced over the last two axes, so a stack of sections can be
+            filtered at once.
 
         :return: The filtered image section
         """
         # Calculate the midpoint by calculating the average of the minimum and
         # maximum values.
-        min_value = np.min(image_section)
-        max_value = np.max(image_section)
+        min_value = np.min(image_section, axis=(-2, -1))
+        max_value = np.max(image_section, axis=(-2, -1))
         midpoint = (min_value + max_value) / 2
         return midpoint
 
@@ -299,14 +324,16 @@ class NonLinearFilters(ISpatialFilters):
         """
         Performs alpha-trimmed mean filtering on an image section.
 
-        :param image_section: The image section to be filtered
+        :param image_section: The image section to be filtered. Sections are
+            reduced over the last two axes, so a stack of sections can be
+            filtered at once.
         :param d: The number of pixels to be trimmed
 
         :return: The filtered image section
         """
 
         # Get the height and width of the image section
-        height, width = image_section.shape
+        height, width = image_section.shape[-2:]
 
         # Get the number of pixels to be trimmed
         num_pixels_to_be_trimmed = int(d // 2)
@@ -314,21 +341,288 @@ class NonLinearFilters(ISpatialFilters):
         # Get the total number of pixels
         total_pixels = height * width
 
-        # Flatten the image
-        flattened_image_section = sorted(image_section.flatten())
-
-        # Sort the pixels
+        # Flatten and sort the pixels of each section
+        flattened_image_section = np.sort(image_section.reshape(
+            image_section.shape[:-2] + (total_pixels,)), axis=-1)
 
         # Trim the pixels
-        trimmed_pixels = flattened_image_section[num_pixels_to_be_trimmed:total_pixels -
-                                                 num_pixels_to_be_trimmed]
+        trimmed_pixels = flattened_image_section[
+            ..., num_pixels_to_be_trimmed:total_pixels -
+            num_pixels_to_be_trimmed]
 
         # Calculate the alpha-trimmed mean
         alpha_trimmed_mean = (1 / (width * height - d)) * \
-            np.mean(trimmed_pixels)
+            np.mean(trimmed_pixels, axis=-1)
 
         return alpha_trimmed_mean
 
+    def calculateHistogramFilter(
+            self,
+            image,
+            kernel_size,
+            statistic,
+            groups=None,
+            moments=False,
+            padding='constant',
+            dtype=None,
+            out=None):
+        """
+        Applies a rank filter to a uint8 or uint16 image using histograms of
+        the windows slid along the rows.
+
+        :param image: The image to be filtered
+        :param kernel_size: The size of the kernel
+        :param statistic: The function that computes the statistic from the
+            histograms
+        :param groups: The group of every offset of the window
+        :param moments: Whether the statistic needs the sums of the values
+        :param padding: The type of padding to use
+        :param dtype: The type of the filtered image
+        :param out: The array to write the filtered image into
+
+        :return: The filtered image
+        """
+        return convolution.calculateHistogramFilter(
+            image, kernel_size, statistic, groups, moments, padding, dtype,
+            out)
+
+    def getHistogramMedian(self, histograms):
+        """
+        Calculates the median of every window from its histogram
+
+        :param histograms: The SlidingHistograms of the windows
+
+        :return: The median of every window
+        """
+        # The median of an odd number of pixels is the middle value, and of
+        # an even number the average of the two middle values
+        size = histograms.size
+        median = histograms.findRank(size // 2)
+        if size % 2 == 1:
+            return median
+        return (histograms.findRank(size // 2 - 1) + median) / 2
+
+    def getHistogramAdaptiveWeightedMedian(
+            self,
+            histograms,
+            central_value=100,
+            constant=10):
+        """
+        Calculates the adaptive weighted median of every window from its
+        histograms, which are kept separately for the pixels at each distance
+        from the center so that each distance can be weighted.
+
+        :param histograms: The SlidingHistograms of the windows, grouped by
+            getWeightGroups and with their moments
+        :param central_value: The central value of the weights
+        :param constant: The constant
+
+        :return: The adaptive weighted median of every window
+        """
+        size = histograms.size
+        distances = np.unique(self.getWeightDistances(histograms.kernel_size))
+
+        # Calculate the standard deviation and the mean of each window from
+        # the sums of its values
+        sums, squares = histograms.getMoments()
+        mean = sums / size
+        standard_deviation = np.sqrt(
+            np.maximum(squares / size - mean ** 2, 0))
+        spread = np.divide(
+            standard_deviation,
+            mean,
+            out=np.zeros_like(mean, dtype=np.float64),
+            where=mean != 0)
+
+        # Weight every distance in every window, as the window filter does
+        weights = np.maximum(np.floor(
+            central_value - constant * distances[:, np.newaxis] * spread
+        ).astype(int), 0)
+        total_weight = histograms.group_sizes @ weights
+
+        # Find the two middle values of the pixels repeated by their weights.
+        # There is no median if every weight is 0.
+        middle_values = [
+            histograms.findRank(np.maximum(position, 0), weights)
+            for position in ((total_weight - 1) // 2, total_weight // 2)]
+        return np.where(
+            total_weight > 0, (middle_values[0] + middle_values[1]) / 2,
+            np.nan)
+
+    def getHistogramTruncatedMedian(self, histograms):
+        """
+        Calculates the truncated median of every window from its histogram
+
+        :param histograms: The SlidingHistograms of the windows
+
+        :return: The truncated median of every window
+        """
+        size = histograms.size
+        min_value = histograms.findRank(0)
+        max_value = histograms.findRank(size - 1)
+        median_value = self.getHistogramMedian(histograms)
+        difference_median_min = np.abs(median_value - min_value)
+        difference_median_max = np.abs(median_value - max_value)
+
+        # Keep the values above the lower threshold or up to the upper
+        # threshold, as the window filter does. The kept values are a range
+        # of ranks, counted from the histogram.
+        lower_threshold = np.ceil(median_value - difference_median_max)
+        upper_threshold = np.floor(median_value + difference_median_min)
+        start = np.where(
+            difference_median_min > difference_median_max,
+            histograms.countBelow(lower_threshold),
+            0)
+        stop = np.where(
+            difference_median_min < difference_median_max,
+            histograms.countBelow(upper_threshold + 1),
+            size)
+
+        return (histograms.findRank(start + (stop - start - 1) // 2) +
+                histograms.findRank(start + (stop - start) // 2)) / 2
+
+    def getHistogramMin(self, histograms):
+        """
+        Calculates the minimum of every window from its histogram
+
+        :param histograms: The SlidingHistograms of the windows
+
+        :return: The minimum of every window
+        """
+        return histograms.findRank(0)
+
+    def getHistogramMax(self, histograms):
+        """
+        Calculates the maximum of every window from its histogram
+
+        :param histograms: The SlidingHistograms of the windows
+
+        :return: The maximum of every window
+        """
+        return histograms.findRank(histograms.size - 1)
+
+    def getHistogramMidpoint(self, histograms):
+        """
+        Calculates the midpoint of every window from its histogram
+
+        :param histograms: The SlidingHistograms of the windows
+
+        :return: The midpoint of every window
+        """
+        return (self.getHistogramMin(histograms) +
+                self.getHistogramMax(histograms)) / 2
+
+    def getHistogramAlphaTrimmedMean(self, histograms, d=2):
+        """
+        Calculates the alpha-trimmed mean of every window from its histogram,
+        trimming the values from both ends of the histogram instead of
+        sorting the window
+
+        :param histograms: The SlidingHistograms of the windows, with their
+            moments
+        :param d: The number of pixels to be trimmed
+
+        :return: The alpha-trimmed mean of every window
+        """
+        size = histograms.size
+        num_pixels_to_be_trimmed = int(d // 2)
+
+        # The sum of the kept values is the sum of every value but the
+        # largest, less the sum of the smallest
+        trimmed_sum = histograms.sumSmallest(
+            size - num_pixels_to_be_trimmed) - \
+            histograms.sumSmallest(num_pixels_to_be_trimmed)
+        trimmed_mean = trimmed_sum / (size - 2 * num_pixels_to_be_trimmed)
+
+        # Normalize in the same way as the window filter
+        return (1 / (size - d)) * trimmed_mean
+
+    def stage(self, filter_name, kernel_size, **kwargs):
+        """
+        Creates a pipeline stage that applies a filter. Stages are chained
+        with the | operator, e.g. LF.stage('gaussian', 5) | ED.stage('magnitude')
+
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param kwargs: The arguments for the filter
+
+        :return: The pipeline stage
+        """
+        return FilterStage(self, filter_name, kernel_size, **kwargs)
+
+    def getLinearKernels(self, filter_name, kernel_size, **kwargs):
+        """
+        Gets the kernels a filter convolves the image with, so that they can
+        be composed with the kernels of neighbouring filters in a pipeline
+
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param kwargs: The arguments for the filter
+
+        :return: None, as no non-linear filter is a convolution
+        """
+        return self.registry.getKernels(
+            self, filter_name, kernel_size, **kwargs)
+
+    def estimatePeakMemory(
+            self, shape, image_dtype, filter_name, kernel_size, method=None,
+            **kwargs):
+        """
+        Estimates the most memory applying a filter to an image holds at
+        once, without a workspace or an output array
+
+        :param shape: The shape of the image
+        :param image_dtype: The type of the image
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param method: The method to apply the filter with, one of
+            'apply', 'histogram', 'spatial' or 'frequency'. If None, the
+            method applyFilter would use.
+        :param kwargs: The arguments for the filter, including 'padding',
+            'dtype' and 'histogram' as for applyFilter
+
+        :return: The peak bytes
+        """
+        return self.registry.estimatePeakMemory(
+            self, shape, image_dtype, filter_name, kernel_size, method,
+            **kwargs)
+
+    def getTileSize(
+            self, shape, image_dtype, filter_name, kernel_size, budget,
+            method=None, **kwargs):
+        """
+        Gets the largest square tile that a filter can be applied to an image
+        in one tile at a time within a memory budget
+
+        :param shape: The shape of the image
+        :param image_dtype: The type of the image
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param budget: The most memory the filter may hold at once, in bytes
+        :param method: The method to apply the filter with. If None, the
+            method applyFilter would use.
+        :param kwargs: The arguments for the filter, including 'dtype' and
+            'histogram' as for applyFilter
+
+        :return: The size of the tiles
+        """
+        return self.registry.getTileSize(
+            self, shape, image_dtype, filter_name, kernel_size, budget,
+            method, **kwargs)
+
+    def getHalo(self, filter_name, kernel_size, **kwargs):
+        """
+        Gets the number of pixels a filter reads beyond each edge of an output
+        pixel
+
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param kwargs: The arguments for the filter
+
+        :return: The halo of the filter
+        """
+        return self.registry.getHalo(self, filter_name, kernel_size, **kwargs)
+
     def checkErrors(self, kernel_size, padding, **kwargs):
         """
         Checks for errors in the LinearFilters class
@@ -341,6 +635,7 @@ class NonLinearFilters(ISpatialFilters):
 
         :raises ValueError: If the kernel size is even
         :raises ValueError: If the padding type is invalid
+        :raises ValueError: If the dtype is not float32 or float64
         :raises ValueError: If the kernel size is less than 1
         :raises ValueError: If the cutoff frequency is less than 0
         """
@@ -394,12 +689,68 @@ class NonLinearFilters(ISpatialFilters):
             elif d is not None:
                 raise TypeError('d must be an integer.')
 
+        # Check for errors related to the floating point type.
+        if kwargs.get('dtype') is not None:
+            # Check that the type is a supported floating point type
+            if np.dtype(kwargs['dtype']) not in (np.float32, np.float64):
+                raise ValueError('dtype must be float32 or float64.')
+
         # Check for errors related to the padding type.
-        if padding not in ['constant', 'edge', 'linear_ramp']:
+        if padding is not None and padding not in PADDING_MODES:
             raise ValueError('''
                 Invalid padding type. Possible values are:
-                constant, edge, linear_ramp.
+                constant, edge, linear_ramp, reflect, wrap.
             ''')
 
 
+# Declare every non-linear filter by the function it applies to each region
+# of interest, and by the function that computes it from the histograms of
+# the windows of uint8 and uint16 images. Filters from elsewhere are
+# registered in the same way, using NonLinearFilters.registry.register.
+# The histograms only beat sorting from the kernel sizes measured by
+# benchmark.py histogram; the other filters use them only if forced.
+NonLinearFilters.registry.register(FilterSpec(
+    'median',
+    window=NonLinearFilters.applyMedianFilter,
+    histogram=NonLinearFilters.getHistogramMedian,
+    histogram_kernel_sizes={'uint8': 15, 'uint16': 31}))
+NonLinearFilters.registry.register(FilterSpec(
+    'adaptive_weighted_median',
+    window=NonLinearFilters.applyAdaptiveWeightedMedianFilter,
+    histogram=NonLinearFilters.getHistogramAdaptiveWeightedMedian,
+    groups=lambda F, kernel_size: F.getWeightGroups(kernel_size),
+    moments=True,
+    parameters={'central_value': 100, 'constant': 10},
+    # The weights, distances and sorted values of every region are all held
+    # at once
+    window_copies=7))
+NonLinearFilters.registry.register(FilterSpec(
+    'truncated_median',
+    window=NonLinearFilters.applyTruncatedMedianFilter,
+    histogram=NonLinearFilters.getHistogramTruncatedMedian,
+    histogram_kernel_sizes={'uint8': 31}))
+# Only the buffers NumPy reduces the strided regions through are held by
+# the min, max and midpoint filters
+NonLinearFilters.registry.register(FilterSpec(
+    'min',
+    window=NonLinearFilters.applyMinFilter,
+    histogram=NonLinearFilters.getHistogramMin,
+    window_copies=1))
+NonLinearFilters.registry.register(FilterSpec(
+    'max',
+    window=NonLinearFilters.applyMaxFilter,
+    histogram=NonLinearFilters.getHistogramMax,
+    window_copies=1))
+NonLinearFilters.registry.register(FilterSpec(
+    'midpoint',
+    window=NonLinearFilters.applyMidpointFilter,
+    histogram=NonLinearFilters.getHistogramMidpoint,
+    window_copies=1))
+NonLinearFilters.registry.register(FilterSpec(
+    'alpha_trimmed_mean',
+    window=NonLinearFilters.applyAlphaTrimmedMeanFilter,
+    histogram=NonLinearFilters.getHistogramAlphaTrimmedMean,
+    moments=True,
+    parameters={'d': 2}))
+
 NLF = NonLinearFilters()
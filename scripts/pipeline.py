@@ -0,0 +1,328 @@
+from convolution import composeKernels, getPadWidth, padImage
+from instrumentation import PROFILER
+from stream import streamFrames
+
+
+class FilterStage:
+    """
+    A filter applied by LinearFilters, NonLinearFilters or EdgeDetector that
+    can be chained with other stages into a Pipeline using the | operator:
+
+        pipeline = LF.stage('gaussian', 5) | ED.stage('magnitude')
+        edges = pipeline.apply(image)
+    """
+
+    def __init__(self, F, filter_name, kernel_size=None, **kwargs):
+        """
+        Creates a stage
+
+        :param F: The class that applies the filter
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the kernel
+        :param kwargs: The arguments for the filter, except for 'padding',
+            which is set for the whole pipeline
+        """
+        if 'padding' in kwargs:
+            raise ValueError('The padding is set for the whole pipeline.')
+
+        self.F = F
+        self.filter_name = filter_name
+        self.kernel_size = kernel_size
+        self.kwargs = kwargs
+
+    def getHalo(self):
+        """
+        Gets the number of pixels the stage reads beyond each edge of an
+        output pixel
+
+        :return: The halo of the stage
+        """
+        return self.F.getHalo(self.filter_name, self.kernel_size, **self.kwargs)
+
+    def apply(self, image, **kwargs):
+        """
+        Applies the filter to an image that already includes the halo of the
+        stage. The filtered image is smaller than the image by the halo on
+        every edge.
+
+        :param image: The padded image to be filtered
+        :param kwargs: Arguments passed to every stage, such as 'dtype' and
+            'workspace'
+
+        :return: The filtered image
+        """
+        return self.F.applyFilter(
+            image,
+            self.filter_name,
+            self.kernel_size,
+            padding=None,
+            **self.kwargs,
+            **kwargs)
+
+    def stream(self, frames, padding='constant', prefetch=0, **kwargs):
+        """
+        Applies the filter to every frame of a sequence of equal-shaped
+        frames, keeping one workspace across the frames so the kernel
+        spectra, FFT buffers and padded images are only allocated once
+
+        :param frames: An iterable of frames
+        :param padding: The type of padding to use
+        :param prefetch: The number of frames to read ahead in a background
+            thread
+        :param kwargs: Arguments passed to the filter, such as 'dtype'
+
+        :return: A generator of the filtered frames
+        """
+        def apply(frame, workspace):
+            return self.F.applyFilter(
+                frame,
+                self.filter_name,
+                self.kernel_size,
+                padding=padding,
+                workspace=workspace,
+                **self.kwargs,
+                **kwargs)
+
+        return streamFrames(apply, frames, prefetch)
+
+    def getKernels(self):
+        """
+        Gets the kernels the stage convolves the image with
+
+        :return: A list of kernels, or None if the stage is not a convolution
+        """
+        return self.F.getLinearKernels(
+            self.filter_name, self.kernel_size, **self.kwargs)
+
+    def getStages(self):
+        """
+        Gets the stages this stage is made of
+
+        :return: A list containing only this stage
+        """
+        return [self]
+
+    def __or__(self, other):
+        return Pipeline(self.getStages() + other.getStages())
+
+
+class FoldedStage:
+    """
+    A chain of convolution stages folded into one. The kernels of the chain
+    are composed into a single kernel per output, so a Gaussian followed by
+    the Sobel magnitude costs two convolutions instead of three.
+    """
+
+    def __init__(self, stage, kernels):
+        """
+        Creates a folded stage
+
+        :param stage: The last stage of the folded chain. If it has more than
+            one kernel, its class combines their results.
+        :param kernels: The composed kernels, one per kernel of the last stage
+        """
+        self.stage = stage
+        self.kernels = kernels
+
+    def getHalo(self):
+        """
+        Gets the number of pixels the stage reads beyond each edge of an
+        output pixel
+
+        :return: The halo of the composed kernels
+        """
+        return (self.kernels[0].shape[0] - 1) // 2
+
+    def apply(self, image, **kwargs):
+        """
+        Convolves an image that already includes the halo of the stage with
+        each composed kernel and combines the results
+
+        :param image: The padded image to be filtered
+        :param kwargs: Arguments passed to every stage, such as 'dtype' and
+            'workspace'
+
+        :return: The filtered image
+        """
+        F = self.stage.F
+        dtype = kwargs.get('dtype')
+        workspace = kwargs.get('workspace')
+        convolved_images = [
+            F.calculateFrequencyDomainConvolution(
+                image, kernel, None, dtype, workspace)
+            for kernel in self.kernels]
+
+        if len(convolved_images) == 1:
+            return convolved_images[0]
+        return F.combineEdges(self.stage.filter_name, *convolved_images)
+
+
+class Pipeline:
+    """
+    A chain of filter stages applied one after the other in memory. The image
+    is padded once with the combined halo of every stage, after which each
+    stage only filters the region its output is needed for. Each stage's
+    input is released as soon as the next stage has been applied.
+    """
+
+    def __init__(self, stages):
+        """
+        Creates a pipeline
+
+        :param stages: The stages of the pipeline in the order they are
+            applied
+        """
+        self.stages = list(stages)
+
+    def getHalo(self):
+        """
+        Gets the number of pixels the pipeline reads beyond each edge of an
+        output pixel
+
+        :return: The combined halo of every stage
+        """
+        return sum(stage.getHalo() for stage in self.stages)
+
+    def fold(self):
+        """
+        Folds each run of consecutive convolution stages into a single stage
+        by composing their kernels. A stage with a single kernel is folded
+        into the stage after it; a stage with several kernels, such as the
+        edge magnitude, ends the run as its results are combined non-linearly.
+
+        :return: The stages of the pipeline after folding
+        """
+        folded_stages = []
+
+        # The composed kernel of the run of single-kernel stages before the
+        # current stage, if any
+        run_kernel = None
+        run_stage = None
+        for stage in self.stages:
+            kernels = stage.getKernels()
+
+            # Stages that are not convolutions end the run
+            if kernels is None:
+                if run_kernel is not None:
+                    folded_stages.append(FoldedStage(run_stage, [run_kernel]))
+                    run_kernel = None
+                folded_stages.append(stage)
+                continue
+
+            # Compose the run with each kernel of this stage
+            if run_kernel is not None:
+                kernels = [
+                    composeKernels(run_kernel, kernel) for kernel in kernels]
+
+            if len(kernels) == 1:
+                run_kernel = kernels[0]
+                run_stage = stage
+            else:
+                folded_stages.append(FoldedStage(stage, kernels))
+                run_kernel = None
+
+        if run_kernel is not None:
+            folded_stages.append(FoldedStage(run_stage, [run_kernel]))
+
+        return folded_stages
+
+    def apply(self, image, padding='constant', fold=True, **kwargs):
+        """
+        Applies every stage of the pipeline to an image
+
+        :param image: The image to be filtered
+        :param padding: The type of padding to use. Possible values are:
+            - 'constant'
+            - 'edge'
+            - 'linear_ramp'
+            - 'reflect'
+            - 'wrap'
+        :param fold: Whether to fold consecutive convolution stages into one
+        :param kwargs: Arguments passed to every stage, such as 'dtype' and
+            'workspace'
+
+        :return: The filtered image, the same size as the image
+        """
+        stages = self.fold() if fold else self.stages
+        return self.applyStages(image, stages, padding, **kwargs)
+
+    def applyStages(self, image, stages, padding='constant', **kwargs):
+        """
+        Pads an image once for the halo of every stage and applies each stage
+        to the output of the previous stage
+
+        :param image: The image to be filtered
+        :param stages: The stages to apply, e.g. the folded stages
+        :param padding: The type of padding to use
+        :param kwargs: Arguments passed to every stage, such as 'dtype' and
+            'workspace'
+
+        :return: The filtered image, the same size as the image
+        """
+        halo = sum(stage.getHalo() for stage in stages)
+
+        # Pad the image once for the halo of every stage, into a buffer
+        # borrowed from the workspace if there is one
+        workspace = kwargs.get('workspace')
+        with PROFILER.stage('pipeline_pad') as stage:
+            out = None
+            if workspace is not None:
+                shape = (
+                    image.shape[0] + 2 * halo,
+                    image.shape[1] + 2 * halo) + image.shape[2:]
+                out = workspace.getBuffer(
+                    'pipeline_padded_image', shape, image.dtype)
+            image = padImage(image, getPadWidth(halo, image.ndim), padding, out)
+            if out is None:
+                stage.allocate(image)
+
+        # Apply each stage to the output of the previous stage. Rebinding the
+        # image releases the previous output as soon as it has been used.
+        for stage in stages:
+            image = stage.apply(image, **kwargs)
+
+        return image
+
+    def stream(
+            self,
+            frames,
+            padding='constant',
+            fold=True,
+            prefetch=0,
+            **kwargs):
+        """
+        Applies every stage of the pipeline to every frame of a sequence of
+        equal-shaped frames. The stages are folded once, and one workspace is
+        kept across the frames so the kernel spectra, FFT buffers and padded
+        images are only allocated once.
+
+        :param frames: An iterable of frames
+        :param padding: The type of padding to use
+        :param fold: Whether to fold consecutive convolution stages into one
+        :param prefetch: The number of frames to read ahead in a background
+            thread
+        :param kwargs: Arguments passed to every stage, such as 'dtype'
+
+        :return: A generator of the filtered frames
+        """
+        stages = self.fold() if fold else self.stages
+
+        def apply(frame, workspace):
+            return self.applyStages(
+                frame, stages, padding, workspace=workspace, **kwargs)
+
+        return streamFrames(apply, frames, prefetch)
+
+    def __call__(self, image, padding='constant', fold=True, **kwargs):
+        return self.apply(image, padding, fold, **kwargs)
+
+    def getStages(self):
+        """
+        Gets the stages of the pipeline
+
+        :return: The stages of the pipeline
+        """
+        return list(self.stages)
+
+    def __or__(self, other):
+        return Pipeline(self.getStages() + other.getStages())
@@ -0,0 +1,244 @@
+import numpy as np
+
+from instrumentation import PROFILER
+
+
+# The binomial kernel that blurs each level of the pyramid before it is
+# downsampled, so that the downsampled image is not aliased
+BINOMIAL_KERNEL = np.array([1, 4, 6, 4, 1]) / 16
+
+# The smallest kernel a filter is applied with on a level of the pyramid,
+# and the smallest level that is filtered
+MIN_KERNEL_SIZE = 3
+MIN_LEVEL_SIZE = 16
+
+
+def downsample(image):
+    """
+    Blurs an image with the binomial kernel and halves its height and width
+    by keeping every other row and column. The blurred image is computed in
+    the type of the image if it is floating point.
+
+    :param image: The image to be downsampled
+
+    :return: The downsampled image
+    """
+    dtype = np.result_type(image.dtype, np.float32)
+    half_kernel = (len(BINOMIAL_KERNEL) - 1) // 2
+    for axis in range(2):
+        # Blur the rows and then the columns, padding with the edge values
+        pad_width = [(0, 0)] * image.ndim
+        pad_width[axis] = (half_kernel, half_kernel)
+        padded = np.swapaxes(np.pad(image, pad_width, mode='edge'), 0, axis)
+        size = image.shape[axis]
+        blurred = sum(
+            weight * padded[offset:offset + size]
+            for offset, weight in enumerate(BINOMIAL_KERNEL))
+        image = np.swapaxes(blurred, 0, axis)
+
+    return image[::2, ::2].astype(dtype, copy=False)
+
+
+def upsample(image, shape, scale):
+    """
+    Resizes a downsampled image back to the shape it was downsampled from,
+    interpolating linearly between its pixels
+
+    :param image: The downsampled image
+    :param shape: The height and width to resize to
+    :param scale: The number of pixels of the resized image between each
+        pair of pixels of the downsampled image
+
+    :return: The resized image
+    """
+    for axis in range(2):
+        # Pixel i of the downsampled image lies on pixel i * scale of the
+        # resized image
+        positions = np.arange(shape[axis]) / scale
+        before = np.minimum(
+            np.floor(positions).astype(np.intp), image.shape[axis] - 1)
+        after = np.minimum(before + 1, image.shape[axis] - 1)
+        weights = (positions - before).reshape(
+            (-1,) + (1,) * (image.ndim - 1))
+
+        image = np.swapaxes(image, 0, axis)
+        image = image[before] * (1 - weights) + image[after] * weights
+        image = np.swapaxes(image, 0, axis)
+
+    return image
+
+
+def getPyramidDepth(kernel_size, shape):
+    """
+    Gets the number of times an image can be downsampled before the kernel
+    or the image becomes too small to filter
+
+    :param kernel_size: The size of the kernel
+    :param shape: The shape of the image
+
+    :return: The number of levels below the image
+    """
+    depth = 0
+    while kernel_size >> (depth + 1) >= MIN_KERNEL_SIZE and \
+            min(shape[:2]) >> (depth + 1) >= MIN_LEVEL_SIZE:
+        depth += 1
+    return depth
+
+
+def getLevelKernelSize(kernel_size, level):
+    """
+    Gets the size of the kernel that covers the same region of the image on
+    a level of the pyramid
+
+    :param kernel_size: The size of the kernel on the image
+    :param level: The level of the pyramid
+
+    :return: The odd size of the kernel on the level
+    """
+    return (kernel_size >> level) | 1
+
+
+def getLevelParameters(parameters, kernel_size, level):
+    """
+    Gets the parameters that make a filter cover the same region of the
+    image on a level of the pyramid. The standard deviation and the spatial
+    cutoff are distances in pixels, which shrink with the level, and the
+    number of values the alpha-trimmed mean trims shrinks with the area of
+    the kernel.
+
+    :param parameters: The parameters of the filter on the image
+    :param kernel_size: The size of the kernel on the image
+    :param level: The level of the pyramid
+
+    :return: The parameters of the filter on the level
+    """
+    parameters = dict(parameters)
+    for name in ['sigma', 'cutoff']:
+        if parameters.get(name) is not None:
+            parameters[name] = parameters[name] / 2 ** level
+    if parameters.get('d') is not None:
+        area = (getLevelKernelSize(kernel_size, level) / kernel_size) ** 2
+        parameters['d'] = int(round(parameters['d'] * area))
+    return parameters
+
+
+def getSampleBoxes(shape, sample_size):
+    """
+    Gets the boxes in the centre and the corners of an image that
+    approximations are checked on. The corners include the padding, where
+    approximations are least accurate.
+
+    :param shape: The shape of the image
+    :param sample_size: The size of each box
+
+    :return: A list of (top, left, bottom, right) boxes
+    """
+    height = min(sample_size, shape[0])
+    width = min(sample_size, shape[1])
+    tops = [(shape[0] - height) // 2, 0, 0, shape[0] - height,
+            shape[0] - height]
+    lefts = [(shape[1] - width) // 2, 0, shape[1] - width, 0,
+             shape[1] - width]
+    return [
+        (top, left, top + height, left + width)
+        for top, left in zip(tops, lefts)]
+
+
+def getSampleError(image, exact_image, boxes):
+    """
+    Gets the largest root mean square error of an approximation in any of
+    the sample boxes
+
+    :param image: The approximated image
+    :param exact_image: The exactly filtered image, which only needs to be
+        exact inside the boxes
+    :param boxes: The (top, left, bottom, right) sample boxes
+
+    :return: The largest error of any box
+    """
+    return max(
+        np.sqrt(np.mean(np.square(
+            image[top:bottom, left:right] -
+            exact_image[top:bottom, left:right])))
+        for top, left, bottom, right in boxes)
+
+
+def applyApproximately(
+        registry,
+        F,
+        image,
+        filter_name,
+        kernel_size,
+        padding='constant',
+        dtype=None,
+        out=None,
+        tolerance=0.01,
+        sample_size=32,
+        **kwargs):
+    """
+    Approximates a large kernel filter by applying it with a proportionally
+    smaller kernel to a downsampled level of an anti-aliased pyramid and
+    upsampling the result. The coarsest level whose result is within the
+    tolerance of the exact result is used, falling back to the exact filter
+    if none is. The parameters that are distances or counts of pixels are
+    scaled to the level. Filters that are declared not to be approximated,
+    as their cost does not grow with the kernel size, are always exact.
+
+    The error of each level is the largest root mean square error against
+    the exact filter on boxes in the centre and the corners of the image,
+    which only the boxes and their halo are filtered exactly for.
+
+    :param registry: The registry the filter is declared in
+    :param F: The class that applies the filter
+    :param image: The image to be filtered
+    :param filter_name: The name of the filter
+    :param kernel_size: The size of the kernel
+    :param padding: The type of padding to use
+    :param dtype: The floating point type to compute in
+    :param out: The array to write the filtered image into
+    :param tolerance: The largest root mean square error allowed
+    :param sample_size: The size of the boxes the error is measured on
+    :param kwargs: The arguments for the filter
+
+    :return: The filtered image
+    """
+    depth = 0
+    if registry.canApproximate(F, filter_name, kernel_size, **kwargs):
+        depth = getPyramidDepth(kernel_size, image.shape)
+    if depth > 0:
+        # Filter only the sample boxes exactly, to check each level against
+        boxes = getSampleBoxes(image.shape, sample_size)
+        exact_image = registry.applyFilter(
+            F, image, filter_name, kernel_size, padding, dtype, boxes=boxes,
+            **kwargs)
+
+        with PROFILER.stage('pyramid') as stage:
+            pyramid = [image]
+            for level in range(depth):
+                pyramid.append(downsample(pyramid[-1]))
+                stage.allocate(pyramid[-1])
+
+    # Try the coarsest level first, as it is the cheapest
+    for level in range(depth, 0, -1):
+        parameters = getLevelParameters(kwargs, kernel_size, level)
+        filtered_level = registry.applyFilter(
+            F, pyramid[level], filter_name,
+            getLevelKernelSize(kernel_size, level), padding, dtype,
+            **parameters)
+        with PROFILER.stage('upsample') as stage:
+            filtered_image = upsample(
+                filtered_level, image.shape[:2], 2 ** level).astype(
+                    exact_image.dtype, copy=False)
+            stage.allocate(filtered_image)
+
+        error = getSampleError(filtered_image, exact_image, boxes)
+        if error <= tolerance:
+            if out is not None:
+                np.copyto(out, filtered_image)
+                filtered_image = out
+            return filtered_image
+
+    return registry.applyFilter(
+        F, image, filter_name, kernel_size, padding, dtype, None, out,
+        **kwargs)
+
@@ -0,0 +1,207 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from borders import getRegion
+from instrumentation import PROFILER
+
+
+def getMaskTiles(mask, tile_size):
+    """
+    Divides an image into square tiles and keeps the tiles that contain at
+    least one pixel of a mask
+
+    :param mask: The boolean mask of the pixels to filter
+    :param tile_size: The size of the tiles
+
+    :return: A list of (top, left, bottom, right) tiles
+    """
+    height, width = mask.shape
+
+    # Count the masked pixels in every tile at once by padding the mask to a
+    # whole number of tiles
+    tile_rows = -(-height // tile_size)
+    tile_columns = -(-width // tile_size)
+    padded_mask = np.zeros(
+        (tile_rows * tile_size, tile_columns * tile_size), dtype=bool)
+    padded_mask[:height, :width] = mask
+    occupied = padded_mask.reshape(
+        tile_rows, tile_size, tile_columns, tile_size).any(axis=(1, 3))
+
+    return [
+        (row * tile_size,
+         column * tile_size,
+         min((row + 1) * tile_size, height),
+         min((column + 1) * tile_size, width))
+        for row, column in zip(*np.nonzero(occupied))]
+
+
+def getTiles(height, width, tile_size):
+    """
+    Divides an image into square tiles, without a mask
+
+    :param height: The height of the image
+    :param width: The width of the image
+    :param tile_size: The size of the tiles
+
+    :return: A list of (top, left, bottom, right) tiles
+    """
+    return [
+        (top, left, min(top + tile_size, height), min(left + tile_size, width))
+        for top in range(0, height, tile_size)
+        for left in range(0, width, tile_size)]
+
+
+def applyToRegions(
+        registry,
+        F,
+        image,
+        filter_name,
+        kernel_size,
+        padding='constant',
+        dtype=None,
+        out=None,
+        mask=None,
+        boxes=None,
+        fill=None,
+        tile_size=64,
+        histogram=False,
+        **kwargs):
+    """
+    Applies a filter to only some of the pixels of an image, given either as
+    a boolean mask or as a list of boxes. Each box, or each tile of the image
+    that contains part of the mask, is filtered on its own with its halo, so
+    the cost scales with the area being filtered rather than with the image.
+
+    Filters that reduce windows only reduce the windows of masked pixels.
+    Other filters filter every pixel of each tile and keep the masked ones.
+    Filters that cannot be tiled, such as the frequency domain low pass
+    filters, would filter each region as if it were the whole image, so they
+    filter the whole image once and keep the pixels of the regions.
+
+    :param registry: The registry the filter is declared in
+    :param F: The class that applies the filter
+    :param image: The image to be filtered
+    :param filter_name: The name of the filter
+    :param kernel_size: The size of the kernel
+    :param padding: The type of padding to use
+    :param dtype: The floating point type to compute in
+    :param out: The array to write the filtered image into
+    :param mask: A boolean mask of the pixels to filter, the same height and
+        width as the filtered image
+    :param boxes: A list of (top, left, bottom, right) boxes of pixels to
+        filter, with the bottom and right edges excluded
+    :param fill: The value of the pixels that are not filtered. If None, they
+        keep their value in the image.
+    :param tile_size: The size of the tiles a mask is divided into
+    :param histogram: Whether to filter uint8 and uint16 regions from
+        histograms of the windows, as for FilterRegistry.getMethod
+    :param kwargs: The arguments for the filter
+
+    :return: The filtered image
+
+    :raises ValueError: If the mask is not the size of the filtered image
+    :raises ValueError: If a box does not lie inside the filtered image
+    """
+    spec = registry.getFilter(filter_name)
+    parameters = spec.getParameters(kwargs)
+    halo = registry.getHalo(F, filter_name, kernel_size, **parameters)
+
+    # An image that already includes its padding is larger than its output
+    offset = halo if padding is None else 0
+    height = image.shape[0] - 2 * offset
+    width = image.shape[1] - 2 * offset
+
+    if mask is not None:
+        mask = np.asarray(mask, dtype=bool)
+        if mask.shape != (height, width):
+            raise ValueError('The mask must be the size of the image.')
+        boxes = getMaskTiles(mask, tile_size)
+    for top, left, bottom, right in boxes:
+        if not (0 <= top < bottom <= height and 0 <= left < right <= width):
+            raise ValueError('Every box must lie inside the image.')
+
+    # Start the output from the pixels that are not filtered. Unless an
+    # output is given, it is created on the first region, whose type the
+    # filter decides.
+    filtered_image = out
+    if filtered_image is not None:
+        fillImage(filtered_image, image, offset, fill)
+
+    if not registry.isTileable(F, filter_name, kernel_size, **parameters):
+        whole_image = registry.applyFilter(
+            F, image, filter_name, kernel_size, padding, dtype,
+            histogram=histogram, **parameters)
+        if filtered_image is None:
+            filtered_image = np.empty_like(whole_image)
+            fillImage(filtered_image, image, offset, fill)
+        for top, left, bottom, right in boxes:
+            region = (slice(top, bottom), slice(left, right))
+            if mask is None:
+                filtered_image[region] = whole_image[region]
+            else:
+                filtered_image[region][mask[region]] = \
+                    whole_image[region][mask[region]]
+        return filtered_image
+
+    for box in boxes:
+        top, left, bottom, right = box
+        with PROFILER.stage('region'):
+            region = getRegion(image, box, halo, padding)
+            box_mask = None if mask is None else mask[top:bottom, left:right]
+
+        if box_mask is not None and spec.apply is None and \
+                spec.window is not None:
+            # Reduce only the windows of the masked pixels in the box
+            if dtype is not None:
+                region = region.astype(dtype, copy=False)
+            rois = sliding_window_view(
+                region, (kernel_size, kernel_size), axis=(0, 1))[box_mask]
+            values = spec.window(F, rois, **parameters)
+        else:
+            values = registry.applyFilter(
+                F, region, filter_name, kernel_size, None, dtype,
+                histogram=histogram, **parameters)
+            if box_mask is not None:
+                values = values[box_mask]
+
+        if filtered_image is None:
+            filtered_image = np.empty(
+                (height, width) + image.shape[2:], dtype=values.dtype)
+            fillImage(filtered_image, image, offset, fill)
+
+        if box_mask is None:
+            filtered_image[top:bottom, left:right] = values
+        else:
+            filtered_image[top:bottom, left:right][box_mask] = values
+
+        # Free the region and its result before filtering the next region,
+        # as the result may be a view of much larger arrays
+        del region, values
+
+    # Nothing was filtered, so the output is only the unfiltered pixels
+    if filtered_image is None:
+        filtered_image = np.empty(
+            (height, width) + image.shape[2:],
+            dtype=np.float64 if dtype is None else dtype)
+        fillImage(filtered_image, image, offset, fill)
+
+    return filtered_image
+
+
+def fillImage(filtered_image, image, offset, fill):
+    """
+    Sets every pixel of the filtered image to its value in the image, or to
+    a fill value
+
+    :param filtered_image: The filtered image
+    :param image: The image being filtered
+    :param offset: The halo the image already includes, if any
+    :param fill: The value to fill with. If None, the pixels of the image are
+        copied.
+    """
+    if fill is not None:
+        filtered_image[...] = fill
+        return
+
+    height, width = filtered_image.shape[:2]
+    filtered_image[...] = image[offset:offset + height, offset:offset + width]
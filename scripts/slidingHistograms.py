@@ -0,0 +1,376 @@
+import math
+
+import numpy as np
+
+from borders import PaddedImage
+
+
+class SlidingHistograms:
+    """
+    The histograms of the windows of an integer image, kept for the windows
+    of every row at once and slid along the rows one column at a time.
+    Sliding only adds the values entering each window and removes the values
+    leaving it, so the cost of each step does not depend on the size of the
+    window, and every rank statistic is found by searching the histograms in
+    O(levels) rather than sorting the window.
+
+    Each histogram has a fine level for every value and a coarse level for
+    every run of sqrt(levels) values, so a search only scans the coarse
+    levels and one run of fine levels.
+
+    The offsets of the window can be split into groups, each with its own
+    histograms, so that every group can be weighted separately, e.g. by its
+    distance from the centre of the window.
+
+    The image is never padded as a whole. Each step only gathers the columns
+    of the padded image that enter and leave the windows.
+    """
+
+    def __init__(
+            self,
+            image,
+            kernel_size,
+            levels,
+            groups=None,
+            moments=False,
+            padding=None):
+        """
+        Creates the histograms of the windows before the first column
+
+        :param image: The integer image, either (height, width) or
+            (height, width, channels)
+        :param kernel_size: The size of the window
+        :param levels: The number of values, e.g. 256 for uint8 images
+        :param groups: The group of every offset of the window, as a
+            (kernel_size, kernel_size) array of integers from 0. If None,
+            every offset is in one group.
+        :param moments: Whether to keep the sum and the sum of squares of the
+            values of the whole window in each coarse level
+        :param padding: The type of padding to use. If None, the image
+            already includes the padding.
+        """
+        if groups is None:
+            groups = np.zeros((kernel_size, kernel_size), dtype=np.intp)
+
+        # Pad the columns of the image virtually, by padding the rows of the
+        # transposed image
+        self.image = image
+        self.padded_columns = None
+        if padding is not None:
+            self.padded_columns = PaddedImage(
+                np.swapaxes(image, 0, 1), (kernel_size - 1) // 2, padding)
+        self.kernel_size = kernel_size
+        self.size = kernel_size * kernel_size
+        self.height, self.width = image.shape[:2]
+        if padding is None:
+            self.height -= kernel_size - 1
+            self.width -= kernel_size - 1
+
+        # The windows of every channel of every row are slid at once
+        self.row_count = self.height * int(np.prod(image.shape[2:]))
+        self.rows = np.arange(self.row_count)
+
+        self.levels = levels
+        self.fine_width = math.isqrt(levels)
+        self.coarse_levels = -(-levels // self.fine_width)
+
+        self.groups = groups
+        self.group_count = int(groups.max()) + 1
+        self.group_sizes = np.bincount(
+            groups.reshape(-1), minlength=self.group_count)
+
+        # The counts only need to hold the size of the largest group
+        shape = (self.group_count, self.row_count)
+        count_dtype = np.min_scalar_type(self.group_sizes.max())
+        self.counts = np.zeros(
+            shape + (self.coarse_levels * self.fine_width,), dtype=count_dtype)
+        self.coarse_counts = np.zeros(
+            shape + (self.coarse_levels,), dtype=count_dtype)
+        self.sums = None
+        self.squares = None
+        if moments:
+            self.sums = np.zeros(
+                (self.row_count, self.coarse_levels), dtype=np.int64)
+            self.squares = np.zeros_like(self.sums)
+
+        # The offsets of each group whose values enter the window when it
+        # slides right, and those whose values leave it. An offset's value
+        # stays in the group if the offset next to it is in the same group.
+        entering = np.ones_like(groups, dtype=bool)
+        entering[:, :-1] = groups[:, :-1] != groups[:, 1:]
+        leaving = np.ones_like(groups, dtype=bool)
+        leaving[:, 1:] = groups[:, 1:] != groups[:, :-1]
+        self.window = self.getBatches(np.ones_like(groups, dtype=bool))
+        self.entering = self.getBatches(entering)
+        self.leaving = self.getBatches(leaving)
+
+        self.column = None
+        self.coarse_totals = None
+
+    def getBatches(self, offsets):
+        """
+        Splits some offsets of the window into batches with at most one
+        offset of each group, so that the histograms of a batch can be
+        updated at once without any index repeating
+
+        :param offsets: A boolean mask of the offsets
+
+        :return: A list of (groups, rows, columns) batches
+        """
+        rows, columns = np.nonzero(offsets)
+        groups = self.groups[rows, columns]
+
+        # Number the offsets of each group, and batch them by their number
+        order = np.argsort(groups, kind='stable')
+        starts = np.searchsorted(groups[order], groups[order])
+        numbers = np.empty_like(order)
+        numbers[order] = np.arange(len(order)) - starts
+
+        return [
+            (groups[numbers == number], rows[numbers == number],
+             columns[numbers == number])
+            for number in range(numbers.max(initial=-1) + 1)]
+
+    def advance(self):
+        """
+        Slides the windows to the next column, or fills the windows of the
+        first column
+        """
+        self.coarse_totals = None
+        if self.column is None:
+            self.column = 0
+            columns = self.getColumns(0, 1)
+            for batch in self.window:
+                self.update(batch, columns, 0, True)
+            for row in range(self.kernel_size):
+                for column in range(self.kernel_size):
+                    self.updateMoments(columns, row, column, True)
+            return
+
+        # Gather the columns of the windows before and after they slide
+        columns = self.getColumns(self.column, 2)
+        for batch in self.leaving:
+            self.update(batch, columns, 0, False)
+        for row in range(self.kernel_size):
+            self.updateMoments(columns, row, 0, False)
+        self.column += 1
+        for batch in self.entering:
+            self.update(batch, columns, 1, True)
+        for row in range(self.kernel_size):
+            self.updateMoments(columns, row, self.kernel_size, True)
+
+    def getColumns(self, column, count):
+        """
+        Gets the columns of the padded image that a number of consecutive
+        columns of windows read, gathering them from the image
+
+        :param column: The first column of windows
+        :param count: The number of columns of windows
+
+        :return: The (count + kernel_size - 1) columns of the padded image
+        """
+        count += self.kernel_size - 1
+        if self.padded_columns is None:
+            return self.image[:, column:column + count]
+        return np.swapaxes(
+            self.padded_columns.getRows(column, count), 0, 1)
+
+    def update(self, batch, columns, column, add):
+        """
+        Adds the values at a batch of offsets of the windows to their
+        histograms, or removes them
+
+        :param batch: The (groups, rows, columns) of the offsets, with at most
+            one offset of each group
+        :param columns: The columns of the padded image the windows read
+        :param column: The column of the padded columns the windows start at
+        :param add: Whether to add the values or remove them
+        """
+        groups, rows, offset_columns = batch
+        values = columns[
+            rows[:, np.newaxis] + np.arange(self.height),
+            column + offset_columns[:, np.newaxis]]
+        values = values.reshape(len(groups), -1).astype(np.intp)
+
+        # Each window gets one value for each group, so no index repeats
+        histograms = groups[:, np.newaxis] * self.row_count + self.rows
+        fine_indices = histograms * self.counts.shape[-1] + values
+        coarse_indices = histograms * self.coarse_levels + \
+            values // self.fine_width
+        counts = self.counts.reshape(-1)
+        coarse_counts = self.coarse_counts.reshape(-1)
+        if add:
+            counts[fine_indices] += 1
+            coarse_counts[coarse_indices] += 1
+        else:
+            counts[fine_indices] -= 1
+            coarse_counts[coarse_indices] -= 1
+
+    def updateMoments(self, columns, row, column, add):
+        """
+        Adds the value at an offset of the windows to their sums, or removes
+        it. The sums are kept for the whole window, whatever the groups.
+
+        :param columns: The columns of the padded image the windows read
+        :param row: The row of the offset
+        :param column: The column of the padded columns
+        :param add: Whether to add the values or remove them
+        """
+        if self.sums is None:
+            return
+
+        values = columns[row:row + self.height, column]
+        values = values.reshape(-1).astype(np.intp)
+        coarse_indices = self.rows * self.coarse_levels + \
+            values // self.fine_width
+        sums = self.sums.reshape(-1)
+        squares = self.squares.reshape(-1)
+        if add:
+            sums[coarse_indices] += values
+            squares[coarse_indices] += values * values
+        else:
+            sums[coarse_indices] -= values
+            squares[coarse_indices] -= values * values
+
+    def getCoarseCounts(self, weights=None):
+        """
+        Gets the coarse histogram of every window
+
+        :param weights: The (groups, rows) weight of every group in every
+            window. If None, every value counts once.
+
+        :return: The (rows, coarse levels) coarse histograms
+        """
+        if weights is None:
+            return np.sum(self.coarse_counts, axis=0, dtype=np.int64)
+        return np.einsum('gr,grc->rc', weights, self.coarse_counts)
+
+    def getCoarseTotals(self, weights=None):
+        """
+        Gets the coarse histogram of every window and its cumulative counts.
+        The unweighted histograms are only summed once for each column.
+
+        :param weights: The (groups, rows) weight of every group in every
+            window. If None, every value counts once.
+
+        :return: The (rows, coarse levels) coarse histograms and the number
+            of values up to and including each coarse level
+        """
+        if weights is not None:
+            coarse_counts = self.getCoarseCounts(weights)
+            return coarse_counts, np.cumsum(coarse_counts, axis=-1)
+
+        if self.coarse_totals is None:
+            coarse_counts = self.getCoarseCounts()
+            self.coarse_totals = (
+                coarse_counts, np.cumsum(coarse_counts, axis=-1))
+        return self.coarse_totals
+
+    def getFineCounts(self, coarse_levels, weights=None):
+        """
+        Gets the fine levels within one coarse level of every window
+
+        :param coarse_levels: The coarse level of every window
+        :param weights: The (groups, rows) weight of every group in every
+            window. If None, every value counts once.
+
+        :return: The (rows, fine width) fine histograms
+        """
+        # Each coarse level of a histogram is a contiguous run of fine levels
+        counts = self.counts.reshape(
+            self.group_count, self.row_count * self.coarse_levels,
+            self.fine_width)[:, self.rows * self.coarse_levels + coarse_levels]
+        if weights is None:
+            return np.sum(counts, axis=0, dtype=np.int64)
+        return np.einsum('gr,grf->rf', weights, counts)
+
+    def findRank(self, rank, weights=None):
+        """
+        Finds the value of a given rank in every window
+
+        :param rank: The number of values below the value, either one rank
+            for every window or a rank for each
+        :param weights: The (groups, rows) weight of every group in every
+            window. If None, every value counts once.
+
+        :return: The value of the rank in every window
+        """
+        rank = np.broadcast_to(rank, (self.row_count,))
+
+        # Find the coarse level of the value, and the number of values below
+        # that coarse level
+        coarse_counts, totals = self.getCoarseTotals(weights)
+        coarse_levels = np.argmax(totals > rank[:, np.newaxis], axis=-1)
+        below = totals[self.rows, coarse_levels] - \
+            coarse_counts[self.rows, coarse_levels]
+
+        # Search the fine levels of that coarse level
+        fine_totals = np.cumsum(
+            self.getFineCounts(coarse_levels, weights), axis=-1)
+        fine_levels = np.argmax(
+            fine_totals > (rank - below)[:, np.newaxis], axis=-1)
+
+        return coarse_levels * self.fine_width + fine_levels
+
+    def countBelow(self, values):
+        """
+        Counts the values below a given value in every window
+
+        :param values: The value to count below for every window
+
+        :return: The number of values below the value in every window
+        """
+        values = np.clip(values, 0, self.levels).astype(np.intp)
+        coarse_levels = np.minimum(
+            values // self.fine_width, self.coarse_levels - 1)
+
+        # Count the coarse levels below the value's and the fine levels
+        # below the value within it
+        coarse_counts, totals = self.getCoarseTotals()
+        below = totals - coarse_counts
+        fine_values = coarse_levels[:, np.newaxis] * self.fine_width + \
+            np.arange(self.fine_width)
+        return below[self.rows, coarse_levels] + np.sum(
+            self.getFineCounts(coarse_levels) *
+            (fine_values < values[:, np.newaxis]),
+            axis=-1)
+
+    def sumSmallest(self, count):
+        """
+        Sums the smallest values in every window. Needs the moments.
+
+        :param count: The number of values to sum
+
+        :return: The sum of the smallest values in every window
+        """
+        if count == 0:
+            return np.zeros(self.row_count, dtype=np.int64)
+
+        # Find the coarse level of the last value summed, and sum every
+        # coarse level below it
+        coarse_counts, totals = self.getCoarseTotals()
+        coarse_levels = np.argmax(totals >= count, axis=-1)
+        below = totals[self.rows, coarse_levels] - \
+            coarse_counts[self.rows, coarse_levels]
+        below_sum = np.cumsum(self.sums, axis=-1) - self.sums
+
+        # Take the rest of the values from the fine levels of that coarse
+        # level, smallest first
+        fine_counts = self.getFineCounts(coarse_levels)
+        before = np.cumsum(fine_counts, axis=-1) - fine_counts
+        taken = np.clip(
+            count - below[:, np.newaxis] - before, 0, fine_counts)
+        fine_values = coarse_levels[:, np.newaxis] * self.fine_width + \
+            np.arange(self.fine_width)
+
+        return below_sum[self.rows, coarse_levels] + \
+            np.sum(taken * fine_values, axis=-1)
+
+    def getMoments(self):
+        """
+        Gets the sum and the sum of squares of the values in every window.
+        Needs the moments.
+
+        :return: The sums and the sums of squares
+        """
+        return np.sum(self.sums, axis=-1), np.sum(self.squares, axis=-1)
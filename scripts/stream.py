@@ -0,0 +1,90 @@
+import queue
+import threading
+
+from workspace import Workspace
+
+
+# Marks the end of the frames in the prefetch queue
+END_OF_FRAMES = object()
+
+
+def prefetchFrames(frames, size):
+    """
+    Reads frames from an iterator in a background thread, keeping up to a
+    given number of frames ready in a bounded queue. Reading the next frames,
+    e.g. decoding them from disk, then overlaps with filtering the current
+    one.
+
+    :param frames: The iterator of frames
+    :param size: The number of frames to read ahead
+
+    :return: A generator of the frames
+    """
+    frame_queue = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+
+    def put(item):
+        # Wait for space in the queue, giving up if the consumer has stopped
+        while not stopped.is_set():
+            try:
+                frame_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def readFrames():
+        # Read every frame, passing any error on to the consumer
+        try:
+            for frame in frames:
+                if not put((frame, None)):
+                    return
+            put((END_OF_FRAMES, None))
+        except Exception as error:
+            put((END_OF_FRAMES, error))
+
+    reader = threading.Thread(target=readFrames, daemon=True)
+    reader.start()
+    try:
+        while True:
+            frame, error = frame_queue.get()
+            if frame is END_OF_FRAMES:
+                if error is not None:
+                    raise error
+                return
+            yield frame
+    finally:
+        # Stop the reader if the consumer stops early
+        stopped.set()
+
+
+def streamFrames(apply, frames, prefetch=0, workspace=None):
+    """
+    Filters a sequence of equal-shaped frames, keeping the kernel spectra,
+    FFT buffers and padded images in one workspace across every frame
+
+    :param apply: A function (frame, workspace) that filters a frame
+    :param frames: An iterable of frames
+    :param prefetch: The number of frames to read ahead in a background
+        thread. If 0, frames are read as they are filtered.
+    :param workspace: The workspace to keep across frames. If None, a new
+        workspace is created.
+
+    :return: A generator of the filtered frames
+
+    :raises ValueError: If a frame has a different shape to the first frame
+    """
+    if workspace is None:
+        workspace = Workspace()
+    if prefetch > 0:
+        frames = prefetchFrames(frames, prefetch)
+
+    shape = None
+    for frame in frames:
+        # The buffers in the workspace are sized for the first frame
+        if shape is None:
+            shape = frame.shape
+        elif frame.shape != shape:
+            raise ValueError('Every frame must have the same shape.')
+
+        yield apply(frame, workspace)
@@ -0,0 +1,192 @@
+import os
+import csv
+import json
+import tempfile
+
+
+class SweepManifest:
+    """
+    The jobs planned for a sweep and which of them are complete, kept in a
+    JSON file so that an interrupted sweep runs only the jobs still pending
+    when it is run again. A job is a dictionary of the image, filter, kernel
+    size, padding and parameters it is run with:
+
+        manifest = SweepManifest('./results/filter-manifest.json')
+        manifest.plan(jobs)
+        for job in jobs:
+            if not manifest.isComplete(job):
+                ...
+                manifest.complete(job)
+
+    The file is rewritten under a temporary name and renamed every time a
+    job is marked, so a sweep interrupted at any point leaves every job
+    either complete or pending.
+    """
+
+    def __init__(self, file_name):
+        """
+        Reads the manifest, or creates an empty one if the file does not
+        exist
+
+        :param file_name: The name of the manifest file
+        """
+        self.file_name = file_name
+        self.jobs = {}
+        if os.path.isfile(file_name):
+            with open(file_name) as manifestFile:
+                self.jobs = json.load(manifestFile)['jobs']
+
+    @staticmethod
+    def getKey(job):
+        """
+        Gets the key of a job in the manifest
+
+        :param job: The job
+
+        :return: The job as a JSON string with sorted keys
+        """
+        return json.dumps(job, sort_keys=True)
+
+    def plan(self, jobs):
+        """
+        Adds jobs to the manifest as pending. Jobs already in the manifest
+        keep their state.
+
+        :param jobs: The jobs
+        """
+        for job in jobs:
+            self.jobs.setdefault(
+                self.getKey(job), {'job': job, 'complete': False})
+        self.write()
+
+    def force(self, selectors):
+        """
+        Marks every planned job that matches the selectors as pending, so
+        that it is run again
+
+        :param selectors: A dictionary of the values every selected job has,
+            each a list of the values allowed for that key of the job. If
+            empty, every job is selected.
+
+        :return: The number of jobs marked as pending
+        """
+        count = 0
+        for entry in self.jobs.values():
+            if all(str(entry['job'].get(key)) in values
+                   for key, values in selectors.items()):
+                entry['complete'] = False
+                count += 1
+        self.write()
+        return count
+
+    def isComplete(self, job):
+        """
+        Checks whether a job is complete
+
+        :param job: The job
+
+        :return: True if the job is complete, False otherwise
+        """
+        entry = self.jobs.get(self.getKey(job))
+        return entry is not None and entry['complete']
+
+    def complete(self, job):
+        """
+        Marks a job as complete
+
+        :param job: The job
+        """
+        self.jobs[self.getKey(job)] = {'job': job, 'complete': True}
+        self.write()
+
+    def getPending(self):
+        """
+        Gets the jobs that are not complete
+
+        :return: A list of the jobs
+        """
+        return [entry['job'] for entry in self.jobs.values()
+                if not entry['complete']]
+
+    def write(self):
+        """
+        Writes the manifest under a temporary name and renames it over the
+        manifest file
+        """
+        directory = os.path.dirname(self.file_name) or '.'
+        handle, temporary_path = tempfile.mkstemp(
+            suffix='.json', dir=directory)
+        with os.fdopen(handle, 'w') as manifestFile:
+            json.dump({'jobs': self.jobs}, manifestFile, indent=1)
+        os.replace(temporary_path, self.file_name)
+
+
+def parseSelectors(arguments):
+    """
+    Parses the selectors of the jobs to run again, given as key=value
+    arguments where the value may list several values separated by commas,
+    e.g. filter_name=median,min kernel_size=3
+
+    :param arguments: The arguments
+
+    :return: A dictionary of the values allowed for each key
+
+    :raises ValueError: If an argument is not a key=value pair
+    """
+    selectors = {}
+    for argument in arguments:
+        key, separator, values = argument.partition('=')
+        if not separator or not key:
+            raise ValueError(f'Selectors must be key=value, not {argument}.')
+        selectors.setdefault(key, []).extend(values.split(','))
+    return selectors
+
+
+def removeResults(file_name, match):
+    """
+    Removes the rows of a results file left by an earlier run of a job, and
+    deletes the images they saved, so that running a job again never leaves
+    a duplicate row. The file is rewritten under a temporary name and
+    renamed over the results file.
+
+    :param file_name: The name of the results file
+    :param match: A dictionary of the values of the columns of every row to
+        remove
+
+    :return: The number of rows removed
+    """
+    if not os.path.isfile(file_name):
+        return 0
+    with open(file_name, newline='') as resultsFile:
+        rows = list(csv.reader(resultsFile))
+    if not rows:
+        return 0
+
+    headers, rows = rows[0], rows[1:]
+    columns = [(headers.index(key), str(value))
+               for key, value in match.items()]
+
+    def matches(row):
+        # Blank rows are kept as they are
+        return bool(row) and all(
+            row[index] == value for index, value in columns)
+
+    removed = [row for row in rows if matches(row)]
+    if not removed:
+        return 0
+    kept = [row for row in rows if not matches(row)]
+
+    # Delete the images of the removed rows
+    file_name_index = headers.index('file_name')
+    for row in removed:
+        if os.path.isfile(row[file_name_index]):
+            os.remove(row[file_name_index])
+
+    directory = os.path.dirname(file_name) or '.'
+    handle, temporary_path = tempfile.mkstemp(suffix='.csv', dir=directory)
+    with os.fdopen(handle, 'w', newline='') as resultsFile:
+        csvWriter = csv.writer(resultsFile)
+        csvWriter.writerow(headers)
+        csvWriter.writerows(kept)
+    os.replace(temporary_path, file_name)
+    return len(removed)
@@ -0,0 +1,490 @@
+import collections
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from borders import PADDING_MODES
+from convolution import padImage
+from linearFilters import LF
+from nonLinearFilters import NLF
+from stream import streamFrames
+
+
+class TemporalFilters:
+    """
+    Class for applying spatio-temporal filters to a sequence of frames, such
+    as a cine loop. Each filtered frame reduces a kernel_size x kernel_size x
+    temporal_size window over the frame and the frames before it, so the
+    first temporal_size - 1 frames are reduced over the frames seen so far.
+
+    Windows are updated incrementally as they slide: each new frame is added
+    to the window and the oldest frame removed, so the cost per frame does
+    not depend on temporal_size. The median is only updated incrementally
+    for uint8 frames, whose every value has a level of its histograms, and
+    is recomputed for other frames and for windows of few frames, so it is
+    exact whichever way it is computed.
+    """
+
+    # The number of levels of the histograms of the median filter, one for
+    # every value of a uint8 frame, and the number of coarse levels it
+    # searches before the fine levels
+    LEVELS = 256
+    COARSE_LEVELS = 16
+
+    # The fewest frames in the window for which the running histograms of
+    # the median are faster than recomputing it. Every frame costs the
+    # histograms two updates per position of the kernel whatever the number
+    # of frames, while recomputing sorts the values of every frame in the
+    # window, so the number of frames decides which is faster.
+    MIN_RUNNING_MEDIAN_FRAMES = 9
+
+    # The most memory the running histograms of the median may take, in
+    # bytes, before the median is recomputed instead
+    MEMORY_BUDGET = 256 * 2 ** 20
+
+    def stream(
+            self,
+            frames,
+            filter_name,
+            kernel_size,
+            temporal_size,
+            **kwargs):
+        """
+        Applies a temporal filter to every frame of a sequence of
+        equal-shaped frames
+
+        :param frames: An iterable of frames, either (height, width) or
+            (height, width, channels)
+        :param filter_name: The name of the filter. Possible values are
+            - 'mean': Running sums of the box filtered frames
+            - 'median': Running histograms of uint8 frames
+        :param kernel_size: The size of the window in each frame
+        :param temporal_size: The number of frames in the window
+        :param kwargs: The arguments for the filter. Possible values are:
+            - 'padding': The type of padding to use. Possible values are:
+                - 'constant': Pads with a constant value
+                - 'edge': Pads with the edge values
+                - 'linear_ramp': Pads with a linear ramp
+                - 'reflect': Pads with the reflection of the image about
+                             its edges
+                - 'wrap': Pads with the opposite edge of the image
+            - 'dtype': The floating point type to compute in (for the mean
+                       filter)
+            - 'incremental': Whether to update the window as it slides. If
+                       False, every window is recomputed from scratch using
+                       the reductions of LinearFilters and NonLinearFilters.
+                       The median is recomputed anyway if the frames are
+                       not uint8, the window has fewer than
+                       MIN_RUNNING_MEDIAN_FRAMES frames, or its histograms
+                       would take more than the memory budget.
+            - 'memory_budget': The most memory the histograms of the
+                       median may take, in bytes. Defaults to
+                       MEMORY_BUDGET.
+            - 'prefetch': The number of frames to read ahead in a
+                       background thread
+
+        :return: A generator of the filtered frames
+        """
+        padding = kwargs.pop('padding', 'constant')
+        self.checkErrors(
+            filter_name, kernel_size, temporal_size, padding, **kwargs)
+
+        dtype = kwargs.get('dtype')
+        memory_budget = kwargs.get('memory_budget', self.MEMORY_BUDGET)
+        if not kwargs.get('incremental', True) or filter_name == 'median' \
+                and temporal_size < self.MIN_RUNNING_MEDIAN_FRAMES:
+            window = RecomputedWindow(
+                filter_name, kernel_size, temporal_size, padding, dtype)
+        elif filter_name == 'mean':
+            window = RunningMean(kernel_size, temporal_size, padding, dtype)
+        else:
+            window = RunningMedian(
+                kernel_size, temporal_size, padding, self.LEVELS,
+                self.COARSE_LEVELS, memory_budget)
+
+        return streamFrames(window, frames, kwargs.get('prefetch', 0))
+
+    def applyFilter(
+            self,
+            frames,
+            filter_name,
+            kernel_size,
+            temporal_size,
+            **kwargs):
+        """
+        Applies a temporal filter to a stack of frames
+
+        :param frames: The frames, either (frames, height, width) or
+            (frames, height, width, channels)
+        :param filter_name: The name of the filter, either 'mean' or
+            'median'
+        :param kernel_size: The size of the window in each frame
+        :param temporal_size: The number of frames in the window
+        :param kwargs: The arguments for the filter, as for stream
+
+        :return: The filtered frames
+        """
+        return np.stack(list(self.stream(
+            frames, filter_name, kernel_size, temporal_size, **kwargs)))
+
+    def checkErrors(
+            self,
+            filter_name,
+            kernel_size,
+            temporal_size,
+            padding,
+            **kwargs):
+        """
+        Checks for errors in the TemporalFilters class
+
+        :param filter_name: The name of the filter
+        :param kernel_size: The size of the window in each frame
+        :param temporal_size: The number of frames in the window
+        :param padding: The type of padding to use
+        :param kwargs: The arguments for the filter
+
+        :raises Exception: If the filter name is not recognized
+
+        :raises TypeError: If the kernel size is not an integer
+        :raises TypeError: If the temporal size is not an integer
+
+        :raises ValueError: If the kernel size is even or less than 1
+        :raises ValueError: If the temporal size is less than 1
+        :raises ValueError: If the padding type is invalid
+        :raises ValueError: If the memory budget is negative
+        """
+        if filter_name not in ['mean', 'median']:
+            raise Exception('Invalid filter name.')
+
+        # Check of errors related to the kernel size.
+        if not isinstance(kernel_size, int):
+            raise TypeError('Kernel size must be an integer.')
+        if kernel_size % 2 == 0:
+            raise ValueError('Kernel size must be odd.')
+        if kernel_size < 1:
+            raise ValueError('Kernel size must be greater than 0.')
+
+        # Check of errors related to the temporal size.
+        if not isinstance(temporal_size, int):
+            raise TypeError('Temporal size must be an integer.')
+        if temporal_size < 1:
+            raise ValueError('Temporal size must be greater than 0.')
+
+        # Check for errors related to the memory budget.
+        if kwargs.get('memory_budget', 0) < 0:
+            raise ValueError('Memory budget must not be negative.')
+
+        # Check for errors related to the padding type.
+        if padding not in PADDING_MODES:
+            raise ValueError('''
+            Invalid padding type. Possible values are:
+            constant, edge, linear_ramp, reflect, wrap.
+            ''')
+
+
+class RunningMean:
+    """
+    The spatio-temporal mean of a sliding window of frames. Each frame is box
+    filtered once; the mean of the window is the running sum of the box
+    filtered frames in it, divided by their number.
+    """
+
+    def __init__(self, kernel_size, temporal_size, padding, dtype=None):
+        """
+        Creates an empty window
+
+        :param kernel_size: The size of the window in each frame
+        :param temporal_size: The number of frames in the window
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in
+        """
+        self.kernel_size = kernel_size
+        self.temporal_size = temporal_size
+        self.padding = padding
+        self.dtype = dtype
+        self.frames = collections.deque()
+        self.total = None
+
+    def __call__(self, frame, workspace=None):
+        """
+        Adds a frame to the window, removing the oldest frame if the window
+        is full
+
+        :param frame: The new frame
+        :param workspace: Unused, as the box filter borrows no buffers
+
+        :return: The mean of the window
+        """
+        averaged = LF.applyFilter(
+            frame, 'box', self.kernel_size, padding=self.padding,
+            dtype=self.dtype)
+
+        # Add the new frame to the running sum and remove the oldest
+        if self.total is None:
+            self.total = averaged.copy()
+        else:
+            self.total += averaged
+        self.frames.append(averaged)
+        if len(self.frames) > self.temporal_size:
+            self.total -= self.frames.popleft()
+
+        return self.total / len(self.frames)
+
+
+class RunningMedian:
+    """
+    The spatio-temporal median of a sliding window of frames. Every output
+    pixel keeps a histogram of the values in its window, along with a coarse
+    histogram of the same values in fewer levels. Adding a frame
+    adds each of its values to the histograms of the kernel_size x
+    kernel_size pixels around it, and removing the oldest frame subtracts its
+    values. The median is then found by searching the coarse histogram and
+    then only the fine levels within the coarse level the median lies in.
+
+    Every value of a uint8 frame is a level of the histograms, so the median
+    is exact. The median of frames of any other type is recomputed with
+    RecomputedWindow instead, rather than quantizing them.
+
+    The histograms take height x width x (levels + coarse_levels) counts,
+    e.g. 2.2 GB for an 8 megapixel frame in 256 levels, so a window whose
+    histograms would take more than the memory budget recomputes the median
+    of every frame too.
+    """
+
+    def __init__(
+            self,
+            kernel_size,
+            temporal_size,
+            padding,
+            levels=256,
+            coarse_levels=16,
+            memory_budget=None):
+        """
+        Creates an empty window
+
+        :param kernel_size: The size of the window in each frame
+        :param temporal_size: The number of frames in the window
+        :param padding: The type of padding to use
+        :param levels: The number of levels of the fine histograms, one for
+            every value of a uint8 frame
+        :param coarse_levels: The number of levels of the coarse
+            histograms, which must divide the number of levels
+        :param memory_budget: The most memory the histograms may take, in
+            bytes. If None, they are not bounded.
+        """
+        self.kernel_size = kernel_size
+        self.temporal_size = temporal_size
+        self.padding = padding
+        self.levels = levels
+        self.coarse_levels = coarse_levels
+        self.memory_budget = memory_budget
+        self.frames = collections.deque()
+        self.histograms = None
+        self.coarse_histograms = None
+        self.recomputed = None
+
+    def estimateMemory(self, shape):
+        """
+        Estimates the memory of the histograms and the padded frames of the
+        window
+
+        :param shape: The shape of a frame
+
+        :return: The number of bytes
+        """
+        half_kernel = (self.kernel_size - 1) // 2
+        padded_size = (shape[0] + 2 * half_kernel) * \
+            (shape[1] + 2 * half_kernel) * int(np.prod(shape[2:]))
+        count_size = np.min_scalar_type(
+            self.kernel_size ** 2 * self.temporal_size).itemsize
+        level_size = np.min_scalar_type(self.levels - 1).itemsize
+        return int(np.prod(shape)) * (self.levels + self.coarse_levels) * \
+            count_size + self.temporal_size * padded_size * level_size
+
+    def __call__(self, frame, workspace=None):
+        """
+        Adds a frame to the window, removing the oldest frame if the window
+        is full
+
+        :param frame: The new frame
+        :param workspace: Unused, as the histograms are kept by the window
+
+        :return: The median of the window
+        """
+        # Recompute the median of every frame if the frames have values the
+        # histograms have no level for, or the histograms would not fit in
+        # the memory budget
+        if self.recomputed is None and self.histograms is None and (
+                frame.dtype != np.uint8 or
+                self.memory_budget is not None and
+                self.estimateMemory(frame.shape) > self.memory_budget):
+            self.recomputed = RecomputedWindow(
+                'median', self.kernel_size, self.temporal_size, self.padding)
+        if self.recomputed is not None:
+            return self.recomputed(frame)
+
+        # The values of a uint8 frame are the levels of the histograms
+        half_kernel = (self.kernel_size - 1) // 2
+        levels = padImage(frame, half_kernel, self.padding)
+
+        # Create the histograms on the first frame, using the smallest type
+        # that can count every value in a window
+        if self.histograms is None:
+            count_dtype = np.min_scalar_type(
+                self.kernel_size ** 2 * self.temporal_size)
+            self.histograms = np.zeros(
+                frame.shape + (self.levels,), dtype=count_dtype)
+            self.coarse_histograms = np.zeros(
+                frame.shape + (self.coarse_levels,), dtype=count_dtype)
+
+        # Add the new frame to the histograms and remove the oldest
+        self.updateHistograms(levels, 1)
+        self.frames.append(levels)
+        if len(self.frames) > self.temporal_size:
+            self.updateHistograms(self.frames.popleft(), -1)
+
+        # Average the two middle values, as np.median does, which are the
+        # same value if the window has an odd number of values
+        count = self.kernel_size ** 2 * len(self.frames)
+        coarse_totals = np.cumsum(self.coarse_histograms, axis=-1)
+        return (
+            self.findRank((count - 1) // 2, coarse_totals) +
+            self.findRank(count // 2, coarse_totals)) / 2
+
+    def updateHistograms(self, levels, count):
+        """
+        Adds the values of a padded frame to the histograms of every output
+        pixel whose window contains them, or subtracts them
+
+        :param levels: The levels of the padded frame
+        :param count: 1 to add the values, or -1 to subtract them
+        """
+        histograms = self.histograms.reshape(-1)
+        coarse_histograms = self.coarse_histograms.reshape(-1)
+        coarse_width = self.levels // self.coarse_levels
+
+        # The index of the first level of each output pixel's histograms
+        pixels = np.arange(self.histograms.size // self.levels)
+        offsets = pixels * self.levels
+        coarse_offsets = pixels * self.coarse_levels
+
+        # Every output pixel sees one value at each position of its window,
+        # so each position updates every histogram once and the indices
+        # never repeat.
+        height, width = self.histograms.shape[:2]
+        for row in range(self.kernel_size):
+            for column in range(self.kernel_size):
+                shifted = levels[row:row + height, column:column + width]
+                shifted = shifted.reshape(-1)
+                if count > 0:
+                    histograms[offsets + shifted] += 1
+                    coarse_histograms[
+                        coarse_offsets + shifted // coarse_width] += 1
+                else:
+                    histograms[offsets + shifted] -= 1
+                    coarse_histograms[
+                        coarse_offsets + shifted // coarse_width] -= 1
+
+    def findRank(self, rank, coarse_totals):
+        """
+        Finds the level of the value of a given rank in every histogram
+
+        :param rank: The number of values smaller than the value
+        :param coarse_totals: The cumulative sum of every coarse histogram
+
+        :return: The level of the value for every output pixel
+        """
+        coarse_width = self.levels // self.coarse_levels
+        pixel_count = coarse_totals.size // self.coarse_levels
+
+        # Find the coarse level the value lies in, and the number of values
+        # in the coarse levels below it
+        coarse_levels = np.argmax(coarse_totals > rank, axis=-1)
+        rows = np.arange(pixel_count) * self.coarse_levels + \
+            coarse_levels.reshape(-1)
+        below = coarse_totals.reshape(-1)[rows] - \
+            self.coarse_histograms.reshape(-1)[rows]
+
+        # Search only the fine levels within that coarse level. Each coarse
+        # level of a histogram is a contiguous row of fine levels.
+        fine_histograms = self.histograms.reshape(-1, coarse_width)[rows]
+        fine_totals = np.cumsum(
+            fine_histograms, axis=-1, dtype=coarse_totals.dtype)
+        fine_levels = np.argmax(
+            fine_totals > (rank - below)[:, np.newaxis], axis=-1)
+
+        return coarse_levels * coarse_width + \
+            fine_levels.reshape(coarse_levels.shape)
+
+
+class RecomputedWindow:
+    """
+    A sliding window of frames whose mean or median is recomputed from
+    scratch for every frame, using the box filter of LinearFilters and the
+    median reduction of NonLinearFilters. Used to check the incremental
+    windows.
+    """
+
+    def __init__(
+            self,
+            filter_name,
+            kernel_size,
+            temporal_size,
+            padding,
+            dtype=None):
+        """
+        Creates an empty window
+
+        :param filter_name: Either 'mean' or 'median'
+        :param kernel_size: The size of the window in each frame
+        :param temporal_size: The number of frames in the window
+        :param padding: The type of padding to use
+        :param dtype: The floating point type to compute in (for the mean
+            filter)
+        """
+        self.filter_name = filter_name
+        self.kernel_size = kernel_size
+        self.temporal_size = temporal_size
+        self.padding = padding
+        self.dtype = dtype
+        self.frames = collections.deque(maxlen=temporal_size)
+
+    def __call__(self, frame, workspace=None):
+        """
+        Adds a frame to the window, dropping the oldest frame if the window
+        is full
+
+        :param frame: The new frame
+        :param workspace: Unused
+
+        :return: The mean or median of the window
+        """
+        self.frames.append(frame)
+
+        if self.filter_name == 'mean':
+            return np.mean([
+                LF.applyFilter(
+                    window_frame, 'box', self.kernel_size,
+                    padding=self.padding, dtype=self.dtype)
+                for window_frame in self.frames], axis=0)
+
+        # Stack the regions of interest of every frame in the window along
+        # their rows, so the median reduction reduces all of them at once.
+        # Each row of the output is reduced separately to bound the memory.
+        half_kernel = (self.kernel_size - 1) // 2
+        padded_frames = [
+            padImage(window_frame, half_kernel, self.padding)
+            for window_frame in self.frames]
+        median = np.empty(frame.shape)
+        for row in range(frame.shape[0]):
+            rois = np.concatenate([
+                sliding_window_view(
+                    padded_frame[row:row + self.kernel_size],
+                    (self.kernel_size, self.kernel_size),
+                    axis=(0, 1))[0]
+                for padded_frame in padded_frames], axis=-2)
+            median[row] = NLF.applyMedianFilter(rois)
+        return median
+
+
+TF = TemporalFilters()
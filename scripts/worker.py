@@ -0,0 +1,269 @@
+import sys
+import json
+import time
+import collections
+import socketserver
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+
+from linearFilters import LF
+from nonLinearFilters import NLF
+from edgeDetector import ED
+from workspace import Workspace
+
+
+# The classes a job can name to apply its filter
+FILTER_CLASSES = {'LF': LF, 'NLF': NLF, 'ED': ED}
+
+# The percentiles of the latencies reported by the stats command
+PERCENTILES = [50, 90, 99]
+
+
+def openSharedMemory(name):
+    """
+    Attaches to a block of shared memory created by another process. The
+    block is unregistered from the resource tracker of this process, so that
+    it is not unlinked when the worker exits while its owner still uses it.
+
+    :param name: The name of the block
+
+    :return: The block of shared memory
+    """
+    block = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(block._name, 'shared_memory')
+    return block
+
+
+def readImage(source):
+    """
+    Reads the image of a job
+
+    :param source: The path to a .npy file, or a dictionary with the 'shm'
+        name, 'shape' and 'dtype' of an image in shared memory
+
+    :return: The image, and the block of shared memory it lies in or None
+    """
+    if isinstance(source, str):
+        return np.load(source), None
+
+    block = openSharedMemory(source['shm'])
+    image = np.ndarray(
+        source['shape'], dtype=source['dtype'], buffer=block.buf)
+    return image, block
+
+
+def writeImage(destination, image):
+    """
+    Writes the filtered image of a job
+
+    :param destination: The path to a .npy file, or a dictionary with the
+        'shm' name of a block of shared memory the image is written into
+    :param image: The filtered image
+
+    :raises ValueError: If the block of shared memory is too small
+    """
+    if isinstance(destination, str):
+        np.save(destination, image)
+        return
+
+    block = openSharedMemory(destination['shm'])
+    try:
+        if block.size < image.nbytes:
+            raise ValueError(
+                f'The shared memory {destination["shm"]} holds {block.size} '
+                f'bytes, but the filtered image needs {image.nbytes}.')
+        np.ndarray(image.shape, dtype=image.dtype, buffer=block.buf)[:] = \
+            image
+    finally:
+        block.close()
+
+
+class FilterWorker:
+    """
+    A long-lived process that applies filter jobs one after another. LF, NLF
+    and ED stay loaded with their kernels and transfer functions cached, and
+    every job borrows buffers and kernel spectra from one workspace, so only
+    the first job of each shape and filter pays to build them.
+
+    Every request is a JSON object on its own line, and every request gets a
+    JSON reply on its own line. A job names the class, filter and kernel size
+    to apply, where to read the image from and where to write the filtered
+    image to, and any arguments for the filter:
+
+        {"id": 1, "class": "LF", "filter": "gaussian", "kernel_size": 5,
+         "input": "image.npy", "output": "filtered.npy",
+         "kwargs": {"padding": "edge"}}
+
+    The input and output are either .npy paths or images in shared memory,
+    as {"shm": name, "shape": [...], "dtype": "float32"}. The output needs
+    only the name of a block large enough for the filtered image. If there
+    is no output, the filtered image is discarded.
+
+    {"command": "stats"} gets the percentiles of the latencies of the jobs so
+    far, and {"command": "shutdown"} stops the worker.
+    """
+
+    def __init__(self, max_latencies=10000):
+        """
+        Creates a worker
+
+        :param max_latencies: The number of latencies of the most recent jobs
+            to keep for the stats command
+        """
+        self.workspace = Workspace()
+        self.latencies = collections.deque(maxlen=max_latencies)
+        self.stopped = False
+
+    def handle(self, request):
+        """
+        Handles a job or a command. A job that fails gets an error reply and
+        leaves the worker running.
+
+        :param request: The request as a dictionary
+
+        :return: The reply as a dictionary
+        """
+        command = request.get('command', 'filter')
+        reply = {'id': request.get('id')}
+        try:
+            if command == 'filter':
+                reply.update(self.runJob(request))
+            elif command == 'stats':
+                reply.update(self.getStats())
+            elif command == 'shutdown':
+                self.stopped = True
+            else:
+                raise ValueError(f'Unknown command: {command}.')
+            reply['status'] = 'ok'
+        except Exception as error:
+            reply['status'] = 'error'
+            reply['error'] = f'{type(error).__name__}: {error}'
+        return reply
+
+    def runJob(self, job):
+        """
+        Reads the image of a job, filters it and writes the filtered image
+
+        :param job: The job as a dictionary
+
+        :return: The shape and type of the filtered image, and the latency of
+            the job in nanoseconds
+        """
+        start_time = time.perf_counter_ns()
+        F = FILTER_CLASSES[job['class']]
+        image, block = readImage(job['input'])
+        try:
+            filtered_image = F.applyFilter(
+                image, job['filter'], job.get('kernel_size'),
+                workspace=self.workspace, **job.get('kwargs', {}))
+            if job.get('output') is not None:
+                writeImage(job['output'], filtered_image)
+        finally:
+            # Views of the shared memory must be released before closing it
+            del image
+            if block is not None:
+                block.close()
+        latency = time.perf_counter_ns() - start_time
+        self.latencies.append(latency)
+
+        return {
+            'shape': list(filtered_image.shape),
+            'dtype': str(filtered_image.dtype),
+            'latency': latency,
+        }
+
+    def getStats(self):
+        """
+        Gets the percentiles of the latencies of the most recent jobs
+
+        :return: The number of jobs, and the mean and percentiles of their
+            latencies in nanoseconds
+        """
+        if not self.latencies:
+            return {'count': 0}
+        latencies = np.array(self.latencies)
+        stats = {'count': len(latencies), 'mean': float(latencies.mean())}
+        for percentile, value in zip(
+                PERCENTILES, np.percentile(latencies, PERCENTILES)):
+            stats[f'p{percentile}'] = float(value)
+        return stats
+
+    def serveLines(self, lines, write):
+        """
+        Handles requests from lines of JSON until the lines run out or the
+        worker is shut down
+
+        :param lines: An iterable of lines, each a JSON request
+        :param write: A function that writes a line of the reply
+        """
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                reply = self.handle(json.loads(line))
+            except json.JSONDecodeError as error:
+                reply = {'id': None, 'status': 'error',
+                         'error': f'JSONDecodeError: {error}'}
+            write(json.dumps(reply) + '\n')
+            if self.stopped:
+                return
+
+    def serveStdin(self):
+        """
+        Handles requests from stdin, writing every reply to stdout
+        """
+        def write(line):
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+        self.serveLines(sys.stdin, write)
+
+    def serveSocket(self, port, host='127.0.0.1'):
+        """
+        Handles requests from clients of a local TCP socket. Clients are
+        served one at a time, and each can send any number of requests over
+        its connection.
+
+        :param port: The port to listen on. If 0, a free port is chosen.
+        :param host: The address to listen on
+        """
+        worker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                def write(line):
+                    self.wfile.write(line.encode())
+                    self.wfile.flush()
+
+                worker.serveLines(
+                    (line.decode() for line in self.rfile), write)
+
+        with socketserver.TCPServer((host, port), Handler) as server:
+            print(f'Listening on {host}:{server.server_address[1]}',
+                  flush=True)
+            while not self.stopped:
+                server.handle_request()
+
+
+def main():
+    """
+    Main function
+    """
+
+    # Get the arguments passed to the script and check if they are valid.
+    arguments = sys.argv[1:]
+    if arguments and (len(arguments) != 2 or arguments[0] != '--port'
+                      or not arguments[1].isdigit()):
+        print('Usage: python worker.py [--port PORT]')
+        sys.exit(1)
+
+    # Serve requests from stdin, or from a socket if a port is given
+    worker = FilterWorker()
+    if arguments:
+        worker.serveSocket(int(arguments[1]))
+    else:
+        worker.serveStdin()
+
+
+if __name__ == '__main__':
+    main()
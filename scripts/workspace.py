@@ -0,0 +1,89 @@
+import numpy as np
+
+from convolution import getChannelKernel
+
+
+class Workspace:
+    """
+    Buffers that LinearFilters, NonLinearFilters and EdgeDetector borrow
+    instead of allocating a fresh padded image, spectrum and output on every
+    call. Pass the same workspace to every applyFilter call in a loop over
+    equal-sized images:
+
+        workspace = Workspace()
+        for frame in frames:
+            LF.applyFilter(frame, 'gaussian', 5, workspace=workspace, out=out)
+
+    Buffers are keyed by their name, shape and type. The shape of a buffer is
+    derived from the shape of the image and the size of the kernel, so each
+    (shape, kernel_size, dtype) combination gets its own set of buffers. The
+    spectra of padded kernels are cached too, so a kernel is only transformed
+    once per image shape. FilterStage.stream and Pipeline.stream keep a
+    workspace across every frame of a sequence in the same way:
+
+        for filtered in LF.stage('gaussian', 5).stream(frames, prefetch=2):
+            ...
+    """
+
+    def __init__(self, max_kernel_spectra=32):
+        """
+        Creates an empty workspace
+
+        :param max_kernel_spectra: The number of kernel spectra to keep before
+            the oldest are discarded
+        """
+        self.buffers = {}
+        self.kernel_spectra = {}
+        self.max_kernel_spectra = max_kernel_spectra
+
+    def getBuffer(self, name, shape, dtype):
+        """
+        Gets a buffer, allocating it the first time it is requested. The
+        contents of the buffer are whatever the last borrower left in it.
+
+        :param name: The name of the buffer
+        :param shape: The shape of the buffer
+        :param dtype: The type of the buffer
+
+        :return: The buffer
+        """
+        key = (name, tuple(shape), np.dtype(dtype))
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = np.empty(shape, dtype=dtype)
+            self.buffers[key] = buffer
+        return buffer
+
+    def getKernelSpectrum(self, kernel, shape, dtype):
+        """
+        Gets the Fourier transform of a kernel zero padded to a shape,
+        calculating it the first time it is requested
+
+        :param kernel: The kernel
+        :param shape: The shape to pad the kernel to before transforming it,
+            with a channel axis of 1 if the image has channels
+        :param dtype: The complex type of the spectrum
+
+        :return: The spectrum of the kernel
+        """
+        key = (kernel.shape, kernel.tobytes(), tuple(shape), np.dtype(dtype))
+        spectrum = self.kernel_spectra.get(key)
+        if spectrum is None:
+            # Discard the oldest spectrum to keep the cache bounded
+            if len(self.kernel_spectra) >= self.max_kernel_spectra:
+                del self.kernel_spectra[next(iter(self.kernel_spectra))]
+
+            # Pad the kernel with 0s and transform it
+            spectrum = np.zeros(shape, dtype=dtype)
+            spectrum[0: kernel.shape[0], 0: kernel.shape[1]] = \
+                getChannelKernel(kernel, len(shape))
+            spectrum = np.fft.fftn(spectrum, axes=(0, 1))
+            self.kernel_spectra[key] = spectrum.astype(dtype, copy=False)
+        return self.kernel_spectra[key]
+
+    def clear(self):
+        """
+        Releases every buffer and cached spectrum
+        """
+        self.buffers = {}
+        self.kernel_spectra = {}